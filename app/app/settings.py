@@ -267,3 +267,56 @@ SIMPLE_JWT = {
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Файлы выгрузок: вне MEDIA_ROOT, отдаются только через API с проверкой прав
+EXPORT_ROOT = os.path.join(BASE_DIR, "exports")
+
+# Кэш ролей участников проекта (в памяти процесса)
+PROJECT_ACCESS_CACHE = {
+    "TIMEOUT": 60,  # Время жизни записи в секундах
+    "MAX_SIZE": 10000,  # Максимальное количество записей
+}
+
+# Кэш приложения. Бэкенд задаётся в окружении: LocMemCache (по умолчанию),
+# FileBasedCache (LOCATION - каталог) или RedisCache (LOCATION - redis://...)
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="project-management"),
+    }
+}
+
+# Кэш ответов API (ключ содержит версию данных проекта)
+API_RESPONSE_CACHE = {
+    "ALIAS": "default",  # Используемый кэш из CACHES
+    "TIMEOUT": 300,  # Время жизни записи в секундах
+}
+
+# Слой каналов для WebSocket-событий проектов. В памяти процесса по умолчанию;
+# для нескольких процессов - channels_redis.core.RedisChannelLayer
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": config(
+            "CHANNEL_LAYER_BACKEND", default="channels.layers.InMemoryChannelLayer"
+        ),
+    }
+}
+
+# Хранение истории изменений (simple_history), применяется командой prune_history.
+# Политика задаётся по умолчанию и может переопределяться для модели ("projects.Task")
+HISTORY_RETENTION = {
+    "BATCH_SIZE": 1000,  # Записей истории в одной транзакции
+    "DEFAULT": {
+        "DAYS": None,  # Удалять версии старше N дней (последняя версия сохраняется)
+        "KEEP_VERSIONS": None,  # Хранить не больше K последних версий объекта
+        "SQUASH_NOOP": False,  # Удалять версии без изменений относительно предыдущей
+    },
+    "MODELS": {},
+}
+
+# Записи истории моложе этого числа секунд не попадают в журнал изменений и
+# снимки: запись из ещё не зафиксированной транзакции может стать видимой
+# позже записей с большим history_id. Должно превышать самую долгую
+# транзакцию записи (в том числе импорт файла)
+HISTORY_SAFETY_LAG = 60
@@ -3,14 +3,27 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from projects.views import (BudgetCreateView, BudgetDetailView, BudgetListView,
-                            ProjectCreateView, ProjectDeleteView,
-                            ProjectDetailView, ProjectListView,
+from projects.async_views import (AsyncBudgetDetailView, AsyncBudgetListView,
+                                  AsyncProjectDetailView, AsyncProjectListView,
+                                  AsyncProjectMemberDetailView,
+                                  AsyncProjectMemberListView,
+                                  AsyncResultDetailView, AsyncResultListView,
+                                  AsyncRiskDetailView, AsyncRiskListView,
+                                  AsyncTaskDetailView, AsyncTaskListView)
+from projects.views import (BudgetAnalyticsView, BudgetCreateView,
+                            BudgetDetailView, BudgetListView, CacheStatsView,
+                            ExportJobCreateView, ExportJobDetailView,
+                            ExportJobDownloadView, ExportJobListView,
+                            ProjectAsOfView, ProjectChangesView,
+                            ProjectCreateView, ProjectDashboardView,
+                            ProjectDeleteView, ProjectDetailView,
+                            ProjectListView, ProjectMemberBulkView,
                             ProjectMemberCreateView, ProjectMemberDetailView,
                             ProjectMemberListView, ProjectUpdateView,
                             ResultCreateView, ResultDetailView, ResultListView,
                             RiskCreateView, RiskDetailView, RiskListView,
-                            TaskCreateView, TaskDetailView, TaskListView)
+                            SearchView, TaskBulkView, TaskCreateView,
+                            TaskDetailView, TaskListView)
 from user import google
 from user.views import ActivationView, PasswordResetConfirmView
 
@@ -40,6 +53,21 @@ urlpatterns = [
     path(
         "api/v1/projects/<int:pk>/", ProjectDetailView.as_view(), name="project-detail"
     ),  # Получение проекта
+    path(
+        "api/v1/projects/<int:pk>/dashboard/",
+        ProjectDashboardView.as_view(),
+        name="project-dashboard",
+    ),  # Проект со всеми дочерними объектами и сводкой
+    path(
+        "api/v1/projects/<int:pk>/changes/",
+        ProjectChangesView.as_view(),
+        name="project-changes",
+    ),  # Изменения проекта для синхронизации
+    path(
+        "api/v1/projects/<int:pk>/as-of/",
+        ProjectAsOfView.as_view(),
+        name="project-as-of",
+    ),  # Состояние проекта на указанный момент
     path(
         "api/v1/projects/<int:pk>/update/",
         ProjectUpdateView.as_view(),
@@ -66,6 +94,11 @@ urlpatterns = [
         TaskDetailView.as_view(),
         name="task-detail",
     ),  # Получение задачи
+    path(
+        "api/v1/projects/<int:project_id>/tasks/bulk/",
+        TaskBulkView.as_view(),
+        name="task-bulk",
+    ),  # Пакетное создание, обновление и удаление задач
     # URL-ы для управления бюджетами
     path(
         "api/v1/projects/<int:project_id>/budgets/",
@@ -130,6 +163,105 @@ urlpatterns = [
         ProjectMemberDetailView.as_view(),
         name="project-member-detail",
     ),
+    path(
+        "api/v1/projects/<int:project_id>/members/bulk/",
+        ProjectMemberBulkView.as_view(),
+        name="project-members-bulk",
+    ),  # Пакетное добавление, удаление и смена ролей участников
+    # URL-ы для фоновых выгрузок
+    path(
+        "api/v1/exports/",
+        ExportJobListView.as_view(),
+        name="export-list",
+    ),  # Список выгрузок пользователя
+    path(
+        "api/v1/exports/create/",
+        ExportJobCreateView.as_view(),
+        name="export-create",
+    ),  # Постановка выгрузки в очередь
+    path(
+        "api/v1/exports/<int:pk>/",
+        ExportJobDetailView.as_view(),
+        name="export-detail",
+    ),  # Статус выгрузки и ссылка на файл
+    path(
+        "api/v1/exports/<int:pk>/download/",
+        ExportJobDownloadView.as_view(),
+        name="export-download",
+    ),  # Файл выгрузки (с проверкой прав)
+    # Статистика кэша ответов
+    path(
+        "api/v1/cache/stats/",
+        CacheStatsView.as_view(),
+        name="cache-stats",
+    ),  # Попадания и промахи кэша
+    path(
+        "api/v1/analytics/budgets/",
+        BudgetAnalyticsView.as_view(),
+        name="analytics-budgets",
+    ),  # Сводка бюджетов по годам, заказчикам и кураторам
+    path("api/v1/search/", SearchView.as_view(), name="search"),  # Полнотекстовый поиск
+    # Асинхронные варианты представлений для чтения
+    path(
+        "api/v1/async/projects/",
+        AsyncProjectListView.as_view(),
+        name="async-project-list",
+    ),
+    path(
+        "api/v1/async/projects/<int:pk>/",
+        AsyncProjectDetailView.as_view(),
+        name="async-project-detail",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/tasks/",
+        AsyncTaskListView.as_view(),
+        name="async-task-list",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/tasks/<int:pk>/",
+        AsyncTaskDetailView.as_view(),
+        name="async-task-detail",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/budgets/",
+        AsyncBudgetListView.as_view(),
+        name="async-budget-list",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/budgets/<int:pk>/",
+        AsyncBudgetDetailView.as_view(),
+        name="async-budget-detail",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/results/",
+        AsyncResultListView.as_view(),
+        name="async-result-list",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/results/<int:pk>/",
+        AsyncResultDetailView.as_view(),
+        name="async-result-detail",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/risks/",
+        AsyncRiskListView.as_view(),
+        name="async-risk-list",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/risks/<int:pk>/",
+        AsyncRiskDetailView.as_view(),
+        name="async-risk-detail",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/members/",
+        AsyncProjectMemberListView.as_view(),
+        name="async-member-list",
+    ),
+    path(
+        "api/v1/async/projects/<int:project_id>/members/<int:pk>/",
+        AsyncProjectMemberDetailView.as_view(),
+        name="async-member-detail",
+    ),
 ]
 
 if settings.DEBUG:
@@ -1,9 +1,154 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.utils import get_last_value_from_parameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.http import QueryDict
 from import_export.admin import ImportExportActionModelAdmin
 from simple_history.admin import SimpleHistoryAdmin
 
-from .models import Budget, Project, ProjectMembership, Result, Risk, Task
+from .exports import export_response
+from .jobs import submit_export
+from .models import (Budget, ExportJob, Project, ProjectMembership,
+                     ProjectStats, Result, Risk, Task)
+from .pagination import EstimatedCountPaginator
 from .resources import BudgetResource, ProjectResource, TaskResource
+from .search import SearchIndexAdminMixin
+from .stats import format_budget_summary, get_stats
+
+
+class StreamingExportMixin:
+    """Потоковый экспорт выбранных записей в XLSX и CSV"""
+
+    def stream_export(self, queryset, file_format):
+        return export_response(
+            self.resource_class(),
+            queryset,
+            file_format,
+            self.model._meta.model_name,
+        )
+
+    @admin.action(description="Экспорт в Excel")
+    def export_as_excel(self, request, queryset):
+        return self.stream_export(queryset, "xlsx")
+
+    @admin.action(description="Экспорт в CSV")
+    def export_as_csv(self, request, queryset):
+        return self.stream_export(queryset, "csv")
+
+    @admin.action(description="Экспорт в Excel (в фоне)")
+    def export_in_background(self, request, queryset):
+        object_ids = None
+        if request.POST.get("select_across") != "1":
+            object_ids = list(queryset.values_list("pk", flat=True))
+        job, created = submit_export(
+            self.export_job_resource, "xlsx", object_ids, request.user
+        )
+        self.message_user(
+            request,
+            f"Выгрузка №{job.id} "
+            + ("поставлена в очередь" if created else "уже существует"),
+        )
+
+
+class InputListFilterMixin:
+    """
+    Фильтр боковой панели в виде поля формы вместо списка всех значений.
+    Подклассы возвращают HTML поля из render_widget
+    """
+
+    template = "admin/input_filter.html"
+
+    def has_output(self):
+        return True
+
+    def render_widget(self):
+        raise NotImplementedError
+
+    def choices(self, changelist):
+        # Остальные параметры списка передаются скрытыми полями формы
+        query_string = changelist.get_query_string(remove=self.expected_parameters())
+        yield {
+            "hidden": [
+                (name, value)
+                for name, values in QueryDict(query_string[1:]).lists()
+                for value in values
+            ],
+            "widget": self.render_widget(),
+        }
+
+
+class ContainsListFilter(InputListFilterMixin, admin.FieldListFilter):
+    """Поиск по подстроке вместо списка значений (SELECT DISTINCT по таблице)"""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__icontains"
+        self.lookup_val = get_last_value_from_parameters(params, self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def render_widget(self):
+        widget = forms.TextInput(attrs={"type": "search"})
+        return widget.render(self.lookup_kwarg, self.lookup_val)
+
+
+class AutocompleteListFilter(InputListFilterMixin, admin.RelatedFieldListFilter):
+    """
+    Фильтр по связанному объекту с поиском (autocomplete админки): вместо
+    всех объектов загружается только выбранный. Админке связанной модели
+    нужны search_fields
+    """
+
+    def field_choices(self, field, request, model_admin):
+        self.admin_site = model_admin.admin_site
+        return []
+
+    def render_widget(self):
+        form_field = self.field.formfield(
+            widget=AutocompleteSelect(self.field, self.admin_site), required=False
+        )
+        value = self.lookup_val[-1] if self.lookup_val else None
+        return form_field.widget.render(self.lookup_kwarg, value)
+
+
+class InputListFilterMediaMixin:
+    """Скрипты фильтров InputListFilterMixin: select2 и отправка формы"""
+
+    @property
+    def media(self):
+        return (
+            super().media
+            + AutocompleteSelect(None, self.admin_site).media
+            + forms.Media(
+                js=["admin/js/jquery.init.js", "projects/admin/input_filter.js"]
+            )
+        )
+
+
+class HistoryAdmin(SimpleHistoryAdmin):
+    """
+    История объекта постранично, связанные объекты из history_list_display
+    загружаются вместе со списком версий
+    """
+
+    history_per_page = 100
+
+    def render_history_view(self, request, template, context, **kwargs):
+        action_list = context.get("action_list")
+        if template == self.object_history_template and action_list is not None:
+            related = [
+                field.name
+                for field in action_list.model._meta.fields
+                if field.many_to_one and field.name in context["history_list_display"]
+            ]
+            paginator = EstimatedCountPaginator(
+                action_list.select_related(*related), self.history_per_page
+            )
+            page = paginator.get_page(request.GET.get(PAGE_VAR))
+            context.update(action_list=page.object_list, page_obj=page)
+        return super().render_history_view(request, template, context, **kwargs)
 
 
 class ProjectMembershipInline(admin.TabularInline):
@@ -12,7 +157,14 @@ class ProjectMembershipInline(admin.TabularInline):
     raw_id_fields = ("user",)  # Используем raw_id_fields для пользователей
 
 
-class BudgetInline(admin.TabularInline):
+class ProjectChildInline(admin.TabularInline):
+    """Строки, в __str__ которых используется проект: без запроса на строку"""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("project")
+
+
+class BudgetInline(ProjectChildInline):
     model = Budget
     extra = 1
     readonly_fields = ("year", "amount")  # Пример readonly_fields
@@ -23,7 +175,7 @@ class RiskInline(admin.TabularInline):
     extra = 1
 
 
-class ResultInline(admin.TabularInline):
+class ResultInline(ProjectChildInline):
     model = Result
     extra = 1
 
@@ -36,8 +188,16 @@ class TaskInline(admin.TabularInline):
 
 
 @admin.register(Project)
-class ProjectAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
+class ProjectAdmin(
+    SearchIndexAdminMixin,
+    InputListFilterMediaMixin,
+    StreamingExportMixin,
+    ImportExportActionModelAdmin,
+    HistoryAdmin,
+):
+    export_job_resource = "project"
     resource_class = ProjectResource
+    skip_admin_log = True  # Импорт записывается в историю, без LogEntry на строку
     list_display = (
         "name",
         "client",
@@ -47,7 +207,7 @@ class ProjectAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
         "budget_summary",
         "member_count",
     )
-    list_filter = ("start_date", "end_date", "client")
+    list_filter = ("start_date", "end_date", ("client", ContainsListFilter))
     inlines = [
         ProjectMembershipInline,
         BudgetInline,
@@ -55,34 +215,33 @@ class ProjectAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
         ResultInline,
         TaskInline,
     ]
-    date_hierarchy = "start_date"
     search_fields = ("name", "client", "curator", "description")
+    ordering = ("-pk",)  # Порядок списка и autocomplete фильтров по проекту
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display_links = ("name", "client")
+    # Показатели из ProjectStats одним JOIN вместо запросов на каждую строку
+    list_select_related = ("stats",)
     history_list_display = ["name", "client", "curator", "start_date", "end_date"]
-    actions = ["export_as_excel"]
+    actions = ["export_as_excel", "export_as_csv", "export_in_background"]
 
-    @admin.display(description="Бюджет")
+    @admin.display(description="Бюджет", ordering="stats__budget_total")
     def budget_summary(self, obj):
-        budgets = obj.budgets.all()
-        if budgets:
-            total = sum(b.amount for b in budgets)
-            years = ", ".join(str(b.year) for b in budgets)
-            return f"{total} ({years})"
-        return "Нет данных"
-
-    @admin.display(description="Участников")
+        return format_budget_summary(get_stats(obj))
+
+    @admin.display(description="Участников", ordering="stats__member_count")
     def member_count(self, obj):
-        return (
-            obj.members.count()
-        )  # Используем прямое обращение к members вместо projectmembership_set
+        stats = get_stats(obj)
+        return stats.member_count if stats else 0
 
 
 @admin.register(ProjectMembership)
-class ProjectMembershipAdmin(SimpleHistoryAdmin):
+class ProjectMembershipAdmin(InputListFilterMediaMixin, HistoryAdmin):
     list_display = ("user", "project", "role", "is_leader", "date_added")
-    list_filter = ("role", "project")
+    list_filter = ("role", ("project", AutocompleteListFilter))
     search_fields = ("user__username", "project__name")
     raw_id_fields = ("user", "project")
+    list_select_related = ("user", "project")
     history_list_display = ["user", "project", "role", "date_added"]
     list_display_links = ("user", "project")
 
@@ -92,13 +251,20 @@ class ProjectMembershipAdmin(SimpleHistoryAdmin):
 
 
 @admin.register(Budget)
-class BudgetAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
+class BudgetAdmin(
+    InputListFilterMediaMixin,
+    StreamingExportMixin,
+    ImportExportActionModelAdmin,
+    HistoryAdmin,
+):
+    export_job_resource = "budget"
     resource_class = BudgetResource
     list_display = ("project", "year", "amount", "formatted_amount")
-    list_filter = ("year", "project")
+    list_filter = ("year", ("project", AutocompleteListFilter))
+    list_select_related = ("project",)
     search_fields = ("project__name",)
     history_list_display = ["project", "year", "amount"]
-    actions = ["export_as_excel"]
+    actions = ["export_as_excel", "export_as_csv", "export_in_background"]
     list_display_links = ("project", "year")
 
     @admin.display(description="Сумма")
@@ -107,9 +273,10 @@ class BudgetAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
 
 
 @admin.register(Risk)
-class RiskAdmin(SimpleHistoryAdmin):
+class RiskAdmin(SearchIndexAdminMixin, InputListFilterMediaMixin, HistoryAdmin):
     list_display = ("name", "project", "short_description")
-    list_filter = ("project",)
+    list_filter = (("project", AutocompleteListFilter),)
+    list_select_related = ("project",)
     search_fields = ("name", "description", "project__name")
     history_list_display = ["name", "project", "description"]
     list_display_links = ("name", "project")
@@ -124,9 +291,10 @@ class RiskAdmin(SimpleHistoryAdmin):
 
 
 @admin.register(Result)
-class ResultAdmin(SimpleHistoryAdmin):
+class ResultAdmin(SearchIndexAdminMixin, InputListFilterMediaMixin, HistoryAdmin):
     list_display = ("project", "short_text")
-    list_filter = ("project",)
+    list_filter = (("project", AutocompleteListFilter),)
+    list_select_related = ("project",)
     search_fields = ("text", "project__name")
     history_list_display = ["project", "text"]
     list_display_links = ("project",)
@@ -137,8 +305,16 @@ class ResultAdmin(SimpleHistoryAdmin):
 
 
 @admin.register(Task)
-class TaskAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
+class TaskAdmin(
+    SearchIndexAdminMixin,
+    InputListFilterMediaMixin,
+    StreamingExportMixin,
+    ImportExportActionModelAdmin,
+    HistoryAdmin,
+):
+    export_job_resource = "task"
     resource_class = TaskResource
+    skip_admin_log = True
     list_display = (
         "name",
         "project",
@@ -147,13 +323,20 @@ class TaskAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
         "status",
         "duration_days",
     )
-    list_filter = ("status", "project", "start_date", "end_date")
+    list_filter = (
+        "status",
+        ("project", AutocompleteListFilter),
+        "start_date",
+        "end_date",
+    )
+    list_select_related = ("project",)
     search_fields = ("name", "description", "project__name")
-    date_hierarchy = "start_date"
     readonly_fields = ("duration_days",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     filter_horizontal = ("assigned_users",)
     history_list_display = ["name", "project", "start_date", "end_date", "status"]
-    actions = ["export_as_excel"]
+    actions = ["export_as_excel", "export_as_csv", "export_in_background"]
     list_display_links = ("name", "project")
 
     @admin.display(description="Длительность (дни)")
@@ -161,3 +344,39 @@ class TaskAdmin(ImportExportActionModelAdmin, SimpleHistoryAdmin):
         if obj.start_date and obj.end_date:
             return (obj.end_date - obj.start_date).days
         return None
+
+
+@admin.register(ProjectStats)
+class ProjectStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "project",
+        "task_count",
+        "member_count",
+        "risk_count",
+        "budget_total",
+        "tasks_start_date",
+        "tasks_end_date",
+    )
+    list_select_related = ("project",)
+    search_fields = ("project__name",)
+    readonly_fields = [field.name for field in ProjectStats._meta.fields]
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "resource",
+        "file_format",
+        "status",
+        "progress",
+        "total",
+        "requested_by",
+        "created_at",
+    )
+    list_filter = ("status", "resource", "file_format")
+    list_select_related = ("requested_by",)
+    readonly_fields = [field.name for field in ExportJob._meta.fields] + ["requesters"]
+
+    def has_add_permission(self, request):
+        return False
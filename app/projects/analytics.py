@@ -0,0 +1,230 @@
+from decimal import Decimal
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value, Window
+from django.db.models.functions import Coalesce, Lag
+from django.utils import timezone
+
+from .models import Budget, BudgetRollup, Project
+
+# Разрезы сводки бюджетов: {разрез: поле проекта или None - только год}
+ROLLUP_DIMENSIONS = {
+    "year": None,
+    "client": "project__client",
+    "curator": "project__curator",
+}
+# Поля проекта, от которых зависят ключи его строк сводки
+ROLLUP_PROJECT_FIELDS = [
+    field.removeprefix("project__") for field in ROLLUP_DIMENSIONS.values() if field
+]
+
+
+def _aggregate(dimension, years=None):
+    """Суммы бюджетов разреза, сгруппированные в БД"""
+    field = ROLLUP_DIMENSIONS[dimension]
+    budgets = Budget.objects.all()
+    if years is not None:
+        budgets = budgets.filter(year__in=years)
+    key = Coalesce(F(field), Value("")) if field else Value("")
+    rows = (
+        budgets.values("year", key=key)
+        .annotate(total=Sum("amount"), project_count=Count("id"))
+        .order_by()
+    )
+    return [
+        BudgetRollup(
+            dimension=dimension,
+            key=row["key"],
+            year=row["year"],
+            total=row["total"],
+            project_count=row["project_count"],
+        )
+        for row in rows
+    ]
+
+
+def refresh_budget_rollups(years=None):
+    """
+    Пересчитывает сводки бюджетов за указанные годы (None - за все)
+    агрегированием всех бюджетов. Строки обновляются на месте, исчезнувшие
+    группы удаляются. Изменения бюджетов применяются на разницу
+    (apply_rollup_changes), пересчёт - для восстановления сводок
+    """
+    started = timezone.now()
+    rollups = [
+        rollup
+        for dimension in ROLLUP_DIMENSIONS
+        for rollup in _aggregate(dimension, years)
+    ]
+    with transaction.atomic():
+        BudgetRollup.objects.bulk_create(
+            rollups,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["dimension", "key", "year"],
+            update_fields=["total", "project_count", "updated_at"],
+        )
+        stale = BudgetRollup.objects.filter(updated_at__lt=started)
+        if years is not None:
+            stale = stale.filter(year__in=years)
+        stale.delete()
+
+
+def schedule_budget_rollup(years):
+    """
+    Пересчитывает сводки за годы после фиксации текущей транзакции.
+    Годы всех изменений транзакции пересчитываются одним вызовом
+    """
+    years = {year for year in years if year is not None}
+    if not years:
+        return
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        for _, func, _ in connection.run_on_commit:
+            pending = getattr(func, "budget_years", None)
+            if pending is not None:
+                pending.update(years)
+                return
+    callback = partial(refresh_budget_rollups, years)
+    callback.budget_years = years
+    transaction.on_commit(callback)
+
+
+def get_rollup_keys(owners):
+    """Ключи разрезов проекта: [(разрез, ключ)] по {поле проекта: значение}"""
+    return [
+        (
+            dimension,
+            (owners.get(field.removeprefix("project__")) or "") if field else "",
+        )
+        for dimension, field in ROLLUP_DIMENSIONS.items()
+    ]
+
+
+def get_project_owners(project_ids):
+    """{id проекта: {поле проекта: значение}} для полей ROLLUP_PROJECT_FIELDS"""
+    rows = Project.objects.filter(pk__in=project_ids).values(
+        "id", *ROLLUP_PROJECT_FIELDS
+    )
+    return {row.pop("id"): row for row in rows}
+
+
+def _add_to_rollup(dimension, key, year, total, count):
+    """Прибавляет сумму и число бюджетов к строке сводки через F()"""
+    rollups = BudgetRollup.objects.filter(dimension=dimension, key=key, year=year)
+    changes = {
+        "total": F("total") + total,
+        "project_count": F("project_count") + count,
+        "updated_at": timezone.now(),
+    }
+    if rollups.update(**changes):
+        if count < 0:
+            rollups.filter(project_count=0).delete()
+        return
+    if count <= 0:
+        # Строки нет, хотя бюджеты были: сводка года пересчитывается целиком
+        schedule_budget_rollup([year])
+        return
+    try:
+        # Точка сохранения: строку мог создать параллельный запрос
+        with transaction.atomic():
+            BudgetRollup.objects.create(
+                dimension=dimension,
+                key=key,
+                year=year,
+                total=total,
+                project_count=count,
+            )
+    except IntegrityError:
+        rollups.update(**changes)
+
+
+def apply_rollup_changes(changes):
+    """
+    Изменяет сводки на разницу: {(разрез, ключ, год): (сумма, число бюджетов)}.
+    Затрагиваются только строки изменённых групп, без агрегирования
+    бюджетов всех проектов; группы без бюджетов удаляются
+    """
+    with transaction.atomic():
+        for (dimension, key, year), (total, count) in sorted(changes.items()):
+            if total or count:
+                _add_to_rollup(dimension, key, year, total, count)
+
+
+def budget_rollup_changes(old, new):
+    """
+    Изменения сводок при изменении бюджета. old и new - (id проекта, год,
+    сумма) до и после изменения или None (бюджет создан или удалён)
+    """
+    budgets = [(budget, sign) for budget, sign in ((old, -1), (new, 1)) if budget]
+    owners = get_project_owners({project_id for (project_id, _, _), _ in budgets})
+    changes = {}
+    for (project_id, year, amount), sign in budgets:
+        if project_id not in owners:
+            # Проект уже удалён: его строки сводки неизвестны
+            schedule_budget_rollup([year])
+            continue
+        for dimension, key in get_rollup_keys(owners[project_id]):
+            total, count = changes.get((dimension, key, year), (Decimal(0), 0))
+            changes[dimension, key, year] = (
+                total + sign * Decimal(str(amount)),
+                count + sign,
+            )
+    return changes
+
+
+def project_rollup_changes(project_id, old_owners, new_owners):
+    """
+    Изменения сводок при смене заказчика или куратора проекта: бюджеты
+    проекта переносятся из строк старых ключей в строки новых
+    """
+    moved = [
+        (old_key, new_key)
+        for old_key, new_key in zip(
+            get_rollup_keys(old_owners), get_rollup_keys(new_owners)
+        )
+        if old_key != new_key
+    ]
+    if not moved:
+        return {}
+    budgets = Budget.objects.filter(project_id=project_id).values_list("year", "amount")
+    changes = {}
+    for year, amount in budgets:
+        for (dimension, old_key), (_, new_key) in moved:
+            changes[dimension, old_key, year] = (-amount, -1)
+            changes[dimension, new_key, year] = (amount, 1)
+    return changes
+
+
+def _percent(delta, previous):
+    if delta is None or not previous:
+        return None
+    return (delta / previous * 100).quantize(Decimal("0.01"))
+
+
+def get_budget_rollups(dimension, year_min=None, year_max=None):
+    """
+    Строки сводки разреза по ключу и году с изменением к предыдущему году
+    (delta, delta_percent; None, если бюджета за предыдущий год нет)
+    """
+    partition = {"partition_by": [F("key")], "order_by": F("year").asc()}
+    queryset = BudgetRollup.objects.filter(dimension=dimension).annotate(
+        previous_year=Window(Lag("year"), **partition),
+        previous_total=Window(Lag("total"), **partition),
+    )
+    # Предыдущий год нужен для изменения первого года периода
+    if year_min is not None:
+        queryset = queryset.filter(year__gte=year_min - 1)
+    if year_max is not None:
+        queryset = queryset.filter(year__lte=year_max)
+    rollups = []
+    for rollup in queryset.order_by("key", "year"):
+        if year_min is not None and rollup.year < year_min:
+            continue
+        rollup.delta = None
+        if rollup.previous_year == rollup.year - 1:
+            rollup.delta = rollup.total - rollup.previous_total
+        rollup.delta_percent = _percent(rollup.delta, rollup.previous_total)
+        rollups.append(rollup)
+    return rollups
@@ -0,0 +1,271 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .authentication import AsyncJWTAuthentication
+from .caching import ResponseCacheMixin
+from .conditional import AsyncConditionalRequestMixin
+from .fields import SparseFieldsetMixin
+from .filters import BudgetFilter, RiskFilter, TaskFilter
+from .models import Budget, Project, ProjectMembership, Result, Risk, Task
+from .pagination import CursorPaginationMixin, StandardResultsSetPagination
+from .permissions import aget_project_role
+from .search import SearchIndexFilter, aget_search_backend
+from .serializers import (BudgetSerializer, ProjectListSerializer,
+                          ProjectMembershipSerializer, ProjectSerializer,
+                          ResultSerializer, RiskSerializer, TaskSerializer)
+from .versions import aget_projects_version
+
+
+class AsyncAPIView(CursorPaginationMixin, SparseFieldsetMixin, View):
+    """
+    Асинхронное представление только для чтения: аутентификация,
+    проверка прав и выборка данных выполняются через асинхронный ORM,
+    без передачи запроса в пул потоков.
+
+    Фильтры (filter_backends, filterset_class), пагинация, ETag/304 и кэш
+    ответов те же, что у синхронных представлений. Исключение - пагинация
+    по курсору: её выполняет синхронный пагинатор DRF в пуле потоков
+    """
+
+    serializer_class = None
+    authentication = AsyncJWTAuthentication()
+    renderer = JSONRenderer()
+    chunk_size = 100
+    filter_backends = api_settings.DEFAULT_FILTER_BACKENDS
+    pagination_class = None
+
+    async def get(self, request, *args, **kwargs):
+        # Пользователь задаётся после асинхронной аутентификации
+        self.request = Request(request, authenticators=())
+        try:
+            self.user = await self.authenticate(request)
+            self.request.user = self.user
+            return await self.get_response(**kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(request, exc)
+
+    async def get_response(self, **kwargs):
+        return self.render(await self.get_data(**kwargs))
+
+    async def authenticate(self, request):
+        result = await self.authentication.aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        return result[0]
+
+    async def get_data(self, **kwargs):
+        raise NotImplementedError
+
+    async def check_project_permissions(self, project_id):
+        if self.user.is_manager:
+            return
+        if await aget_project_role(self.user.pk, project_id) not in (
+            "leader",
+            "participant",
+        ):
+            raise exceptions.PermissionDenied(
+                "У вас недостаточно прав для доступа к данному проекту."
+            )
+
+    def get_serializer(self, *args, **kwargs):
+        return self.serializer_class(
+            *args, context={"request": self.request, "view": self}, **kwargs
+        )
+
+    def optimize(self, queryset):
+        return self.optimize_queryset(queryset, self.get_serializer().fields)
+
+    def filter_queryset(self, queryset):
+        # Фильтры только строят запрос, поэтому подходят синхронные
+        for backend in list(self.filter_backends):
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return self.optimize(queryset)
+
+    async def fetch(self, queryset):
+        return [obj async for obj in queryset.aiterator(chunk_size=self.chunk_size)]
+
+    async def paginate_page_number(self, paginator, queryset):
+        """PageNumberPagination.paginate_queryset с асинхронными запросами"""
+        django_paginator = paginator.django_paginator_class(
+            queryset, paginator.get_page_size(self.request)
+        )
+        # count - cached_property: значение подсчитывается заранее
+        django_paginator.count = await queryset.acount()
+        page_number = paginator.get_page_number(self.request, django_paginator)
+        try:
+            paginator.page = django_paginator.page(page_number)
+        except InvalidPage as exc:
+            raise exceptions.NotFound(
+                paginator.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        paginator.request = self.request
+        paginator.page.object_list = await self.fetch(paginator.page.object_list)
+        return paginator.page.object_list
+
+    async def list_data(self, queryset):
+        """Отфильтрованный список, страница с полями пагинации, если она включена"""
+        # Поиск по индексу выбирает способ по схеме базы при первом вызове
+        await aget_search_backend(queryset.db)
+        queryset = self.filter_queryset(queryset)
+        paginator = self.paginator
+        if paginator is None:
+            return self.get_serializer(await self.fetch(queryset), many=True).data
+        if isinstance(paginator, CursorPagination):
+            page = await sync_to_async(paginator.paginate_queryset)(
+                queryset, self.request, self
+            )
+        else:
+            page = await self.paginate_page_number(paginator, queryset)
+        data = self.get_serializer(page, many=True).data
+        return paginator.get_paginated_response(data).data
+
+    async def serialize_one(self, queryset):
+        try:
+            obj = await queryset.aget()
+        except queryset.model.DoesNotExist:
+            raise exceptions.NotFound()
+        return self.get_serializer(obj).data
+
+    def render(self, data, status_code=status.HTTP_200_OK, headers=None):
+        return HttpResponse(
+            self.renderer.render(data),
+            status=status_code,
+            content_type=self.renderer.media_type,
+            headers=headers,
+        )
+
+    def handle_exception(self, request, exc):
+        headers = {}
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            headers["WWW-Authenticate"] = self.authentication.authenticate_header(
+                request
+            )
+        detail = exc.detail
+        if not isinstance(detail, (dict, list)):
+            detail = {"detail": detail}
+        return self.render(detail, exc.status_code, headers)
+
+
+# =====================
+# PROJECT VIEWS
+# =====================
+class AsyncProjectListView(ResponseCacheMixin, AsyncAPIView):
+    serializer_class = ProjectListSerializer
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [SearchIndexFilter]  # ?search= по полнотекстовому индексу
+    cache_responses = True
+
+    async def get_response(self, **kwargs):
+        scope = "manager" if self.user.is_manager else f"user-{self.user.pk}"
+        data, cache_status = await self.acached_get(
+            self.request,
+            ("projects", scope, await aget_projects_version(self.user)),
+            self.get_data,
+            **kwargs,
+        )
+        return self.render(data, headers={"X-Cache": cache_status})
+
+    async def get_data(self, **kwargs):
+        return await self.list_data(
+            Project.objects.for_user(self.user).with_counts().order_by("id")
+        )
+
+
+class AsyncProjectDetailView(AsyncConditionalRequestMixin, AsyncAPIView):
+    serializer_class = ProjectSerializer
+    project_url_kwarg = "pk"
+    object_url_kwarg = "pk"
+    etag_related = [(ProjectMembership, "project_id")]
+    cache_responses = True
+
+    async def get_data(self, pk, **kwargs):
+        if not await Project.objects.filter(id=pk).aexists():
+            raise exceptions.PermissionDenied("Проект не найден!")
+        await self.check_project_permissions(pk)
+        return await self.serialize_one(self.optimize(Project.objects.filter(id=pk)))
+
+
+# =====================
+# BASE VIEWS FOR PARAMETERS
+# =====================
+class AsyncBaseListView(AsyncConditionalRequestMixin, AsyncAPIView):
+    cache_responses = True
+
+    async def get_data(self, project_id, **kwargs):
+        await self.check_project_permissions(project_id)
+        return await self.list_data(self.queryset_class.filter(project_id=project_id))
+
+
+class AsyncBaseDetailView(AsyncConditionalRequestMixin, AsyncAPIView):
+    cache_responses = True
+    object_url_kwarg = "pk"
+
+    async def get_data(self, project_id, pk, **kwargs):
+        await self.check_project_permissions(project_id)
+        return await self.serialize_one(
+            self.optimize(self.queryset_class.filter(project_id=project_id, id=pk))
+        )
+
+
+class AsyncTaskListView(AsyncBaseListView):
+    serializer_class = TaskSerializer
+    queryset_class = Task.objects
+    filterset_class = TaskFilter
+
+
+class AsyncTaskDetailView(AsyncBaseDetailView):
+    serializer_class = TaskSerializer
+    queryset_class = Task.objects
+
+
+class AsyncBudgetListView(AsyncBaseListView):
+    serializer_class = BudgetSerializer
+    queryset_class = Budget.objects
+    filterset_class = BudgetFilter
+
+
+class AsyncBudgetDetailView(AsyncBaseDetailView):
+    serializer_class = BudgetSerializer
+    queryset_class = Budget.objects
+
+
+class AsyncResultListView(AsyncBaseListView):
+    serializer_class = ResultSerializer
+    queryset_class = Result.objects
+
+
+class AsyncResultDetailView(AsyncBaseDetailView):
+    serializer_class = ResultSerializer
+    queryset_class = Result.objects
+
+
+class AsyncRiskListView(AsyncBaseListView):
+    serializer_class = RiskSerializer
+    queryset_class = Risk.objects
+    filterset_class = RiskFilter
+
+
+class AsyncRiskDetailView(AsyncBaseDetailView):
+    serializer_class = RiskSerializer
+    queryset_class = Risk.objects
+
+
+class AsyncProjectMemberListView(AsyncBaseListView):
+    serializer_class = ProjectMembershipSerializer
+    queryset_class = ProjectMembership.objects
+
+
+class AsyncProjectMemberDetailView(AsyncBaseDetailView):
+    serializer_class = ProjectMembershipSerializer
+    queryset_class = ProjectMembership.objects
@@ -0,0 +1,280 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from simple_history.utils import (bulk_create_with_history,
+                                  bulk_update_with_history)
+
+from .events import send_project_event
+from .history import (bulk_history_delete, bulk_history_m2m,
+                      bulk_history_records, changed_instances,
+                      suppress_delete_signals)
+from .models import ProjectMembership, Task
+from .permissions import invalidate_project_role
+from .search import index_objects, remove_objects
+from .stats import (TASK_STATE, apply_stats_changes, refresh_task_dates,
+                    task_status_changes, track_state)
+from .versions import bump_project_version
+
+User = get_user_model()
+
+BULK_BATCH_SIZE = 500  # Размер пакета для bulk_create/bulk_update
+
+
+def find_missing_users(user_ids):
+    """Возвращает id пользователей, которых нет в БД (один запрос)"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return set()
+    existing = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+    return user_ids - existing
+
+
+def set_assigned_users(assignments):
+    """
+    Заменяет назначенных пользователей у задач пакетными запросами.
+    Возвращает id задач, у которых назначения изменились
+    """
+    through = Task.assigned_users.through
+    user_field = Task.assigned_users.field.m2m_reverse_field_name() + "_id"
+    current = {task_id: set() for task_id in assignments}
+    for task_id, user_id in through.objects.filter(
+        task_id__in=assignments.keys()
+    ).values_list("task_id", user_field):
+        current[task_id].add(user_id)
+    through.objects.filter(task_id__in=assignments.keys()).delete()
+    through.objects.bulk_create(
+        [
+            through(task_id=task_id, **{user_field: user_id})
+            for task_id, user_ids in assignments.items()
+            for user_id in set(user_ids)
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    return {
+        task_id
+        for task_id, user_ids in assignments.items()
+        if set(user_ids) != current[task_id]
+    }
+
+
+def bulk_create_tasks(project_id, items, user=None):
+    """
+    Создаёт задачи из провалидированных данных пакетно, вместе с записями
+    истории и назначениями пользователей
+    """
+    tasks = []
+    user_lists = []
+    for data in items:
+        data = dict(data)
+        user_lists.append(data.pop("assigned_users", []))
+        tasks.append(Task(project_id=project_id, **data))
+
+    with transaction.atomic():
+        tasks = bulk_create_with_history(
+            tasks, Task, batch_size=BULK_BATCH_SIZE, default_user=user
+        )
+        assignments = {
+            task.id: user_ids for task, user_ids in zip(tasks, user_lists) if user_ids
+        }
+        if assignments:
+            set_assigned_users(assignments)
+            bulk_history_m2m(Task, tasks, batch_size=BULK_BATCH_SIZE)
+        index_objects(tasks, batch_size=BULK_BATCH_SIZE)
+        # bulk_create не отправляет сигналы: показатели проекта обновляем здесь
+        apply_stats_changes(
+            project_id, **task_status_changes([], [task.status for task in tasks])
+        )
+        if any(task.start_date or task.end_date for task in tasks):
+            refresh_task_dates(project_id)
+        bump_project_version(project_id)
+        send_project_event(project_id, Task, "created", [task.id for task in tasks])
+    return tasks
+
+
+def _update_task_stats(project_id, tasks, fields):
+    """Показатели проекта после пакетного изменения задач"""
+    if "status" in fields:
+        old_statuses = [task._stats_state[TASK_STATE.index("status")] for task in tasks]
+        apply_stats_changes(
+            project_id,
+            **task_status_changes(old_statuses, [task.status for task in tasks]),
+        )
+    if fields & {"start_date", "end_date"}:
+        refresh_task_dates(project_id)
+    for task in tasks:
+        track_state(task, *TASK_STATE)
+
+
+def bulk_update_tasks(tasks, items, user=None):
+    """
+    Обновляет задачи пакетно. tasks - словарь {id: Task},
+    items - провалидированные данные с ключом id
+    """
+    fields = set()
+    assignments = {}
+    for data in items:
+        data = dict(data)
+        task = tasks[data.pop("id")]
+        if "assigned_users" in data:
+            assignments[task.id] = data.pop("assigned_users")
+        for field, value in data.items():
+            setattr(task, field, value)
+        fields.update(data)
+
+    with transaction.atomic():
+        # Задачи без изменений не записываются и не получают записей истории
+        changed = changed_instances(Task, tasks.values()) if fields else []
+        if changed:
+            bulk_update_with_history(
+                changed,
+                Task,
+                sorted(fields),
+                batch_size=BULK_BATCH_SIZE,
+                default_user=user,
+            )
+            if fields & {"name", "description"}:
+                index_objects(changed, batch_size=BULK_BATCH_SIZE)
+        recorded = list(changed)
+        if assignments:
+            changed_ids = {task.id for task in changed}
+            # Задачи, у которых изменились только назначения
+            reassigned = [
+                tasks[task_id]
+                for task_id in sorted(set_assigned_users(assignments) - changed_ids)
+            ]
+            bulk_history_records(
+                Task, reassigned, "~", batch_size=BULK_BATCH_SIZE, default_user=user
+            )
+            recorded += reassigned
+        bulk_history_m2m(Task, recorded, batch_size=BULK_BATCH_SIZE)
+        by_project = {}
+        for task in recorded:
+            by_project.setdefault(task.project_id, []).append(task)
+        for project_id, project_tasks in by_project.items():
+            _update_task_stats(project_id, project_tasks, fields)
+            bump_project_version(project_id)
+            send_project_event(
+                project_id, Task, "updated", [task.id for task in project_tasks]
+            )
+    return list(tasks.values())
+
+
+def bulk_delete_tasks(project_id, ids, user=None):
+    """
+    Удаляет задачи проекта пакетно: записи истории создаются одним запросом,
+    показатели, индекс поиска, версия и события обновляются один раз
+    вместо обработчиков удаления каждой задачи
+    """
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update().filter(project_id=project_id, id__in=ids)
+        )
+        if not tasks:
+            return 0
+        task_ids = [task.id for task in tasks]
+        bulk_history_delete(Task, tasks, batch_size=BULK_BATCH_SIZE, default_user=user)
+        with suppress_delete_signals(Task):
+            Task.objects.filter(id__in=task_ids).delete()
+        remove_objects(Task, task_ids)
+        apply_stats_changes(
+            project_id, **task_status_changes([task.status for task in tasks], [])
+        )
+        if any(task.start_date or task.end_date for task in tasks):
+            refresh_task_dates(project_id)
+        bump_project_version(project_id)
+        send_project_event(project_id, Task, "deleted", task_ids)
+    return len(tasks)
+
+
+def check_membership_changes(project_id, add, remove, change_role):
+    """
+    Проверяет пакет изменений участников проекта. Существующие записи
+    загружаются одним запросом. Возвращает (словарь участий, ошибки)
+    """
+    errors = []
+    user_ids = [item["user"] for item in add + change_role] + list(remove)
+    duplicates = {user_id for user_id, count in Counter(user_ids).items() if count > 1}
+    if duplicates:
+        errors.append(f"Пользователи указаны несколько раз: {sorted(duplicates)}")
+
+    missing = find_missing_users(item["user"] for item in add)
+    if missing:
+        errors.append(f"Пользователи не найдены: {sorted(missing)}")
+
+    memberships = {
+        membership.user_id: membership
+        for membership in ProjectMembership.objects.filter(
+            project_id=project_id, user_id__in=set(user_ids)
+        )
+    }
+    # Проверка unique_together ("user", "project") для всего пакета сразу
+    existing = sorted(item["user"] for item in add if item["user"] in memberships)
+    if existing:
+        errors.append(f"Пользователи уже участвуют в проекте: {existing}")
+    absent = sorted(
+        user_id
+        for user_id in [item["user"] for item in change_role] + list(remove)
+        if user_id not in memberships
+    )
+    if absent:
+        errors.append(f"Пользователи не участвуют в проекте: {absent}")
+    return memberships, errors
+
+
+def bulk_change_memberships(
+    project_id, memberships, add, remove, change_role, user=None
+):
+    """Применяет изменения участников проекта в одной транзакции"""
+    created = [
+        ProjectMembership(
+            project_id=project_id, user_id=item["user"], role=item["role"]
+        )
+        for item in add
+    ]
+    changed = []
+    for item in change_role:
+        membership = memberships[item["user"]]
+        membership.role = item["role"]
+        changed.append(membership)
+
+    with transaction.atomic():
+        if created:
+            created = bulk_create_with_history(
+                created,
+                ProjectMembership,
+                batch_size=BULK_BATCH_SIZE,
+                default_user=user,
+            )
+        if changed:
+            bulk_update_with_history(
+                changed,
+                ProjectMembership,
+                ["role"],
+                batch_size=BULK_BATCH_SIZE,
+                default_user=user,
+            )
+        # Удаление ниже отправляет сигналы, созданные участники учитываются здесь
+        apply_stats_changes(project_id, member_count=len(created))
+        if remove:
+            ProjectMembership.objects.filter(
+                project_id=project_id, user_id__in=remove
+            ).delete()
+        bump_project_version(project_id)
+        send_project_event(
+            project_id,
+            ProjectMembership,
+            "created",
+            [membership.id for membership in created],
+        )
+        send_project_event(
+            project_id,
+            ProjectMembership,
+            "updated",
+            [membership.id for membership in changed],
+        )
+
+    # bulk_create/bulk_update не отправляют сигналы, поэтому сбрасываем кэш ролей
+    for user_id in [item["user"] for item in add + change_role] + list(remove):
+        invalidate_project_role(user_id, project_id)
+    return created, changed
@@ -0,0 +1,102 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+HITS_KEY = "api-cache:hits"
+MISSES_KEY = "api-cache:misses"
+
+_cache_settings = getattr(settings, "API_RESPONSE_CACHE", {})
+
+
+def get_response_cache():
+    return caches[_cache_settings.get("ALIAS", "default")]
+
+
+def _incr(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчика ещё нет или он был вытеснен из кэша
+        cache.set(key, 1, timeout=None)
+
+
+async def _aincr(cache, key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=None)
+
+
+def get_cache_stats():
+    """Количество попаданий и промахов кэша ответов"""
+    cache = get_response_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+def reset_cache_stats():
+    get_response_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+class ResponseCacheMixin:
+    """
+    Кэширование ответов GET. Ключ строится из области видимости пользователя,
+    версии данных и параметров запроса, поэтому при изменении данных
+    старые записи просто перестают использоваться
+    """
+
+    cache_responses = False
+
+    def get_cache_key(self, request, *parts):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(
+            f"{request.get_host()}{request.path}?{query}".encode()
+        ).hexdigest()
+        return ":".join(["api", *map(str, parts), digest])
+
+    def cached_get(self, request, key_parts, get_response, *args, **kwargs):
+        if not self.cache_responses:
+            return get_response(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        key = self.get_cache_key(request, *key_parts)
+        data = cache.get(key)
+        if data is not None:
+            _incr(cache, HITS_KEY)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        _incr(cache, MISSES_KEY)
+        response = get_response(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, _cache_settings.get("TIMEOUT", 300))
+        response["X-Cache"] = "MISS"
+        return response
+
+    async def acached_get(self, request, key_parts, get_data, **kwargs):
+        """
+        Асинхронный вариант cached_get для async_views: get_data - корутина,
+        возвращающая данные ответа. Возвращает (данные, HIT/MISS или None)
+        """
+        if not self.cache_responses:
+            return await get_data(**kwargs), None
+
+        cache = get_response_cache()
+        key = self.get_cache_key(request, *key_parts)
+        data = await cache.aget(key)
+        if data is not None:
+            await _aincr(cache, HITS_KEY)
+            return data, "HIT"
+
+        await _aincr(cache, MISSES_KEY)
+        data = await get_data(**kwargs)
+        await cache.aset(key, data, _cache_settings.get("TIMEOUT", 300))
+        return data, "MISS"
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import heapq
+import json
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import ManyRelatedField
+
+from .history import (get_m2m_history_values, get_settled_time,
+                      resolve_omitted_fields)
+from .models import Budget, Project, ProjectMembership, Result, Risk, Task
+from .serializers import (BudgetSerializer, ProjectMembershipSerializer,
+                          ProjectSerializer, ResultSerializer, RiskSerializer,
+                          TaskSerializer)
+
+# Модели журнала изменений проекта и их сериализаторы. Порядок задаёт
+# позицию в курсоре и порядок записей с одинаковым временем изменения
+CHANGE_MODELS = [
+    (Project, ProjectSerializer),
+    (ProjectMembership, ProjectMembershipSerializer),
+    (Task, TaskSerializer),
+    (Budget, BudgetSerializer),
+    (Risk, RiskSerializer),
+    (Result, ResultSerializer),
+]
+CHANGE_ACTIONS = {"+": "created", "~": "updated", "-": "deleted"}
+
+
+def encode_cursor(marks):
+    """Курсор - последние переданные history_id по каждой таблице истории"""
+    raw = json.dumps(marks, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return [0] * len(CHANGE_MODELS)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        marks = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ValidationError({"since": "Некорректный курсор."})
+    if (
+        not isinstance(marks, list)
+        or len(marks) != len(CHANGE_MODELS)
+        or not all(isinstance(mark, int) and mark >= 0 for mark in marks)
+    ):
+        raise ValidationError({"since": "Некорректный курсор."})
+    return marks
+
+
+def _history_queryset(model, project_id, mark, settled):
+    lookup = "id" if model is Project else "project_id"
+    queryset = model.history.filter(
+        **{lookup: project_id, "history_id__gt": mark, "history_date__lte": settled}
+    )
+    return queryset.order_by("history_id")
+
+
+def _sort_keys(position, records):
+    for record in records:
+        yield (record.history_date, position, record.history_id), record
+
+
+def serialize_records(serializer_class, records):
+    """
+    Данные записей истории. Связи многие-ко-многим берутся из снимков
+    связей в истории (m2m_fields); связи без истории не передаются
+    """
+    resolve_omitted_fields(records)
+    serializer = serializer_class([record.instance for record in records], many=True)
+    many = []
+    for name, field in list(serializer.child.fields.items()):
+        if isinstance(field, ManyRelatedField):
+            serializer.child.fields.pop(name)
+            many.append(name)
+    data = serializer.data
+    if many and records:
+        values = get_m2m_history_values(
+            type(records[0]), [record.history_id for record in records], many
+        )
+        for item, record in zip(data, records):
+            item.update(values[record.history_id])
+    return data
+
+
+def get_project_changes(project_id, cursor=None, limit=100):
+    """
+    Изменения проекта и его дочерних объектов после курсора, упорядоченные
+    по времени. Возвращает (изменения, новый курсор, есть ли ещё изменения).
+    Передаются только записи старше HISTORY_SAFETY_LAG: курсор не проходит
+    дальше history_id записи, транзакция которой ещё может быть не
+    зафиксирована, и такие записи не теряются
+    """
+    marks = decode_cursor(cursor)
+    settled = get_settled_time()
+    tables = []
+    for position, (model, serializer_class) in enumerate(CHANGE_MODELS):
+        # Из каждой таблицы читаем не больше limit + 1 записей по history_id
+        records = list(
+            _history_queryset(model, project_id, marks[position], settled)[: limit + 1]
+        )
+        tables.append(records)
+
+    merged = heapq.merge(
+        *(_sort_keys(position, records) for position, records in enumerate(tables))
+    )
+    selected = [[] for _ in CHANGE_MODELS]
+    order = []
+    for (_, position, _), record in merged:
+        if len(order) == limit:
+            break
+        selected[position].append(record)
+        order.append((position, len(selected[position]) - 1))
+
+    data = [
+        serialize_records(serializer_class, records) if records else []
+        for (_, serializer_class), records in zip(CHANGE_MODELS, selected)
+    ]
+    changes = []
+    for position, index in order:
+        record = selected[position][index]
+        model = CHANGE_MODELS[position][0]
+        action = CHANGE_ACTIONS[record.history_type]
+        changes.append(
+            {
+                "model": model._meta.model_name,
+                "action": action,
+                "id": record.id,
+                "changed_at": record.history_date,
+                "data": data[position][index] if action != "deleted" else None,
+            }
+        )
+
+    new_marks = [
+        records[-1].history_id if records else mark
+        for records, mark in zip(selected, marks)
+    ]
+    has_more = sum(len(records) for records in tables) > len(order)
+    return changes, encode_cursor(new_marks), has_more
@@ -0,0 +1,271 @@
+from django.db.models import Count, Max, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.response import Response
+
+from .caching import ResponseCacheMixin
+from .models import Project
+from .permissions import aget_project_role
+from .versions import aget_project_version, get_project_version
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "Данные проекта были изменены. Обновите их и повторите запрос."
+    default_code = "precondition_failed"
+
+
+class ProjectVersionMixin:
+    """
+    ETag по версии проекта и проверка If-Match при изменении данных.
+
+    У представлений одного объекта (object_url_kwarg) ETag строится по
+    последней записи истории объекта и связям из etag_related, поэтому
+    изменения других объектов проекта его не меняют. Last-Modified остаётся
+    временем изменения проекта: оно не раньше изменения объекта
+    """
+
+    project_url_kwarg = "project_id"
+    object_url_kwarg = None
+    # [(модель с историей, поле ссылки на объект)]: связанные объекты в
+    # ответе. Наибольший history_id их истории меняется при любом изменении
+    # на месте, число строк - при переносе строки к другому объекту
+    etag_related = []
+
+    def get_conditional_project_id(self):
+        return self.kwargs[self.project_url_kwarg]
+
+    def get_conditional_model(self):
+        return self.serializer_class.Meta.model
+
+    def get_object_version_queries(self, pk):
+        """Последняя запись истории объекта и состояние связей из etag_related"""
+        model = self.get_conditional_model()
+        project_field = "id" if model is Project else "project_id"
+        history = (
+            model.history.filter(id=pk)
+            .order_by("-history_id")
+            .values_list("history_id", "history_type", project_field)
+        )
+        related = []
+        for related_model, field in self.etag_related:
+            count = (
+                related_model.objects.filter(**{field: pk})
+                .order_by()
+                .values(field)
+                .annotate(count=Count("pk"))
+                .values("count")
+            )
+            related.append(
+                related_model.history.filter(**{field: pk})
+                .values(field)
+                .order_by(field)
+                .annotate(last=Max("history_id"), count=Coalesce(Subquery(count), 0))
+                .values_list("count", "last")
+            )
+        return history, related
+
+    def make_object_version(self, project_id, record, related):
+        """
+        Версия объекта для ETag или None, если у объекта нет истории.
+        NotFound, если объекта нет в проекте
+        """
+        if record is None:
+            return None
+        history_id, history_type, record_project_id = record
+        if history_type == "-" or str(record_project_id) != str(project_id):
+            raise NotFound()
+        parts = [str(history_id)]
+        parts += [
+            f"{count}.{last}" for count, last in (row or (0, 0) for row in related)
+        ]
+        return "-".join(parts)
+
+    def get_object_version(self, project_id, pk):
+        history, related = self.get_object_version_queries(pk)
+        return self.make_object_version(
+            project_id, history.first(), [query.first() for query in related]
+        )
+
+    async def aget_object_version(self, project_id, pk):
+        history, related = self.get_object_version_queries(pk)
+        return self.make_object_version(
+            project_id,
+            await history.afirst(),
+            [await query.afirst() for query in related],
+        )
+
+    def make_validators(self, project_id, version, object_version):
+        if not version:
+            return None, None
+        if not self.object_url_kwarg:
+            return f'"{project_id}-{version[0]}"', version[1]
+        if not object_version:
+            return None, None
+        pk = self.kwargs[self.object_url_kwarg]
+        return f'"{project_id}-{pk}-{object_version}"', version[1]
+
+    def get_validators(self, project_id):
+        """Возвращает (ETag, время изменения) или (None, None)"""
+        cache = self.__dict__.setdefault("_validators", {})
+        if project_id not in cache:
+            version = get_project_version(project_id)
+            object_version = None
+            if version and self.object_url_kwarg:
+                object_version = self.get_object_version(
+                    project_id, self.kwargs[self.object_url_kwarg]
+                )
+            cache[project_id] = self.make_validators(
+                project_id, version, object_version
+            )
+        return cache[project_id]
+
+    async def aget_validators(self, project_id):
+        """Асинхронный вариант get_validators"""
+        version = await aget_project_version(project_id)
+        object_version = None
+        if version and self.object_url_kwarg:
+            object_version = await self.aget_object_version(
+                project_id, self.kwargs[self.object_url_kwarg]
+            )
+        return self.make_validators(project_id, version, object_version)
+
+    def lock_object(self):
+        """Блокирует строку изменяемого объекта до конца транзакции"""
+        model = self.get_conditional_model()
+        pk = self.kwargs[self.object_url_kwarg]
+        list(model.objects.select_for_update().filter(pk=pk).values_list("pk"))
+
+    def check_if_match(self, project_id):
+        """
+        Проверяет заголовок If-Match перед изменением данных проекта.
+        Вызывается в транзакции изменения: строка объекта заблокирована до
+        её конца, поэтому из параллельных запросов с одним ETag изменение
+        выполнит только первый, остальные получат 412
+        """
+        if_match = self.request.headers.get("If-Match")
+        if not if_match:
+            return
+        if self.object_url_kwarg:
+            self.lock_object()
+        # Версия читается после блокировки
+        self.__dict__.pop("_validators", None)
+        etag, _ = self.get_validators(project_id)
+        etags = parse_etags(if_match)
+        if "*" not in etags and etag not in etags:
+            raise PreconditionFailed()
+
+
+class BaseConditionalMixin(ResponseCacheMixin, ProjectVersionMixin):
+    """Общая часть условных запросов синхронных и асинхронных представлений"""
+
+    def is_user_dependent_query(self):
+        """
+        Фильтры запроса зависят от пользователя (FilterSet.is_user_dependent):
+        такие ответы кэшируются отдельно для каждого пользователя
+        """
+        filterset_class = getattr(self, "filterset_class", None)
+        check = getattr(filterset_class, "is_user_dependent", None)
+        return bool(check and check(self.request.query_params))
+
+    def make_cache_scope(self, role):
+        scope = "manager" if self.request.user.is_manager else role
+        if self.is_user_dependent_query():
+            return f"{scope}-user-{self.request.user.pk}"
+        return scope
+
+    def get_cache_scope(self, project_id):
+        if self.request.user.is_manager:
+            return self.make_cache_scope(None)
+        return self.make_cache_scope(self.get_project_role(project_id))
+
+    async def aget_cache_scope(self, project_id):
+        if self.request.user.is_manager:
+            return self.make_cache_scope(None)
+        return self.make_cache_scope(
+            await aget_project_role(self.request.user.pk, project_id)
+        )
+
+    def is_not_modified(self, request, etag, modified_at):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return "*" in etags or etag in etags
+        if_modified_since = parse_http_date_safe(
+            request.headers.get("If-Modified-Since", "")
+        )
+        return (
+            if_modified_since is not None
+            and int(modified_at.timestamp()) <= if_modified_since
+        )
+
+    def get_conditional_headers(self, etag, modified_at):
+        return {"ETag": etag, "Last-Modified": http_date(modified_at.timestamp())}
+
+    def get_conditional_cache_key(self, scope, etag, modified_at):
+        # Время изменения в ключе защищает от совпадения версий после
+        # пересоздания базы при долгоживущем внешнем кэше
+        return (scope, etag.strip('"'), modified_at.timestamp())
+
+
+class ConditionalRequestMixin(BaseConditionalMixin):
+    """
+    GET с совпадающим If-None-Match (или If-Modified-Since) возвращает 304
+    до выполнения запросов к данным и сериализации. Если включено
+    cache_responses, ответ кэшируется с ключом по версии проекта
+    """
+
+    def get(self, request, *args, **kwargs):
+        project_id = self.get_conditional_project_id()
+        self.check_project_permissions(project_id)
+        etag, modified_at = self.get_validators(project_id)
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+
+        headers = self.get_conditional_headers(etag, modified_at)
+        if self.is_not_modified(request, etag, modified_at):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = self.cached_get(
+            request,
+            self.get_conditional_cache_key(
+                self.get_cache_scope(project_id), etag, modified_at
+            ),
+            super().get,
+            *args,
+            **kwargs,
+        )
+        if response.status_code == status.HTTP_200_OK:
+            for header, value in headers.items():
+                response[header] = value
+        return response
+
+
+class AsyncConditionalRequestMixin(BaseConditionalMixin):
+    """
+    ConditionalRequestMixin для асинхронных представлений (async_views):
+    те же ETag, 304 и ключи кэша, запросы через асинхронный ORM
+    """
+
+    async def get_response(self, **kwargs):
+        project_id = self.get_conditional_project_id()
+        await self.check_project_permissions(project_id)
+        etag, modified_at = await self.aget_validators(project_id)
+        if etag is None:
+            return await super().get_response(**kwargs)
+
+        headers = self.get_conditional_headers(etag, modified_at)
+        if self.is_not_modified(self.request, etag, modified_at):
+            return self.render(None, status.HTTP_304_NOT_MODIFIED, headers)
+        data, cache_status = await self.acached_get(
+            self.request,
+            self.get_conditional_cache_key(
+                await self.aget_cache_scope(project_id), etag, modified_at
+            ),
+            self.get_data,
+            **kwargs,
+        )
+        if cache_status:
+            headers["X-Cache"] = cache_status
+        return self.render(data, headers=headers)
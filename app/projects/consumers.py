@@ -0,0 +1,44 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import project_group_name
+from .models import ProjectMembership
+from .permissions import get_project_role
+
+
+class ProjectConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Поток изменений проекта: события о создании, изменении и удалении
+    задач, рисков, бюджетов, результатов и участников.
+    Подключение: ws/projects/<id>/?token=<access-токен>
+    """
+
+    async def connect(self):
+        self.project_id = self.scope["url_route"]["kwargs"]["project_id"]
+        self.group_name = project_group_name(self.project_id)
+        if not await self.has_access():
+            await self.close(code=4403)
+            return
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def has_access(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            return False
+        if user.is_manager:
+            return True
+        role = await database_sync_to_async(get_project_role)(user.pk, self.project_id)
+        return role in ("leader", "participant")
+
+    async def project_event(self, event):
+        payload = event["payload"]
+        # Пользователя могли исключить из проекта
+        if payload["model"] == ProjectMembership._meta.model_name:
+            if not await self.has_access():
+                await self.close(code=4403)
+                return
+        await self.send_json(payload)
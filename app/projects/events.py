@@ -0,0 +1,35 @@
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+def project_group_name(project_id):
+    return f"project_{int(project_id)}"
+
+
+def _group_send(project_id, payload):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        project_group_name(project_id), {"type": "project.event", "payload": payload}
+    )
+
+
+def send_project_event(project_id, model, action, ids):
+    """
+    Отправляет подписчикам проекта событие об изменении объектов после
+    фиксации транзакции. action - created, updated или deleted
+    """
+    if not project_id or not ids:
+        return
+    payload = {
+        "project_id": int(project_id),
+        "model": model._meta.model_name,
+        "action": action,
+        "ids": sorted(ids),
+    }
+    # Ошибка доставки события не должна влиять на сохранённые данные
+    transaction.on_commit(partial(_group_send, project_id, payload), robust=True)
@@ -0,0 +1,83 @@
+import csv
+import tempfile
+
+from django.http import StreamingHttpResponse
+from openpyxl import Workbook
+
+EXPORT_CHUNK_SIZE = 2000  # Количество строк, загружаемых из БД за один запрос
+FILE_CHUNK_SIZE = 64 * 1024  # Размер блока при отдаче XLSX файла
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(resource, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Заголовок и строки экспорта без построения Dataset в памяти"""
+    yield resource.get_export_headers()
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield resource.export_resource(obj)
+
+
+def stream_csv_rows(rows):
+    writer = csv.writer(Echo())
+    yield "\ufeff"  # BOM, чтобы Excel правильно открыл кириллицу
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_csv(resource, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    return stream_csv_rows(iter_export_rows(resource, queryset, chunk_size))
+
+
+def write_csv(rows, file):
+    """Пишет строки экспорта в бинарный файл в формате CSV"""
+    for line in stream_csv_rows(rows):
+        file.write(line.encode("utf-8"))
+
+
+def write_xlsx(rows, file):
+    """Пишет XLSX в режиме write_only: строки не накапливаются в памяти"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
+
+
+def stream_xlsx(resource, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    with tempfile.TemporaryFile() as file:
+        write_xlsx(iter_export_rows(resource, queryset, chunk_size), file)
+        file.seek(0)
+        while chunk := file.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+STREAMS = {
+    "csv": stream_csv,
+    "xlsx": stream_xlsx,
+}
+
+WRITERS = {
+    "csv": write_csv,
+    "xlsx": write_xlsx,
+}
+
+
+def export_response(resource, queryset, file_format, filename):
+    """Потоковый HTTP-ответ с экспортом queryset в CSV или XLSX"""
+    queryset = resource.get_export_queryset(queryset)
+    response = StreamingHttpResponse(
+        STREAMS[file_format](resource, queryset),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{file_format}"'
+    return response
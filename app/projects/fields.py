@@ -0,0 +1,56 @@
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetMixin:
+    """
+    Ограничивает queryset полями, которые реально выводит сериализатор
+    (с учётом ?fields= и ?expand=): невыбранные текстовые поля не
+    загружаются, а связи многие-ко-многим подгружаются одним запросом
+    только если они запрошены
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return self.optimize_queryset(queryset, self.get_serializer().fields)
+
+    def optimize_queryset(self, queryset, fields):
+        opts = queryset.model._meta
+        concrete = {field.name: field for field in opts.concrete_fields}
+        related = {field.name: field for field in opts.many_to_many}
+        only = {opts.pk.name}
+        select = []
+        prefetch = []
+        for field in fields.values():
+            source = field.source.split(".")[0]
+            if source in concrete:
+                only.add(source)
+                if concrete[source].is_relation and isinstance(
+                    field, serializers.BaseSerializer
+                ):
+                    # Развёрнутый внешний ключ загружается через JOIN
+                    select.append(source)
+                    only.update(
+                        f"{source}__{name}"
+                        for name in field.fields
+                        if name in field.Meta.model._meta._forward_fields_map
+                    )
+            elif source in related:
+                if isinstance(field, serializers.ManyRelatedField):
+                    # Нужны только id связанных объектов
+                    model = related[source].related_model
+                    prefetch.append(Prefetch(source, queryset=model.objects.only("pk")))
+                else:
+                    prefetch.append(source)
+            elif source != "*" and hasattr(queryset.model, source):
+                # Поле вычисляется в модели: не ограничиваем загрузку
+                return queryset
+        queryset = queryset.only(*only)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
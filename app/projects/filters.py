@@ -0,0 +1,88 @@
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django_filters import rest_framework as filters
+
+from .models import Budget, Risk, Task
+from .search import search_object_ids
+
+
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    """Список значений через запятую: ?status=pending,in_progress"""
+
+
+class TaskFilter(filters.FilterSet):
+    """
+    Фильтры списка задач проекта. Каждому фильтру соответствует индекс
+    (project, <поле>); при пагинации по курсору сортировка всегда по id
+    """
+
+    status = CharInFilter(field_name="status")
+    assignee = filters.CharFilter(
+        method="filter_assignee", label="id пользователя или me"
+    )
+    date_from = filters.DateFilter(method="filter_date_from")
+    date_to = filters.DateFilter(method="filter_date_to")
+    overdue = filters.BooleanFilter(method="filter_overdue")
+    ordering = filters.OrderingFilter(
+        fields=("id", "name", "status", "start_date", "end_date")
+    )
+
+    class Meta:
+        model = Task
+        fields = ["status", "assignee", "date_from", "date_to", "overdue"]
+
+    @classmethod
+    def is_user_dependent(cls, params):
+        """Результат зависит от пользователя запроса (?assignee=me)"""
+        return params.get("assignee") == "me"
+
+    def filter_assignee(self, queryset, name, value):
+        if value == "me":
+            user_id = self.request.user.pk
+        elif value.isdigit():
+            user_id = int(value)
+        else:
+            return queryset.none()
+        # Exists вместо JOIN, чтобы не получать дубликаты строк
+        assignments = Task.assigned_users.through.objects.filter(
+            task_id=OuterRef("pk"),
+            **{Task.assigned_users.field.m2m_reverse_field_name(): user_id},
+        )
+        return queryset.filter(Exists(assignments))
+
+    # Пересечение периода задачи с [date_from, date_to], открытые даты
+    # задачи считаются бесконечными
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(Q(end_date__gte=value) | Q(end_date__isnull=True))
+
+    def filter_date_to(self, queryset, name, value):
+        return queryset.filter(Q(start_date__lte=value) | Q(start_date__isnull=True))
+
+    def filter_overdue(self, queryset, name, value):
+        overdue = Q(end_date__lt=timezone.localdate()) & ~Q(status="completed")
+        return queryset.filter(overdue if value else ~overdue)
+
+
+class BudgetFilter(filters.FilterSet):
+    year = filters.NumberFilter()
+    year_min = filters.NumberFilter(field_name="year", lookup_expr="gte")
+    year_max = filters.NumberFilter(field_name="year", lookup_expr="lte")
+    amount_min = filters.NumberFilter(field_name="amount", lookup_expr="gte")
+    amount_max = filters.NumberFilter(field_name="amount", lookup_expr="lte")
+    ordering = filters.OrderingFilter(fields=("id", "year", "amount"))
+
+    class Meta:
+        model = Budget
+        fields = ["year", "year_min", "year_max", "amount_min", "amount_max"]
+
+
+class RiskFilter(filters.FilterSet):
+    search = filters.CharFilter(method="filter_search", label="Полнотекстовый поиск")
+    ordering = filters.OrderingFilter(fields=("id", "name"))
+
+    class Meta:
+        model = Risk
+        fields = ["search"]
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(pk__in=search_object_ids(Risk, value))
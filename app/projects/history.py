@@ -0,0 +1,360 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Max, Q
+from django.db.models.signals import post_init
+from django.dispatch import receiver
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import pre_create_historical_record
+
+_suppressed = threading.local()
+
+
+@contextmanager
+def suppress_delete_signals(model):
+    """
+    Удаление объектов model без обработчиков post_delete на каждый объект
+    (история, показатели, индекс поиска, события): вызывающий код
+    обновляет их пакетно
+    """
+    previous = getattr(_suppressed, "models", frozenset())
+    _suppressed.models = previous | {model}
+    try:
+        yield
+    finally:
+        _suppressed.models = previous
+
+
+def delete_signals_suppressed(model):
+    return model in getattr(_suppressed, "models", ())
+
+
+@contextmanager
+def deleting_projects(project_ids):
+    """
+    Удаление проектов: обработчики post_delete дочерних строк (показатели,
+    индекс поиска, события, версии) не вызываются для каждой строки каскада -
+    эти данные удаляются вместе с проектом
+    """
+    previous = getattr(_suppressed, "projects", frozenset())
+    _suppressed.projects = previous | set(project_ids)
+    try:
+        yield
+    finally:
+        _suppressed.projects = previous
+
+
+def project_deleting(project_id):
+    return project_id in getattr(_suppressed, "projects", ())
+
+
+def get_settled_time():
+    """
+    Время, до которого записи истории считаются зафиксированными
+    (HISTORY_SAFETY_LAG секунд назад). history_id выдаётся при записи, а
+    видимой запись становится при фиксации транзакции, поэтому более
+    свежие записи могут появиться позже записей с большим history_id
+    """
+    lag = getattr(settings, "HISTORY_SAFETY_LAG", 60)
+    return timezone.now() - timedelta(seconds=lag)
+
+
+class HistoricalDiffFields(models.Model):
+    """
+    Базовый класс модели истории, в которой поля diff_fields хранятся
+    только при изменении. Пропущенные поля перечислены в history_omitted
+    и равны значению из предыдущей версии
+    """
+
+    history_omitted = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        abstract = True
+
+    def get_omitted_fields(self):
+        return [name for name in self.history_omitted.split(",") if name]
+
+
+class TrackedHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords, который не создаёт запись истории, если при
+    сохранении не изменилось ни одно отслеживаемое поле (сравнение со
+    снимком значений, сделанным при загрузке объекта).
+    diff_fields - большие поля, значение которых попадает в историю только
+    при изменении (см. HistoricalDiffFields)
+    """
+
+    def __init__(self, *args, diff_fields=(), **kwargs):
+        self.diff_fields = tuple(diff_fields)
+        if self.diff_fields:
+            kwargs["bases"] = (HistoricalDiffFields, *kwargs.get("bases", ()))
+        super().__init__(*args, **kwargs)
+
+    def finalize(self, sender, **kwargs):
+        super().finalize(sender, **kwargs)
+        if sender is self.cls:
+            self.tracked_attnames = [
+                field.attname for field in self.fields_included(sender)
+            ]
+            post_init.connect(self.post_init, sender=sender, weak=False)
+            sender._history_records = self
+
+    def copy_fields(self, model):
+        fields = super().copy_fields(model)
+        for name in self.diff_fields:
+            # Пропущенное значение хранится как NULL
+            fields[name].null = True
+        return fields
+
+    def get_extra_fields(self, model, fields):
+        extra_fields = super().get_extra_fields(model, fields)
+        get_instance = extra_fields["instance"].fget
+
+        def get_resolved_instance(record):
+            resolve_omitted_fields([record])
+            return get_instance(record)
+
+        extra_fields["instance"] = property(get_resolved_instance)
+        extra_fields["history_diff_fields"] = self.diff_fields
+        return extra_fields
+
+    def take_snapshot(self, instance):
+        # Через __dict__, чтобы не загружать отложенные (only/defer) поля
+        instance._history_snapshot = {
+            attname: instance.__dict__[attname]
+            for attname in self.tracked_attnames
+            if attname in instance.__dict__
+        }
+
+    def post_init(self, instance, **kwargs):
+        self.take_snapshot(instance)
+
+    def has_changes(self, instance):
+        snapshot = getattr(instance, "_history_snapshot", None)
+        if snapshot is None:
+            return True
+        for attname in self.tracked_attnames:
+            if attname in snapshot:
+                if instance.__dict__.get(attname) != snapshot[attname]:
+                    return True
+            elif attname in instance.__dict__:
+                # Отложенное поле было загружено или присвоено
+                return True
+        return False
+
+    def m2m_changed(self, instance, action, attr, pk_set, reverse, **kwargs):
+        """
+        Запись истории при изменении связей многие-ко-многим. При изменении
+        с другой стороны связи (user.tasks.add) запись создаётся у каждого
+        затронутого объекта; добавление уже существующих связей пропускается
+        """
+        if hasattr(instance, "skip_history_when_saving"):
+            return
+        if action in ("post_add", "post_remove") and not pk_set:
+            return
+        if not reverse:
+            super().m2m_changed(instance, action, attr, pk_set, reverse, **kwargs)
+            return
+        field = self.cls._meta.get_field(attr)
+        through = field.remote_field.through
+        source = field.m2m_field_name() + "_id"
+        if action == "pre_clear":
+            instance._history_cleared = list(
+                through.objects.filter(
+                    **{field.m2m_reverse_field_name(): instance.pk}
+                ).values_list(source, flat=True)
+            )
+            return
+        if action == "post_clear":
+            pk_set = instance.__dict__.pop("_history_cleared", ())
+        elif action not in ("post_add", "post_remove"):
+            return
+        for obj in self.cls._default_manager.filter(pk__in=pk_set):
+            self.create_historical_record(obj, "~")
+
+    def post_delete(self, instance, using=None, **kwargs):
+        if not delete_signals_suppressed(type(instance)):
+            super().post_delete(instance, using=using, **kwargs)
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        if not created and not kwargs.get("raw") and not self.has_changes(instance):
+            return
+        super().post_save(instance, created, using=using, **kwargs)
+        self.take_snapshot(instance)
+
+
+@receiver(pre_create_historical_record)
+def omit_unchanged_fields(sender, instance, history_instance, **kwargs):
+    """Не сохраняет в историю неизменённые значения полей diff_fields"""
+    diff_fields = getattr(sender, "history_diff_fields", ())
+    if not diff_fields or history_instance.history_type == "+":
+        return
+    snapshot = getattr(instance, "_history_snapshot", {})
+    omitted = []
+    for name in diff_fields:
+        if name in snapshot and snapshot[name] == getattr(history_instance, name):
+            setattr(history_instance, name, None)
+            omitted.append(name)
+    history_instance.history_omitted = ",".join(omitted)
+
+
+def changed_instances(model, objs):
+    """
+    Объекты, у которых изменилось хотя бы одно отслеживаемое поле: пакетная
+    запись с историей (bulk_update_with_history) пропускает неизменённые,
+    как post_save. Снимки значений изменённых объектов обновляются
+    """
+    records = model._history_records
+    changed = [obj for obj in objs if records.has_changes(obj)]
+    for obj in changed:
+        records.take_snapshot(obj)
+    return changed
+
+
+def bulk_history_records(model, objs, history_type, batch_size=None, default_user=None):
+    """Записи истории объектов с типом history_type одним bulk_create"""
+    history_model = model.history.model
+    history_date = timezone.now()
+    records = []
+    for instance in objs:
+        record = history_model(
+            history_date=history_date,
+            history_type=history_type,
+            history_user=default_user
+            or history_model.get_default_history_user(instance),
+            history_change_reason="",
+            **{
+                field.attname: getattr(instance, field.attname)
+                for field in history_model.tracked_fields
+            },
+        )
+        omit_unchanged_fields(history_model, instance, record)
+        records.append(record)
+    return history_model.objects.bulk_create(records, batch_size=batch_size)
+
+
+def bulk_history_delete(model, objs, batch_size=None, default_user=None):
+    """Записи истории удаления ("-") для объектов одним bulk_create"""
+    return bulk_history_records(
+        model, objs, "-", batch_size=batch_size, default_user=default_user
+    )
+
+
+def get_m2m_history_models(model):
+    """[(поле, модель истории связей)] для m2m_fields истории модели"""
+    history_model = model.history.model
+    return [
+        (field, HistoricalRecords.m2m_models[field])
+        for field in getattr(history_model, "_history_m2m_fields", ())
+    ]
+
+
+def bulk_history_m2m(model, objs, batch_size=None):
+    """
+    Снимки связей многие-ко-многим для последних записей истории объектов.
+    Пакетная запись создаёт историю без снимков, а связи записывает после
+    неё: снимок делается, когда связи уже записаны
+    """
+    m2m_models = get_m2m_history_models(model)
+    ids = sorted({obj.pk for obj in objs})
+    if not m2m_models or not ids:
+        return
+    pk_name = model._meta.pk.attname
+    for start in range(0, len(ids), batch_size or len(ids)):
+        batch = ids[start : start + (batch_size or len(ids))]
+        latest = dict(
+            model.history.filter(**{f"{pk_name}__in": batch})
+            .values(pk_name)
+            .order_by(pk_name)
+            .annotate(last=Max("history_id"))
+            .values_list(pk_name, "last")
+        )
+        for field, m2m_model in m2m_models:
+            through = field.remote_field.through
+            source = field.m2m_field_name() + "_id"
+            m2m_model.objects.filter(history_id__in=latest.values()).delete()
+            m2m_model.objects.bulk_create(
+                [
+                    m2m_model(
+                        history_id=latest[getattr(row, source)],
+                        **{
+                            through_field.attname: getattr(row, through_field.attname)
+                            for through_field in through._meta.fields
+                        },
+                    )
+                    for row in through.objects.filter(**{f"{source}__in": latest})
+                ],
+                batch_size=batch_size,
+            )
+
+
+def get_m2m_history_values(history_model, history_ids, names=None):
+    """
+    Связи многие-ко-многим на момент записей истории:
+    {history_id: {поле: [id связанных объектов]}}, один запрос на поле
+    """
+    values = {history_id: {} for history_id in history_ids}
+    for field in getattr(history_model, "_history_m2m_fields", ()):
+        if names is not None and field.name not in names:
+            continue
+        m2m_model = HistoricalRecords.m2m_models[field]
+        target = field.m2m_reverse_field_name() + "_id"
+        for item in values.values():
+            item[field.name] = []
+        rows = (
+            m2m_model.objects.filter(history_id__in=values)
+            .order_by("history_id", target)
+            .values_list("history_id", target)
+        )
+        for history_id, target_id in rows:
+            values[history_id][field.name].append(target_id)
+    return values
+
+
+def resolve_omitted_fields(records):
+    """
+    Подставляет в записи истории одной модели значения пропущенных полей
+    из предыдущих версий: один запрос на каждое пропущенное поле
+    """
+    pending = [record for record in records if getattr(record, "history_omitted", "")]
+    if not pending:
+        return records
+    history_model = type(pending[0])
+    pk_name = history_model.instance_type._meta.pk.attname
+
+    by_field = {}
+    for record in pending:
+        for name in record.get_omitted_fields():
+            by_field.setdefault(name, []).append(record)
+    for name, field_records in by_field.items():
+        stored = (
+            history_model._default_manager.filter(
+                **{
+                    f"{pk_name}__in": {
+                        getattr(record, pk_name) for record in field_records
+                    }
+                },
+                history_id__lt=max(record.history_id for record in field_records),
+            )
+            .exclude(Q(**{f"{name}__isnull": True}) & Q(history_omitted__contains=name))
+            .order_by(pk_name, "history_id")
+            .values_list(pk_name, "history_id", name)
+        )
+        versions = {}
+        for object_id, history_id, value in stored:
+            ids, values = versions.setdefault(object_id, ([], []))
+            ids.append(history_id)
+            values.append(value)
+        for record in field_records:
+            ids, values = versions.get(getattr(record, pk_name), ([], []))
+            position = bisect_left(ids, record.history_id)
+            setattr(record, name, values[position - 1] if position else None)
+
+    for record in pending:
+        record.history_omitted = ""
+    return records
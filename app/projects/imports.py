@@ -0,0 +1,336 @@
+from copy import copy
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.encoding import force_str
+from import_export import resources, widgets
+from import_export.instance_loaders import ModelInstanceLoader
+from simple_history.utils import (bulk_create_with_history,
+                                  bulk_update_with_history)
+
+from .events import send_project_event
+from .history import bulk_history_m2m, bulk_history_records, changed_instances
+from .search import DOCUMENT_BUILDERS, get_kind, index_objects
+from .stats import rebuild_project_stats
+from .versions import bump_project_versions
+
+IMPORT_BATCH_SIZE = 1000  # Строк в одном bulk_create/bulk_update и запросе
+
+
+def chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def parse_date(value, formats):
+    """Дата из значения ячейки или само значение, если его не разобрать"""
+    if isinstance(value, datetime):
+        return value.date()
+    if not isinstance(value, str) or not value.strip():
+        return value
+    for date_format in formats:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return value
+
+
+def parse_date_column(dataset, column, formats):
+    """
+    Заменяет строки столбца датами. Каждое уникальное значение разбирается
+    один раз; неразобранные значения остаются, и ошибку покажет виджет
+    """
+    if column not in (dataset.headers or []):
+        return
+    index = dataset.headers.index(column)
+    values = dataset.get_col(index)
+    parsed = {value: parse_date(value, formats) for value in set(values)}
+    del dataset[column]
+    dataset.insert_col(index, [parsed[value] for value in values], header=column)
+
+
+class PreloadedWidgetMixin:
+    """
+    Виджет связи без запроса на строку: объекты по всем значениям столбца
+    загружаются пакетами в preload() до импорта строк
+    """
+
+    objects = None  # {значение поля field: [объекты]} после preload()
+
+    def split(self, value):
+        if value is None or not str(value).strip():
+            return []
+        return [str(value).strip()]
+
+    def preload(self, values, batch_size):
+        keys = {key for value in values for key in self.split(value)}
+        self.objects = {}
+        for batch in chunks(sorted(keys), batch_size):
+            lookup = {f"{self.field}__in": batch}
+            for obj in self.model.objects.filter(**lookup):
+                key = str(getattr(obj, self.field))
+                self.objects.setdefault(key, []).append(obj)
+
+    def get_object(self, key):
+        found = self.objects.get(key, [])
+        if not found:
+            raise ValueError(f"Не найдено: {key}")
+        if len(found) > 1:
+            raise ValueError(f"Найдено несколько объектов: {key}")
+        return found[0]
+
+
+class PreloadedForeignKeyWidget(PreloadedWidgetMixin, widgets.ForeignKeyWidget):
+    def clean(self, value, row=None, **kwargs):
+        if self.objects is None:
+            return super().clean(value, row, **kwargs)
+        keys = self.split(value)
+        return self.get_object(keys[0]) if keys else None
+
+
+class PreloadedManyToManyWidget(PreloadedWidgetMixin, widgets.ManyToManyWidget):
+    """Значения через separator; clean возвращает список id объектов"""
+
+    def split(self, value):
+        if value is None:
+            return []
+        parts = str(value).split(self.separator)
+        return [part.strip() for part in parts if part.strip()]
+
+    def clean(self, value, row=None, **kwargs):
+        if self.objects is None:
+            return list(
+                super().clean(value, row, **kwargs).values_list("pk", flat=True)
+            )
+        return [self.get_object(key).pk for key in self.split(value)]
+
+
+class BatchInstanceLoader(ModelInstanceLoader):
+    """
+    Загружает существующие объекты по id до импорта строк, пакетами по
+    batch_size ресурса (вместо SELECT на каждую строку)
+    """
+
+    def __init__(self, resource, dataset=None):
+        super().__init__(resource, dataset)
+        self.pk_field = resource.fields[resource.get_import_id_fields()[0]]
+        self.instances = {}
+        if self.pk_field.column_name not in (dataset.headers or []):
+            return
+        ids = set()
+        for value in dataset[self.pk_field.column_name]:
+            try:
+                pk = self.pk_field.clean({self.pk_field.column_name: value})
+            except ValueError:
+                continue  # Ошибка будет показана в строке файла
+            if pk is not None:
+                ids.add(pk)
+        lookup = f"{self.pk_field.attribute}__in"
+        for batch in chunks(sorted(ids), resource._meta.batch_size):
+            for instance in self.get_queryset().filter(**{lookup: batch}):
+                self.instances[self.pk_field.get_value(instance)] = instance
+
+    def get_instance(self, row):
+        return self.instances.get(self.pk_field.clean(row))
+
+
+class BulkImportResource(resources.ModelResource):
+    """
+    Импорт пакетами в одной транзакции: существующие объекты и значения
+    связей загружаются до импорта строк, даты разбираются по столбцам,
+    запись - bulk_create/bulk_update с историей по batch_size строк.
+    Пакетная запись не отправляет сигналы, поэтому индекс поиска,
+    показатели, версии и события проектов обновляются здесь.
+
+    import_data(dataset, progress=callback) вызывает callback(строк, всего)
+    каждые batch_size строк
+    """
+
+    class Meta:
+        use_bulk = True
+        batch_size = IMPORT_BATCH_SIZE
+        use_transactions = True
+        skip_diff = True  # Сравнение требует экспорта каждой строки
+        instance_loader_class = BatchInstanceLoader
+
+    def __init__(self, batch_size=None, **kwargs):
+        super().__init__(**kwargs)
+        if batch_size:
+            self._meta = copy(self._meta)
+            self._meta.batch_size = batch_size
+
+    def get_project_id(self, instance):
+        return instance.project_id
+
+    def get_bulk_update_fields(self):
+        model_fields = {
+            field.name
+            for field in self._meta.model._meta.concrete_fields
+            if not field.primary_key
+        }
+        return [
+            field.attribute
+            for field in self.get_import_fields()
+            if not field.readonly
+            and not isinstance(field.widget, widgets.ManyToManyWidget)
+            and field.attribute in model_fields
+        ]
+
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        super().before_import(dataset, using_transactions, dry_run, **kwargs)
+        self.user = kwargs.get("user")
+        self.progress = kwargs.get("progress")
+        self.total_rows = len(dataset)
+        # {project_id: {действие: [id объектов]}} для событий и показателей
+        self.changes = {}
+        headers = dataset.headers or []
+        for field in self.get_import_fields():
+            if field.readonly or field.column_name not in headers:
+                continue
+            if isinstance(field.widget, widgets.DateWidget):
+                parse_date_column(dataset, field.column_name, field.widget.formats)
+            elif isinstance(field.widget, PreloadedWidgetMixin):
+                field.widget.preload(dataset[field.column_name], self._meta.batch_size)
+
+    def before_import_row(self, row, row_number=None, **kwargs):
+        super().before_import_row(row, row_number=row_number, **kwargs)
+        if self.progress and row_number and row_number % self._meta.batch_size == 0:
+            self.progress(row_number, self.total_rows)
+
+    def import_obj(self, obj, data, dry_run, **kwargs):
+        errors = {}
+        try:
+            super().import_obj(obj, data, dry_run, **kwargs)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        # Связи многие-ко-многим записываются пакетами в save_m2m_batch
+        obj._import_m2m = {}
+        for field in self.get_import_fields():
+            if (
+                field.readonly
+                or not isinstance(field.widget, widgets.ManyToManyWidget)
+                or field.column_name not in data
+            ):
+                continue
+            try:
+                obj._import_m2m[field.attribute] = field.clean(data)
+            except ValueError as e:
+                errors[field.attribute] = ValidationError(force_str(e), code="invalid")
+        if errors:
+            raise ValidationError(errors)
+
+    def save_m2m_batch(self, instances):
+        """
+        Сохраняет связи многие-ко-многим пакета (значения в _import_m2m).
+        Возвращает id объектов, у которых связи изменились
+        """
+        return set()
+
+    def after_bulk_write(self, instances, created):
+        """
+        Действия после записи пакета, вместо сигналов post_save. instances -
+        объекты, получившие запись истории (созданные или изменённые)
+        """
+        if get_kind(self._meta.model) in DOCUMENT_BUILDERS:
+            index_objects(instances, batch_size=self._meta.batch_size)
+        # Снимки связей в записях истории пакета
+        bulk_history_m2m(self._meta.model, instances, batch_size=self._meta.batch_size)
+        action = "created" if created else "updated"
+        for instance in instances:
+            project_changes = self.changes.setdefault(self.get_project_id(instance), {})
+            project_changes.setdefault(action, []).append(instance.pk)
+
+    def bulk_write(self, instances, created, dry_run, raise_errors, result):
+        if not instances:
+            return
+        try:
+            # Точка сохранения: после ошибки транзакция импорта остаётся рабочей
+            with transaction.atomic():
+                if dry_run:
+                    # Проверка ограничений БД, транзакция будет отменена
+                    if created:
+                        self._meta.model.objects.bulk_create(instances)
+                    elif self.get_bulk_update_fields():
+                        self._meta.model.objects.bulk_update(
+                            instances, self.get_bulk_update_fields()
+                        )
+                    return
+                if created:
+                    instances = bulk_create_with_history(
+                        instances, self._meta.model, default_user=self.user
+                    )
+                    self.save_m2m_batch(instances)
+                else:
+                    instances = self.bulk_update_changed(instances)
+                self.after_bulk_write(instances, created)
+        except Exception as e:
+            self.handle_import_error(result, e, raise_errors)
+
+    def bulk_update_changed(self, instances):
+        """
+        Записывает изменённые строки пакета. Неизменённые строки не
+        записываются и не получают записей истории (как пропуск в post_save),
+        при изменении только связей создаётся запись истории "~".
+        Возвращает объекты, получившие запись истории
+        """
+        model = self._meta.model
+        changed = []
+        if self.get_bulk_update_fields():
+            changed = changed_instances(model, instances)
+        if changed:
+            bulk_update_with_history(
+                changed, model, self.get_bulk_update_fields(), default_user=self.user
+            )
+        changed_ids = {instance.pk for instance in changed}
+        relinked = self.save_m2m_batch(instances) - changed_ids
+        relinked = [instance for instance in instances if instance.pk in relinked]
+        bulk_history_records(
+            model,
+            relinked,
+            "~",
+            batch_size=self._meta.batch_size,
+            default_user=self.user,
+        )
+        return changed + relinked
+
+    def bulk_create(
+        self, using_transactions, dry_run, raise_errors, batch_size=None, result=None
+    ):
+        if not using_transactions and dry_run:
+            self.create_instances.clear()
+            return
+        try:
+            self.bulk_write(self.create_instances, True, dry_run, raise_errors, result)
+        finally:
+            self.create_instances = []
+
+    def bulk_update(
+        self, using_transactions, dry_run, raise_errors, batch_size=None, result=None
+    ):
+        if not using_transactions and dry_run:
+            self.update_instances.clear()
+            return
+        try:
+            self.bulk_write(self.update_instances, False, dry_run, raise_errors, result)
+        finally:
+            self.update_instances = []
+
+    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+        super().after_import(dataset, result, using_transactions, dry_run, **kwargs)
+        if not dry_run and not result.has_errors():
+            self.after_import_changes()
+        if self.progress:
+            self.progress(self.total_rows, self.total_rows)
+
+    def after_import_changes(self):
+        """Показатели, версии и события затронутых импортом проектов"""
+        project_ids = [project_id for project_id in self.changes if project_id]
+        for batch in chunks(project_ids, self._meta.batch_size):
+            rebuild_project_stats(batch)
+        bump_project_versions(project_ids, self._meta.batch_size)
+        for project_id, actions in self.changes.items():
+            for action, ids in actions.items():
+                send_project_event(project_id, self._meta.model, action, ids)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import secrets
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .exports import EXPORT_CHUNK_SIZE, WRITERS, iter_export_rows
+from .models import ExportJob
+from .resources import BudgetResource, ProjectResource, TaskResource
+from .versions import get_all_projects_version
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STEP = 5000  # Как часто (в строках) сохранять прогресс задания
+# Задание, воркер которого не отмечался дольше, считается брошенным
+HEARTBEAT_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3  # После стольких брошенных запусков задание завершается ошибкой
+
+EXPORT_RESOURCES = {
+    "project": ProjectResource,
+    "task": TaskResource,
+    "budget": BudgetResource,
+}
+
+
+def data_version(resource):
+    """
+    Версия данных выгрузки: все выгрузки строятся из проектов и их дочерних
+    записей, любое изменение которых (в том числе назначений и данных
+    участников) увеличивает версию проекта. Версии не уменьшаются при
+    очистке истории, удаление проекта меняет их число
+    """
+    return get_all_projects_version()
+
+
+def get_fingerprint(resource, file_format, object_ids=None):
+    payload = json.dumps(
+        [resource, file_format, sorted(object_ids or []), data_version(resource)]
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def requeue_stale_jobs(**filters):
+    """
+    Возвращает в очередь задания, воркер которых перестал отмечаться
+    (аварийное завершение, перезапуск). После MAX_ATTEMPTS запусков
+    задание завершается ошибкой
+    """
+    stale = ExportJob.objects.filter(
+        status="running",
+        heartbeat_at__lt=timezone.now() - HEARTBEAT_TIMEOUT,
+        **filters,
+    )
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status="failed",
+        error="Воркер перестал отвечать",
+        finished_at=timezone.now(),
+    )
+    stale.filter(attempts__lt=MAX_ATTEMPTS).update(status="pending")
+
+
+def submit_export(resource, file_format, object_ids=None, user=None):
+    """
+    Ставит выгрузку в очередь. Если такая выгрузка уже готова для текущей
+    версии данных или находится в работе, возвращается существующее задание,
+    а пользователь добавляется к запросившим его
+    """
+    fingerprint = get_fingerprint(resource, file_format, object_ids)
+    requeue_stale_jobs(fingerprint=fingerprint)
+    job = (
+        ExportJob.objects.filter(
+            fingerprint=fingerprint, status__in=["pending", "running", "done"]
+        )
+        .order_by("-id")
+        .first()
+    )
+    created = job is None or (
+        job.status == "done" and not job.file.storage.exists(job.file.name)
+    )
+    if created:
+        job = ExportJob.objects.create(
+            resource=resource,
+            file_format=file_format,
+            object_ids=object_ids,
+            fingerprint=fingerprint,
+            requested_by=user,
+        )
+    if user is not None:
+        job.requesters.add(user)
+    return job, created
+
+
+def claim_next_job():
+    """Забирает следующее задание из очереди (безопасно для нескольких воркеров)"""
+    requeue_stale_jobs()
+    for job_id in (
+        ExportJob.objects.filter(status="pending")
+        .order_by("id")
+        .values_list("id", flat=True)[:10]
+    ):
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(id=job_id, status="pending").update(
+            status="running",
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return ExportJob.objects.get(id=job_id)
+    return None
+
+
+def owned_job(job):
+    """
+    Задание, пока оно принадлежит этому запуску воркера: брошенное задание
+    могли вернуть в очередь и отдать другому воркеру
+    """
+    return ExportJob.objects.filter(id=job.id, status="running", attempts=job.attempts)
+
+
+def track_progress(job, rows):
+    """Пропускает строки экспорта, периодически сохраняя прогресс задания"""
+    for number, row in enumerate(rows):
+        # Первая строка - заголовок
+        if number and number % PROGRESS_STEP == 0:
+            owned_job(job).update(progress=number, heartbeat_at=timezone.now())
+        yield row
+    job.progress = number
+
+
+def run_job(job):
+    resource = EXPORT_RESOURCES[job.resource]()
+    queryset = resource._meta.model.objects.all()
+    if job.object_ids is not None:
+        queryset = queryset.filter(pk__in=job.object_ids)
+    job.total = queryset.count()
+    owned_job(job).update(total=job.total, heartbeat_at=timezone.now())
+    queryset = resource.get_export_queryset(queryset)
+
+    try:
+        with tempfile.TemporaryFile() as file:
+            rows = iter_export_rows(resource, queryset, EXPORT_CHUNK_SIZE)
+            WRITERS[job.file_format](track_progress(job, rows), file)
+            file.seek(0)
+            # Случайное имя: по номеру задания файл не подобрать
+            name = f"{job.resource}_{secrets.token_urlsafe(24)}.{job.file_format}"
+            job.file.save(name, File(file), save=False)
+        job.status = "done"
+    except Exception as e:
+        logger.exception("Ошибка при выполнении выгрузки %s", job.id)
+        job.status = "failed"
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    with transaction.atomic():
+        # Результат сохраняется, только если задание не отдали другому воркеру
+        owned = owned_job(job).select_for_update().exists()
+        if owned:
+            job.save()
+    if not owned and job.file:
+        job.file.delete(save=False)
+    return job
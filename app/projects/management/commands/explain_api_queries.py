@@ -0,0 +1,107 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from projects import views
+from projects.models import Project
+
+User = get_user_model()
+
+# Представления API и аргументы URL, которые им нужны
+API_VIEWS = [
+    (views.ProjectListView, {}),
+    (views.ProjectDetailView, {"pk": "project"}),
+    (views.TaskListView, {"project_id": "project"}),
+    (views.TaskDetailView, {"project_id": "project", "pk": 0}),
+    (views.BudgetListView, {"project_id": "project"}),
+    (views.BudgetDetailView, {"project_id": "project", "pk": 0}),
+    (views.RiskListView, {"project_id": "project"}),
+    (views.RiskDetailView, {"project_id": "project", "pk": 0}),
+    (views.ResultListView, {"project_id": "project"}),
+    (views.ResultDetailView, {"project_id": "project", "pk": 0}),
+    (views.ProjectMemberListView, {"project_id": "project"}),
+]
+
+# Признаки полного сканирования таблицы в плане запроса
+SEQ_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)(?! USING)\s*$", re.MULTILINE),
+}
+
+
+class Command(BaseCommand):
+    help = "Выводит EXPLAIN основного запроса каждого представления API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Email пользователя (по умолчанию менеджер)")
+        parser.add_argument("--project", type=int, help="ID проекта")
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Выполнить EXPLAIN ANALYZE (только PostgreSQL)",
+        )
+        parser.add_argument(
+            "--fail-on-seq-scan",
+            action="store_true",
+            help="Завершиться с ошибкой при обнаружении полного сканирования",
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        project_id = options["project"] or (
+            Project.objects.values_list("id", flat=True).first() or 0
+        )
+        explain_options = {}
+        if options["analyze"] and connection.vendor == "postgresql":
+            explain_options = {"analyze": True, "buffers": True}
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+
+        seq_scans = []
+        for view_class, url_kwargs in API_VIEWS:
+            kwargs = {
+                key: project_id if value == "project" else value
+                for key, value in url_kwargs.items()
+            }
+            queryset = self.get_view_queryset(view_class, user, kwargs)
+            plan = queryset[:100].explain(**explain_options)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(view_class.__name__))
+            self.stdout.write(plan)
+            tables = pattern.findall(plan) if pattern else []
+            for table in tables:
+                seq_scans.append((view_class.__name__, table))
+                self.stdout.write(
+                    self.style.WARNING(f"Полное сканирование таблицы {table}")
+                )
+            self.stdout.write("")
+
+        if seq_scans and options["fail_on_seq_scan"]:
+            raise CommandError(
+                "Обнаружено полное сканирование: "
+                + ", ".join(f"{view} ({table})" for view, table in seq_scans)
+            )
+
+    def get_user(self, email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {email} не найден")
+        user = User.objects.filter(is_manager=True).first()
+        if user is None:
+            raise CommandError("Укажите пользователя через --user")
+        return user
+
+    def get_view_queryset(self, view_class, user, kwargs):
+        """Строит queryset представления так же, как при обработке запроса"""
+        request = APIRequestFactory().get("/")
+        view = view_class()
+        view.args = ()
+        view.kwargs = kwargs
+        view.format_kwarg = None
+        view.request = view.initialize_request(request)
+        view.request.user = user
+        return view.filter_queryset(view.get_queryset())
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from import_export.formats.base_formats import CSV, XLSX
+
+from projects.imports import IMPORT_BATCH_SIZE
+from projects.resources import ProjectResource, TaskResource
+
+IMPORT_RESOURCES = {
+    "project": ProjectResource,
+    "task": TaskResource,
+}
+
+FORMATS = {
+    ".csv": CSV,
+    ".xlsx": XLSX,
+}
+
+MAX_REPORTED_ERRORS = 20  # Сколько строк с ошибками выводить
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует проекты или задачи из CSV/XLSX: сначала проверка всего "
+        "файла без записи, затем импорт пакетами в одной транзакции"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource", choices=sorted(IMPORT_RESOURCES))
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Строк в одном пакете записи",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только проверить файл",
+        )
+
+    def load_dataset(self, path):
+        file_format = FORMATS.get(path.suffix.lower())
+        if file_format is None:
+            raise CommandError(f"Неподдерживаемый формат файла: {path.suffix}")
+        file_format = file_format()
+        mode = file_format.get_read_mode()
+        encoding = None if "b" in mode else "utf-8-sig"
+        with open(path, mode, encoding=encoding) as file:
+            return file_format.create_dataset(file.read())
+
+    def report_progress(self, done, total):
+        self.stdout.write(f"  {done} из {total}")
+
+    def run(self, resource_class, dataset, batch_size, dry_run):
+        resource = resource_class(batch_size=batch_size)
+        return resource.import_data(
+            dataset, dry_run=dry_run, progress=self.report_progress
+        )
+
+    def report_errors(self, result):
+        for error in result.base_errors:
+            self.stderr.write(str(error.error))
+        for row in result.invalid_rows[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"Строка {row.number}: {row.error_dict}")
+        for number, errors in result.row_errors()[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"Строка {number}: {errors[0].error}")
+
+    def handle(self, *args, **options):
+        resource_class = IMPORT_RESOURCES[options["resource"]]
+        dataset = self.load_dataset(options["path"])
+        self.stdout.write(f"Проверка: {len(dataset)} строк")
+        result = self.run(resource_class, dataset, options["batch_size"], True)
+        if result.has_errors() or result.has_validation_errors():
+            self.report_errors(result)
+            raise CommandError("Файл содержит ошибки, импорт не выполнен")
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS("Ошибок не найдено"))
+            return
+
+        self.stdout.write("Импорт")
+        result = self.run(resource_class, dataset, options["batch_size"], False)
+        if result.has_errors():
+            self.report_errors(result)
+            raise CommandError("Импорт отменён")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано: {result.totals['new']}, "
+                f"обновлено: {result.totals['update']}"
+            )
+        )
@@ -0,0 +1,143 @@
+import hashlib
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from projects.retention import get_history_models
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переводит таблицы истории изменений на секционирование по месяцам "
+        "(history_date), только PostgreSQL. По умолчанию выводит SQL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--execute",
+            action="store_true",
+            help="Выполнить SQL (таблицы блокируются на время копирования)",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Сколько будущих месяцев подготовить заранее",
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="Не удалять исходную таблицу (<таблица>_unpartitioned)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Секционирование поддерживается только для PostgreSQL")
+
+        for model in get_history_models():
+            history_model = model.history.model
+            table = history_model._meta.db_table
+            with connection.cursor() as cursor:
+                if self.is_partitioned(cursor, table):
+                    statements = self.partition_statements(
+                        table, self.current_month(), options["months_ahead"]
+                    )
+                else:
+                    statements = self.convert_statements(cursor, history_model, options)
+            self.stdout.write(f"-- {table}")
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+            if options["execute"]:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+                self.stdout.write(self.style.SUCCESS(f"{table}: готово"))
+
+    def current_month(self):
+        return timezone.now().date().replace(day=1)
+
+    def is_partitioned(self, cursor, table):
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+    def partition_statements(self, table, start, months_ahead):
+        """Месячные секции от start до текущего месяца + months_ahead"""
+        statements = []
+        month = start
+        end = add_months(self.current_month(), months_ahead)
+        while month <= end:
+            next_month = add_months(month, 1)
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS "
+                f"{connection.ops.quote_name(f'{table}_p{month:%Y%m}')} "
+                f"PARTITION OF {connection.ops.quote_name(table)} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+                f"TO ('{next_month:%Y-%m-%d} 00:00:00+00')"
+            )
+            month = next_month
+        return statements
+
+    def index_name(self, table, column):
+        digest = hashlib.md5(f"{table}.{column}".encode()).hexdigest()[:8]
+        return f"{table}_{column}"[:45] + f"_{digest}_p"
+
+    def convert_statements(self, cursor, history_model, options):
+        quote = connection.ops.quote_name
+        table = history_model._meta.db_table
+        old_table = f"{table}_unpartitioned"
+        cursor.execute(
+            "SELECT is_identity FROM information_schema.columns "
+            "WHERE table_name = %s AND column_name = 'history_id'",
+            [table],
+        )
+        is_identity = cursor.fetchone()[0] == "YES"
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'history_id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT MIN(history_date) FROM {quote(table)}")
+        first_date = cursor.fetchone()[0]
+        start = first_date.date().replace(day=1) if first_date else self.current_month()
+
+        statements = [
+            f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}",
+            f"CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS"
+            f"{' INCLUDING IDENTITY' if is_identity else ''}) "
+            f"PARTITION BY RANGE (history_date)",
+            # Ключ секционирования должен входить в первичный ключ
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f'{table[:50]}_ppkey')} "
+            f"PRIMARY KEY (history_id, history_date)",
+        ]
+        if not is_identity:
+            # Последовательность serial не должна удалиться вместе со старой таблицей
+            statements.append(
+                f"ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.history_id"
+            )
+        for field in history_model._meta.fields:
+            if field.db_index and not field.primary_key:
+                statements.append(
+                    f"CREATE INDEX {quote(self.index_name(table, field.column))} "
+                    f"ON {quote(table)} ({quote(field.column)})"
+                )
+        statements += self.partition_statements(table, start, options["months_ahead"])
+        statements += [
+            f"CREATE TABLE {quote(f'{table}_default')} "
+            f"PARTITION OF {quote(table)} DEFAULT",
+            f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}",
+        ]
+        if is_identity:
+            statements.append(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'history_id'), "
+                f"COALESCE((SELECT MAX(history_id) FROM {quote(table)}), 1))"
+            )
+        if not options["keep_old"]:
+            statements.append(f"DROP TABLE {quote(old_table)}")
+        return statements
@@ -0,0 +1,68 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.retention import (get_history_models, get_policy, is_active,
+                                prune_model_history)
+
+
+class Command(BaseCommand):
+    help = (
+        "Очищает историю изменений по политике HISTORY_RETENTION: "
+        "срок хранения, число версий, версии без изменений"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Метки моделей (projects.Task), по умолчанию все модели с историей",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Записей истории в одной транзакции",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только подсчитать записи для удаления",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Начать заново, не продолжая прерванную очистку",
+        )
+
+    def get_models(self, labels):
+        if not labels:
+            return get_history_models()
+        history_models = set(get_history_models())
+        models = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f"Модель {label} не найдена")
+            if model not in history_models:
+                raise CommandError(f"У модели {label} нет истории изменений")
+            models.append(model)
+        return models
+
+    def handle(self, *args, **options):
+        for model in self.get_models(options["models"]):
+            label = model._meta.label
+            policy = get_policy(model)
+            if not is_active(policy):
+                self.stdout.write(f"{label}: политика хранения не задана")
+                continue
+            total = 0
+            for last_id, deleted in prune_model_history(
+                model,
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+                restart=options["restart"],
+            ):
+                total += deleted
+                self.stdout.write(f"{label}: до history_id {last_id}, удалено {total}")
+            action = "будет удалено" if options["dry_run"] else "удалено"
+            self.stdout.write(self.style.SUCCESS(f"{label}: {action} записей {total}"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from projects.analytics import refresh_budget_rollups
+from projects.models import BudgetRollup
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сводные таблицы бюджетов по годам, заказчикам и кураторам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "years",
+            nargs="*",
+            type=int,
+            help="Годы для пересчёта, по умолчанию все",
+        )
+
+    def handle(self, *args, **options):
+        refresh_budget_rollups(options["years"] or None)
+        self.stdout.write(
+            self.style.SUCCESS(f"Строк сводки: {BudgetRollup.objects.count()}")
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from projects.stats import rebuild_project_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает таблицу показателей проектов (ProjectStats)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "projects",
+            nargs="*",
+            type=int,
+            help="id проектов, по умолчанию все проекты",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Проектов в одной пачке",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_project_stats(
+            options["projects"] or None, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано проектов: {count}"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from projects.search import get_search_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Пересоздаёт полнотекстовый индекс проектов, задач, рисков и результатов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Объектов в одном запросе",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Способ поиска: {get_search_backend()}")
+        for model, count in rebuild_index(options["batch_size"]).items():
+            self.stdout.write(
+                self.style.SUCCESS(f"{model._meta.label}: документов {count}")
+            )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает очередь фоновых выгрузок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Обработать очередь и завершиться",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2,
+            help="Пауза между опросами пустой очереди (сек.)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+            self.stdout.write(f"Выгрузка {job.id}: {job.resource} ({job.file_format})")
+            job = run_job(job)
+            if job.status == "done":
+                self.stdout.write(self.style.SUCCESS(f"Готово: {job.file.name}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Ошибка: {job.error}"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from projects.history import get_settled_time
+from projects.models import Project
+from projects.snapshots import (count_changes_since, create_snapshot,
+                                get_snapshot)
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт контрольные точки состояния проектов для быстрого "
+        "восстановления на дату (запускать периодически)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "projects",
+            nargs="*",
+            type=int,
+            help="id проектов, по умолчанию все проекты",
+        )
+        parser.add_argument(
+            "--min-changes",
+            type=int,
+            default=500,
+            help="Минимум версий истории после предыдущей контрольной точки",
+        )
+
+    def handle(self, *args, **options):
+        # Граница точки отстаёт на HISTORY_SAFETY_LAG, как курсор ленты изменений
+        taken_at = get_settled_time()
+        projects = Project.objects.order_by("id")
+        if options["projects"]:
+            projects = projects.filter(id__in=options["projects"])
+        created = 0
+        for project_id in projects.values_list("id", flat=True):
+            previous = get_snapshot(project_id, taken_at)
+            changes = count_changes_since(
+                project_id, previous.taken_at if previous else None
+            )
+            if changes < options["min_changes"]:
+                continue
+            create_snapshot(project_id, taken_at)
+            created += 1
+            self.stdout.write(f"Проект {project_id}: версий с прошлой точки {changes}")
+        self.stdout.write(self.style.SUCCESS(f"Создано контрольных точек: {created}"))
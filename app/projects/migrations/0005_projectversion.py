@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_versions(apps, schema_editor):
+    Project = apps.get_model("projects", "Project")
+    ProjectVersion = apps.get_model("projects", "ProjectVersion")
+    now = timezone.now()
+    ProjectVersion.objects.bulk_create(
+        [
+            ProjectVersion(project_id=project_id, version=1, modified_at=now)
+            for project_id in Project.objects.values_list("id", flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0004_exportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectVersion",
+            fields=[
+                (
+                    "project",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="version",
+                        serialize=False,
+                        to="projects.project",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("modified_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Версия проекта",
+                "verbose_name_plural": "Версии проектов",
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
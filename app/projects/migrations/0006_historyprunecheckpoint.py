@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0005_projectversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistoryPruneCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_label", models.CharField(max_length=100, unique=True)),
+                ("last_history_id", models.PositiveBigIntegerField(default=0)),
+                ("deleted", models.PositiveIntegerField(default=0)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Очистка истории",
+                "verbose_name_plural": "Очистка истории",
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0006_historyprunecheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalproject",
+            name="history_omitted",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="historicalresult",
+            name="history_omitted",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="historicalrisk",
+            name="history_omitted",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="historicalresult",
+            name="text",
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalrisk",
+            name="description",
+            field=models.TextField(null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0007_history_diff_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("taken_at", models.DateTimeField()),
+                ("data", models.JSONField()),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="projects.project",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Снимок проекта",
+                "verbose_name_plural": "Снимки проектов",
+                "indexes": [
+                    models.Index(
+                        fields=["project", "taken_at"],
+                        name="snapshot_project_taken_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,182 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = "projects_searchdocument"
+FTS_TABLE = "projects_searchdocument_fts"
+
+POSTGRESQL_SQL = [
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    f"CREATE INDEX searchdocument_vector_idx ON {TABLE} USING GIN (search_vector)",
+]
+POSTGRESQL_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS searchdocument_vector_idx",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+# Внешнее содержимое FTS5 синхронизируется триггерами
+SQLITE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body, content='{TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS {TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+def get_statements(connection, reverse=False):
+    """SQL полнотекстового индекса для СУБД, на других СУБД поиск без индекса"""
+    if connection.vendor == "postgresql":
+        return POSTGRESQL_REVERSE_SQL if reverse else POSTGRESQL_SQL
+    if connection.vendor == "sqlite" and has_fts5(connection):
+        return SQLITE_REVERSE_SQL if reverse else SQLITE_SQL
+    return []
+
+
+def create_search_index(apps, schema_editor):
+    for statement in get_statements(schema_editor.connection):
+        schema_editor.execute(statement)
+
+
+def _join(*values):
+    return "\n".join(value for value in values if value)
+
+
+# Тексты объектов на момент миграции (копия projects.search.DOCUMENT_BUILDERS:
+# миграция не зависит от последующих изменений кода)
+DOCUMENT_BUILDERS = {
+    "project": lambda obj: (
+        obj.name,
+        _join(obj.client, obj.curator, obj.purpose, obj.description),
+    ),
+    "task": lambda obj: (obj.name, obj.description or ""),
+    "risk": lambda obj: (obj.name, obj.description),
+    "result": lambda obj: (obj.text.split("\n", 1)[0], obj.text),
+}
+BATCH_SIZE = 500
+
+
+def fill_search_index(apps, schema_editor):
+    SearchDocument = apps.get_model("projects", "SearchDocument")
+    title_length = SearchDocument._meta.get_field("title").max_length
+    for kind, build in DOCUMENT_BUILDERS.items():
+        model = apps.get_model("projects", kind)
+        documents = []
+        for obj in model.objects.order_by("pk").iterator(chunk_size=BATCH_SIZE):
+            title, body = build(obj)
+            documents.append(
+                SearchDocument(
+                    kind=kind,
+                    object_id=obj.pk,
+                    project_id=obj.pk if kind == "project" else obj.project_id,
+                    title=(title or "")[:title_length],
+                    body=body or "",
+                )
+            )
+            if len(documents) == BATCH_SIZE:
+                SearchDocument.objects.bulk_create(documents)
+                documents = []
+        SearchDocument.objects.bulk_create(documents)
+
+
+def drop_search_index(apps, schema_editor):
+    for statement in get_statements(schema_editor.connection, reverse=True):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0008_projectsnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("project", "Проект"),
+                            ("task", "Задача"),
+                            ("risk", "Риск"),
+                            ("result", "Результат"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField()),
+                ("title", models.CharField(blank=True, max_length=255)),
+                ("body", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_documents",
+                        to="projects.project",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Поисковый документ",
+                "verbose_name_plural": "Поисковые документы",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="searchdocument",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id"), name="searchdocument_object_uniq"
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0009_searchdocument"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="budget",
+            index=models.Index(
+                fields=["project", "amount"], name="budget_project_amount_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="risk",
+            index=models.Index(
+                fields=["project", "name"], name="risk_project_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["project", "end_date"], name="task_project_end_idx"
+            ),
+        ),
+    ]
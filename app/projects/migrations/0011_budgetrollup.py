@@ -0,0 +1,85 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:08
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def create_rollups(apps, schema_editor):
+    Budget = apps.get_model("projects", "Budget")
+    BudgetRollup = apps.get_model("projects", "BudgetRollup")
+    dimensions = {
+        "year": None,
+        "client": "project__client",
+        "curator": "project__curator",
+    }
+    rollups = []
+    for dimension, field in dimensions.items():
+        key = Coalesce(F(field), Value("")) if field else Value("")
+        rows = (
+            Budget.objects.values("year", key=key)
+            .annotate(total=Sum("amount"), project_count=Count("id"))
+            .order_by()
+        )
+        rollups += [BudgetRollup(dimension=dimension, **row) for row in rows]
+    BudgetRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0010_list_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BudgetRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("year", "Год"),
+                            ("client", "Заказчик"),
+                            ("curator", "Куратор"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, max_length=150)),
+                ("year", models.PositiveIntegerField()),
+                ("total", models.DecimalField(decimal_places=2, max_digits=16)),
+                ("project_count", models.PositiveIntegerField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Сводка бюджетов",
+                "verbose_name_plural": "Сводки бюджетов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="budget",
+            index=models.Index(fields=["year"], name="budget_year_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="budgetrollup",
+            index=models.Index(
+                fields=["dimension", "year"], name="budgetrollup_year_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="budgetrollup",
+            constraint=models.UniqueConstraint(
+                fields=("dimension", "key", "year"), name="budgetrollup_uniq"
+            ),
+        ),
+        migrations.RunPython(create_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def create_stats(apps, schema_editor):
+    Project = apps.get_model("projects", "Project")
+    ProjectStats = apps.get_model("projects", "ProjectStats")
+    stats = {
+        project_id: ProjectStats(project_id=project_id)
+        for project_id in Project.objects.values_list("id", flat=True)
+    }
+    tasks = (
+        apps.get_model("projects", "Task")
+        .objects.values("project_id", "status")
+        .annotate(count=Count("id"), start=Min("start_date"), end=Max("end_date"))
+        .order_by()
+    )
+    for row in tasks:
+        item = stats[row["project_id"]]
+        item.task_count += row["count"]
+        field = f"tasks_{row['status']}"
+        setattr(item, field, getattr(item, field, 0) + row["count"])
+        starts = [date for date in (item.tasks_start_date, row["start"]) if date]
+        ends = [date for date in (item.tasks_end_date, row["end"]) if date]
+        item.tasks_start_date = min(starts, default=None)
+        item.tasks_end_date = max(ends, default=None)
+    for model_name, field in (
+        ("ProjectMembership", "member_count"),
+        ("Risk", "risk_count"),
+    ):
+        counts = (
+            apps.get_model("projects", model_name)
+            .objects.values("project_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for row in counts:
+            setattr(stats[row["project_id"]], field, row["count"])
+    budgets = (
+        apps.get_model("projects", "Budget")
+        .objects.order_by("project_id", "year")
+        .values_list("project_id", "year", "amount")
+    )
+    for project_id, year, amount in budgets:
+        stats[project_id].budget_total += amount
+        stats[project_id].budget_years.append(year)
+    ProjectStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0011_budgetrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectStats",
+            fields=[
+                (
+                    "project",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="projects.project",
+                    ),
+                ),
+                ("task_count", models.IntegerField(default=0)),
+                ("tasks_pending", models.IntegerField(default=0)),
+                ("tasks_in_progress", models.IntegerField(default=0)),
+                ("tasks_completed", models.IntegerField(default=0)),
+                ("member_count", models.IntegerField(default=0)),
+                ("risk_count", models.IntegerField(default=0)),
+                (
+                    "budget_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("budget_years", models.JSONField(default=list)),
+                ("tasks_start_date", models.DateField(blank=True, null=True)),
+                ("tasks_end_date", models.DateField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Показатели проекта",
+                "verbose_name_plural": "Показатели проектов",
+            },
+        ),
+        migrations.RunPython(create_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_requesters(apps, schema_editor):
+    ExportJob = apps.get_model("projects", "ExportJob")
+    ExportJob.requesters.through.objects.bulk_create(
+        [
+            ExportJob.requesters.through(exportjob_id=job_id, customuser_id=user_id)
+            for job_id, user_id in ExportJob.objects.filter(
+                requested_by__isnull=False
+            ).values_list("id", "requested_by_id")
+        ],
+        batch_size=1000,
+    )
+    # Выполняющиеся задания считаются живыми с момента запуска
+    ExportJob.objects.exclude(status="pending").update(attempts=1)
+    ExportJob.objects.filter(status="running").update(heartbeat_at=F("started_at"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0012_projectstats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="requesters",
+            field=models.ManyToManyField(
+                blank=True, related_name="export_jobs", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.RunPython(fill_requesters, migrations.RunPython.noop),
+    ]
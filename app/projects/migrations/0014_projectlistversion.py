@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:42
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_list_version(apps, schema_editor):
+    ProjectListVersion = apps.get_model("projects", "ProjectListVersion")
+    ProjectListVersion.objects.create(pk=1, version=1, modified_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0013_exportjob_requesters_heartbeat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectListVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("modified_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Версия списка проектов",
+                "verbose_name_plural": "Версии списка проектов",
+            },
+        ),
+        migrations.RunPython(create_list_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:10
+
+import django.db.models.deletion
+import simple_history.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def snapshot_assignments(apps, schema_editor):
+    """Снимки текущих назначений в последних записях истории задач"""
+    Task = apps.get_model("projects", "Task")
+    HistoricalTask = apps.get_model("projects", "HistoricalTask")
+    HistoricalAssignments = apps.get_model("projects", "HistoricalTask_assigned_users")
+    latest = dict(
+        HistoricalTask.objects.values("id")
+        .order_by("id")
+        .annotate(last=Max("history_id"))
+        .values_list("id", "last")
+    )
+    rows = Task.assigned_users.through.objects.filter(task_id__in=latest)
+    HistoricalAssignments.objects.bulk_create(
+        [
+            HistoricalAssignments(
+                history_id=latest[row.task_id],
+                id=row.id,
+                task_id=row.task_id,
+                customuser_id=row.customuser_id,
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0014_projectlistversion"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistoricalTask_assigned_users",
+            fields=[
+                (
+                    "id",
+                    models.BigIntegerField(
+                        auto_created=True, blank=True, db_index=True, verbose_name="ID"
+                    ),
+                ),
+                ("m2m_history_id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "customuser",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        db_tablespace="",
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "history",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to="projects.historicaltask",
+                    ),
+                ),
+                (
+                    "task",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        db_tablespace="",
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="projects.task",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "HistoricalTask_assigned_users",
+            },
+            bases=(simple_history.models.HistoricalChanges, models.Model),
+        ),
+        migrations.RunPython(snapshot_assignments, migrations.RunPython.noop),
+    ]
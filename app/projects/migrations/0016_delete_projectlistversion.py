@@ -0,0 +1,15 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0015_historicaltask_assigned_users"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="ProjectListVersion",
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:23
+
+import projects.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("projects", "0016_delete_projectlistversion"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="exportjob",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                storage=projects.models.ExportStorage(),
+                upload_to="exports/",
+            ),
+        ),
+    ]
@@ -1,13 +1,70 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth import \
     get_user_model  # Импортируем функцию для получения модели пользователя
-from django.db import models
-from simple_history.models import HistoricalRecords  # Добавляем импорт
+from django.core.files.storage import FileSystemStorage
+from django.db import models, router, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+
+from .history import TrackedHistoricalRecords, deleting_projects
 
 # Получаем модель пользователя
 User = get_user_model()
 
 
-class Project(models.Model):
+class AtomicSaveModel(models.Model):
+    """
+    Сохранение в одной транзакции с обработчиками post_save: счётчики
+    ProjectStats и сводки бюджетов изменяются вместе с объектом.
+    Удаление уже выполняется в транзакции вместе с post_delete
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class ProjectQuerySet(models.QuerySet):
+    def delete(self):
+        with deleting_projects(self.values_list("pk", flat=True)):
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def for_user(self, user):
+        """Проекты, доступные пользователю"""
+        if user.is_manager:
+            return self
+        # Exists вместо JOIN, чтобы не получать дубликаты строк
+        return self.filter(
+            Exists(ProjectMembership.objects.filter(project=OuterRef("pk"), user=user))
+        )
+
+    def with_counts(self):
+        """
+        Добавляет количество задач, рисков, участников и сумму бюджета из
+        таблицы ProjectStats (один LEFT JOIN вместо подзапросов)
+        """
+        return self.annotate(
+            task_count=Coalesce("stats__task_count", 0),
+            risk_count=Coalesce("stats__risk_count", 0),
+            member_count=Coalesce("stats__member_count", 0),
+            total_budget=Coalesce(
+                "stats__budget_total",
+                0,
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+
+class Project(AtomicSaveModel):
     name = models.CharField(max_length=100)
     client = models.CharField(max_length=150, blank=True, null=True)
     curator = models.CharField(max_length=150, blank=True, null=True)
@@ -21,17 +78,29 @@ class Project(models.Model):
         through_fields=("project", "user"),
         related_name="projects",
     )
-    history = HistoricalRecords()  # Добавляем отслеживание истории
+    # Добавляем отслеживание истории (description сохраняется только при изменении)
+    history = TrackedHistoricalRecords(diff_fields=["description"])
+
+    objects = ProjectQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Проект"
         verbose_name_plural = "Проекты"
+        indexes = [
+            models.Index(fields=["start_date"], name="project_start_date_idx"),
+            models.Index(fields=["end_date"], name="project_end_date_idx"),
+            models.Index(fields=["client"], name="project_client_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        with deleting_projects([self.pk]):
+            return super().delete(*args, **kwargs)
+
 
-class ProjectMembership(models.Model):
+class ProjectMembership(AtomicSaveModel):
     ROLE_CHOICES = [
         ("leader", "Руководитель"),
         ("participant", "Участник"),
@@ -41,24 +110,30 @@ class ProjectMembership(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     role = models.CharField(max_length=12, choices=ROLE_CHOICES)
     date_added = models.DateTimeField(auto_now_add=True, verbose_name="Дата назначения")
-    history = HistoricalRecords()  # Добавляем отслеживание истории
+    history = TrackedHistoricalRecords()  # Добавляем отслеживание истории
 
     class Meta:
         unique_together = ("user", "project")
         verbose_name = "Доступ"
         verbose_name_plural = "Доступы"
+        indexes = [
+            # Покрывающий индекс для проверки роли пользователя в проекте
+            models.Index(
+                fields=["user", "project", "role"], name="membership_user_role_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.project} - {self.role}"
 
 
-class Budget(models.Model):
+class Budget(AtomicSaveModel):
     project = models.ForeignKey(
         Project, related_name="budgets", on_delete=models.CASCADE
     )
     year = models.PositiveIntegerField()  # Поле для года
     amount = models.DecimalField(max_digits=10, decimal_places=2)  # Поле для бюджета
-    history = HistoricalRecords()  # Добавляем отслеживание истории
+    history = TrackedHistoricalRecords()  # Добавляем отслеживание истории
 
     class Meta:
         unique_together = (
@@ -67,20 +142,31 @@ class Budget(models.Model):
         )  # Уникальное ограничение на сочетание проекта и года
         verbose_name = "Бюджет"  # единственное число
         verbose_name_plural = "Бюджеты"  # множественное число
+        indexes = [
+            models.Index(
+                fields=["project", "amount"], name="budget_project_amount_idx"
+            ),
+            models.Index(fields=["year"], name="budget_year_idx"),
+        ]
 
     def __str__(self):
         return f"{self.project.name} - {self.year}: {self.amount}"
 
 
-class Risk(models.Model):
+class Risk(AtomicSaveModel):
     project = models.ForeignKey(Project, related_name="risks", on_delete=models.CASCADE)
     name = models.CharField(max_length=100)  # Название риска
     description = models.TextField()  # Описание риска
-    history = HistoricalRecords()  # Добавляем отслеживание истории
+    # Добавляем отслеживание истории (description сохраняется только при изменении)
+    history = TrackedHistoricalRecords(diff_fields=["description"])
 
     class Meta:
         verbose_name = "Риск"  # единственное число
         verbose_name_plural = "Риски"  # множественное число
+        indexes = [
+            models.Index(fields=["project", "id"], name="risk_project_id_idx"),
+            models.Index(fields=["project", "name"], name="risk_project_name_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -91,17 +177,21 @@ class Result(models.Model):
         Project, related_name="results", on_delete=models.CASCADE
     )
     text = models.TextField()  # Результат в виде текста
-    history = HistoricalRecords()  # Добавляем отслеживание истории
+    # Добавляем отслеживание истории (text сохраняется только при изменении)
+    history = TrackedHistoricalRecords(diff_fields=["text"])
 
     class Meta:
         verbose_name = "Результат"  # единственное число
         verbose_name_plural = "Результаты"  # множественное число
+        indexes = [
+            models.Index(fields=["project", "id"], name="result_project_id_idx"),
+        ]
 
     def __str__(self):
         return f"Result for {self.project.name}"
 
 
-class Task(models.Model):
+class Task(AtomicSaveModel):
     project = models.ForeignKey(Project, related_name="tasks", on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
@@ -119,11 +209,252 @@ class Task(models.Model):
     assigned_users = models.ManyToManyField(
         User, related_name="tasks", blank=True, verbose_name="Назначенные пользователи"
     )
-    history = HistoricalRecords()  # Добавляем отслеживание истории
+    # Назначения хранятся в истории снимком на каждую запись
+    history = TrackedHistoricalRecords(m2m_fields=[assigned_users])
 
     class Meta:
         verbose_name = "Задача"  # единственное число
         verbose_name_plural = "Задачи"  # множественное число
+        indexes = [
+            models.Index(fields=["project", "id"], name="task_project_id_idx"),
+            models.Index(fields=["project", "status"], name="task_project_status_idx"),
+            models.Index(
+                fields=["project", "start_date"], name="task_project_start_idx"
+            ),
+            models.Index(fields=["project", "end_date"], name="task_project_end_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ProjectVersion(models.Model):
+    """Версия данных проекта: увеличивается при любом изменении проекта и его
+    дочерних объектов, используется для ETag/Last-Modified"""
+
+    project = models.OneToOneField(
+        Project, primary_key=True, related_name="version", on_delete=models.CASCADE
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    modified_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Версия проекта"
+        verbose_name_plural = "Версии проектов"
+
+    def __str__(self):
+        return f"{self.project_id}: {self.version}"
+
+
+class ExportStorage(FileSystemStorage):
+    """
+    Хранилище выгрузок в EXPORT_ROOT: вне MEDIA_ROOT, не раздаётся как
+    статика, файлы отдаются только через API с проверкой прав
+    """
+
+    @property
+    def base_location(self):
+        return settings.EXPORT_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Готово"),
+        ("failed", "Ошибка"),
+    ]
+    RESOURCE_CHOICES = [
+        ("project", "Проекты"),
+        ("task", "Задачи"),
+        ("budget", "Бюджеты"),
+    ]
+    FORMAT_CHOICES = [
+        ("csv", "CSV"),
+        ("xlsx", "Excel"),
+    ]
+
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    object_ids = models.JSONField(blank=True, null=True)  # None - все записи
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    progress = models.PositiveIntegerField(default=0)  # Выгружено строк
+    total = models.PositiveIntegerField(default=0)  # Всего строк
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    file = models.FileField(upload_to="exports/", storage=ExportStorage(), blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    # Все, кто запросил выгрузку (повторный запрос возвращает то же задание)
+    requesters = models.ManyToManyField(User, related_name="export_jobs", blank=True)
+    attempts = models.PositiveIntegerField(default=0)  # Сколько раз задание забирали
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)  # Отметка воркера
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Экспорт"
+        verbose_name_plural = "Экспорты"
+        indexes = [
+            models.Index(fields=["status", "id"], name="exportjob_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_resource_display()} ({self.file_format}) - {self.status}"
+
+
+class HistoryPruneCheckpoint(models.Model):
+    """Позиция незавершённой очистки истории модели (для продолжения)"""
+
+    model_label = models.CharField(max_length=100, unique=True)
+    last_history_id = models.PositiveBigIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)  # Удалено записей
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Очистка истории"
+        verbose_name_plural = "Очистка истории"
+
+    def __str__(self):
+        return f"{self.model_label}: {self.last_history_id}"
+
+
+class ProjectSnapshot(models.Model):
+    """
+    Контрольная точка состояния проекта для восстановления на дату:
+    восстанавливаются только изменения после ближайшей точки
+    """
+
+    project = models.ForeignKey(
+        Project, related_name="snapshots", on_delete=models.CASCADE
+    )
+    taken_at = models.DateTimeField()
+    data = models.JSONField()  # {раздел: {id: данные объекта}}
+
+    class Meta:
+        verbose_name = "Снимок проекта"
+        verbose_name_plural = "Снимки проектов"
+        indexes = [
+            models.Index(
+                fields=["project", "taken_at"], name="snapshot_project_taken_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}: {self.taken_at}"
+
+
+class SearchDocument(models.Model):
+    """
+    Запись полнотекстового индекса: текст проекта, задачи, риска или
+    результата. Сам индекс создаётся миграцией в зависимости от СУБД
+    (см. projects/search.py)
+    """
+
+    KIND_CHOICES = [
+        ("project", "Проект"),
+        ("task", "Задача"),
+        ("risk", "Риск"),
+        ("result", "Результат"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    project = models.ForeignKey(
+        Project, related_name="search_documents", on_delete=models.CASCADE
+    )
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Поисковый документ"
+        verbose_name_plural = "Поисковые документы"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="searchdocument_object_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
+
+
+class BudgetRollup(models.Model):
+    """
+    Сумма бюджетов за год в разрезе: по всем проектам, по заказчику или по
+    куратору. Изменяется на разницу при изменении бюджетов и проектов
+    (см. projects/analytics.py)
+    """
+
+    DIMENSION_CHOICES = [
+        ("year", "Год"),
+        ("client", "Заказчик"),
+        ("curator", "Куратор"),
+    ]
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=150, blank=True)  # "" - не указан
+    year = models.PositiveIntegerField()
+    total = models.DecimalField(max_digits=16, decimal_places=2)
+    project_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Сводка бюджетов"
+        verbose_name_plural = "Сводки бюджетов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dimension", "key", "year"], name="budgetrollup_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["dimension", "year"], name="budgetrollup_year_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension} {self.key} {self.year}: {self.total}"
+
+
+class ProjectStats(models.Model):
+    """
+    Сводные показатели проекта. Обновляются сигналами через F()-выражения
+    в транзакции изменения (см. projects/stats.py), восстанавливаются
+    командой rebuild_project_stats
+    """
+
+    project = models.OneToOneField(
+        Project, primary_key=True, related_name="stats", on_delete=models.CASCADE
+    )
+    task_count = models.IntegerField(default=0)
+    tasks_pending = models.IntegerField(default=0)
+    tasks_in_progress = models.IntegerField(default=0)
+    tasks_completed = models.IntegerField(default=0)
+    member_count = models.IntegerField(default=0)
+    risk_count = models.IntegerField(default=0)
+    budget_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    budget_years = models.JSONField(default=list)  # Годы бюджетов по возрастанию
+    tasks_start_date = models.DateField(blank=True, null=True)
+    tasks_end_date = models.DateField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Показатели проекта"
+        verbose_name_plural = "Показатели проектов"
+
+    def __str__(self):
+        return f"{self.project_id}: задач {self.task_count}"
+
+    @property
+    def tasks_by_status(self):
+        return {
+            "pending": self.tasks_pending,
+            "in_progress": self.tasks_in_progress,
+            "completed": self.tasks_completed,
+        }
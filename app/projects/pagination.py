@@ -0,0 +1,117 @@
+import json
+
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10  # Количество элементов на странице
+    page_size_query_param = "page_size"
+    max_page_size = 100  # Максимальное количество элементов на странице
+
+
+class KeysetPagination(CursorPagination):
+    """Пагинация по курсору: без COUNT(*) и OFFSET, глубина страницы не важна"""
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "id"  # Стабильная сортировка по первичному ключу (индекс)
+
+
+class CursorPaginationMixin:
+    """
+    Включает пагинацию по курсору по запросу клиента:
+    ?pagination=cursor (или переданный параметр cursor)
+    """
+
+    cursor_pagination_class = KeysetPagination
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return (
+            params.get("pagination") == "cursor"
+            or self.cursor_pagination_class.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+def estimate_count(queryset):
+    """
+    Число строк запроса по оценке планировщика PostgreSQL (без COUNT(*)).
+    None, если оценки нет: другая база или таблица ещё не анализировалась
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    query = queryset.order_by().query
+    with connection.cursor() as cursor:
+        if not query.where and not query.distinct:
+            # Без условий: статистика таблицы, которую обновляет ANALYZE
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинация админки для больших таблиц: начиная с estimate_threshold строк
+    число записей берётся из оценки планировщика вместо COUNT(*).
+    Оценка приблизительная, поэтому страницы после неё тоже открываются
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def estimated_count(self):
+        """Оценка числа строк или None, если она меньше порога или её нет"""
+        if not hasattr(self.object_list, "query"):
+            return None
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.estimate_threshold:
+            return None
+        return estimate
+
+    @cached_property
+    def count(self):
+        if self.estimated_count is not None:
+            return self.estimated_count
+        return super().count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.estimated_count is None or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        if self.estimated_count is None:
+            return super().page(number)
+        # Без обрезки по оценке: на странице столько строк, сколько есть
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = self.object_list[bottom : bottom + self.per_page]
+        return self._get_page(object_list, number, self)
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import ProjectMembership
+
+# Значение-заглушка для кэширования отсутствия членства в проекте
+NO_ROLE = ""
+
+
+class RoleCache:
+    """Локальный для процесса LRU-кэш ролей с ограничением по времени жизни"""
+
+    def __init__(self, timeout=60, max_size=10000):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            role, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return role
+
+    def set(self, key, role):
+        with self._lock:
+            self._data[key] = (role, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache_settings = getattr(settings, "PROJECT_ACCESS_CACHE", {})
+role_cache = RoleCache(
+    timeout=_cache_settings.get("TIMEOUT", 60),
+    max_size=_cache_settings.get("MAX_SIZE", 10000),
+)
+
+
+def get_project_role(user_id, project_id):
+    """Возвращает роль пользователя в проекте ("" если он не участник)"""
+    key = (int(user_id), int(project_id))
+    role = role_cache.get(key)
+    if role is None:
+        role = (
+            ProjectMembership.objects.filter(user_id=user_id, project_id=project_id)
+            .values_list("role", flat=True)
+            .first()
+        ) or NO_ROLE
+        role_cache.set(key, role)
+    return role
+
+
+async def aget_project_role(user_id, project_id):
+    """Асинхронный вариант get_project_role"""
+    key = (int(user_id), int(project_id))
+    role = role_cache.get(key)
+    if role is None:
+        role = (
+            await ProjectMembership.objects.filter(
+                user_id=user_id, project_id=project_id
+            )
+            .values_list("role", flat=True)
+            .afirst()
+        ) or NO_ROLE
+        role_cache.set(key, role)
+    return role
+
+
+def invalidate_project_role(user_id, project_id):
+    """Сбрасывает закэшированную роль пользователя в проекте"""
+    role_cache.delete((int(user_id), int(project_id)))
@@ -1,19 +1,34 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
 from import_export import fields, resources
 
-from .models import Budget, Project, Task
+from .analytics import schedule_budget_rollup
+from .bulk import set_assigned_users
+from .imports import (BulkImportResource, PreloadedForeignKeyWidget,
+                      PreloadedManyToManyWidget, chunks)
+from .models import Budget, Project, ProjectMembership, Task
+from .stats import TASK_STATE, format_budget_summary, get_stats
 
 User = get_user_model()
 
 
-class ProjectResource(resources.ModelResource):
-    # Кастомные поля
-    total_budget = fields.Field(column_name="total_budget", attribute="total_budget")
-    member_count = fields.Field(column_name="member_count", attribute="member_count")
-    task_count = fields.Field(column_name="task_count", attribute="task_count")
-    risk_count = fields.Field(column_name="risk_count", attribute="risk_count")
-    members = fields.Field(column_name="members", attribute="members")
-    tasks = fields.Field(column_name="tasks", attribute="tasks")
+class ProjectResource(BulkImportResource):
+    # Кастомные поля (только для экспорта)
+    total_budget = fields.Field(
+        column_name="total_budget", attribute="total_budget", readonly=True
+    )
+    member_count = fields.Field(
+        column_name="member_count", attribute="member_count", readonly=True
+    )
+    task_count = fields.Field(
+        column_name="task_count", attribute="task_count", readonly=True
+    )
+    risk_count = fields.Field(
+        column_name="risk_count", attribute="risk_count", readonly=True
+    )
+    members = fields.Field(column_name="members", attribute="members", readonly=True)
+    tasks = fields.Field(column_name="tasks", attribute="tasks", readonly=True)
 
     class Meta:
         model = Project
@@ -39,32 +54,70 @@ class ProjectResource(resources.ModelResource):
             "end_date": {"format": "%d.%m.%Y"},
         }
 
-    def get_export_queryset(self):
+    def get_project_id(self, instance):
+        return instance.pk
+
+    def after_bulk_write(self, instances, created):
+        super().after_bulk_write(instances, created)
+        if not created:
+            # Бюджеты проектов со сменой заказчика или куратора переходят
+            # в другие строки сводки
+            self.owner_changes.update(
+                project.pk
+                for project in instances
+                if (project.client, project.curator) != project._rollup_owners
+            )
+
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        super().before_import(dataset, using_transactions, dry_run, **kwargs)
+        self.owner_changes = set()
+
+    def after_import_changes(self):
+        super().after_import_changes()
+        for batch in chunks(self.owner_changes, self._meta.batch_size):
+            schedule_budget_rollup(
+                Budget.objects.filter(project_id__in=batch).values_list(
+                    "year", flat=True
+                )
+            )
+
+    def get_export_queryset(self, queryset=None):
         """Кастомизация queryset для экспорта"""
-        return self._meta.model.objects.all().prefetch_related(
-            "members", "tasks", "risks", "budgets"
+        if queryset is None:
+            queryset = self._meta.model.objects.all()
+        return (
+            queryset.with_counts()
+            .select_related("stats")
+            .prefetch_related(
+                Prefetch(
+                    "projectmembership_set",
+                    queryset=ProjectMembership.objects.select_related("user"),
+                ),
+                "tasks",
+            )
         )
 
     def dehydrate_total_budget(self, project):
         """Кастомизация поля total_budget"""
-        budgets = project.budgets.all()
-        if budgets:
-            total = sum(b.amount for b in budgets)
-            years = ", ".join(str(b.year) for b in budgets)
-            return f"{total} ({years})"
-        return "Нет данных"
+        return format_budget_summary(get_stats(project))
 
     def dehydrate_member_count(self, project):
         """Кастомизация поля member_count"""
-        return project.members.count()
+        if hasattr(project, "member_count"):
+            return project.member_count  # Значение из аннотации queryset
+        return self.get_member_count(project)
 
     def dehydrate_task_count(self, project):
         """Кастомизация поля task_count"""
-        return project.tasks.count()
+        if hasattr(project, "task_count"):
+            return project.task_count  # Значение из аннотации queryset
+        return self.get_task_count(project)
 
     def dehydrate_risk_count(self, project):
         """Кастомизация поля risk_count"""
-        return project.risks.count()
+        if hasattr(project, "risk_count"):
+            return project.risk_count  # Значение из аннотации queryset
+        return self.get_risk_count(project)
 
     def dehydrate_members(self, project):
         """Кастомизация поля members"""
@@ -82,23 +135,32 @@ class ProjectResource(resources.ModelResource):
 
     def get_member_count(self, obj):
         """Альтернативный метод получения количества участников"""
-        return obj.members.count()
+        stats = get_stats(obj)
+        return stats.member_count if stats else 0
 
     def get_task_count(self, obj):
         """Альтернативный метод получения количества задач"""
-        return obj.tasks.count()
+        stats = get_stats(obj)
+        return stats.task_count if stats else 0
 
     def get_risk_count(self, obj):
         """Альтернативный метод получения количества рисков"""
-        return obj.risks.count()
+        stats = get_stats(obj)
+        return stats.risk_count if stats else 0
 
 
-class TaskResource(resources.ModelResource):
-    project_name = fields.Field(column_name="project_name", attribute="project__name")
+class TaskResource(BulkImportResource):
+    project_name = fields.Field(
+        column_name="project_name",
+        attribute="project",
+        widget=PreloadedForeignKeyWidget(Project, "name"),
+    )
     assigned_users = fields.Field(
-        column_name="assigned_users", attribute="assigned_users"
+        column_name="assigned_users",
+        attribute="assigned_users",
+        widget=PreloadedManyToManyWidget(User, field="email"),
     )
-    duration = fields.Field(column_name="duration", attribute="duration")
+    duration = fields.Field(column_name="duration", attribute="duration", readonly=True)
 
     class Meta:
         model = Task
@@ -119,6 +181,38 @@ class TaskResource(resources.ModelResource):
             "end_date": {"format": "%d.%m.%Y"},
         }
 
+    def validate_instance(
+        self, instance, import_validation_errors=None, validate_unique=True
+    ):
+        errors = dict(import_validation_errors or {})
+        if instance.project_id is None and "project" not in errors:
+            errors["project"] = ValidationError("Проект не указан", code="required")
+        super().validate_instance(instance, errors, validate_unique)
+
+    def save_m2m_batch(self, instances):
+        assignments = {
+            task.pk: task._import_m2m["assigned_users"]
+            for task in instances
+            if "assigned_users" in task._import_m2m
+        }
+        if not assignments:
+            return set()
+        return set_assigned_users(assignments)
+
+    def after_bulk_write(self, instances, created):
+        super().after_bulk_write(instances, created)
+        if not created:
+            # Показатели пересчитываются и у проекта, из которого ушла задача
+            index = TASK_STATE.index("project_id")
+            for task in instances:
+                self.changes.setdefault(task._stats_state[index], {})
+
+    def get_export_queryset(self, queryset=None):
+        """Кастомизация queryset для экспорта"""
+        if queryset is None:
+            queryset = self._meta.model.objects.all()
+        return queryset.select_related("project").prefetch_related("assigned_users")
+
     def dehydrate_assigned_users(self, task):
         """Кастомизация поля assigned_users"""
         return ", ".join(user.email for user in task.assigned_users.all())
@@ -147,6 +241,12 @@ class BudgetResource(resources.ModelResource):
         fields = ("id", "project_name", "year", "amount", "formatted_amount")
         export_order = fields
 
+    def get_export_queryset(self, queryset=None):
+        """Кастомизация queryset для экспорта"""
+        if queryset is None:
+            queryset = self._meta.model.objects.all()
+        return queryset.select_related("project")
+
     def dehydrate_formatted_amount(self, budget):
         """Кастомизация поля formatted_amount"""
         return f"${budget.amount:,.2f}"
@@ -0,0 +1,239 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from simple_history.models import registered_models
+
+from .history import get_m2m_history_models, get_m2m_history_values
+from .models import HistoryPruneCheckpoint
+
+DEFAULT_POLICY = {"DAYS": None, "KEEP_VERSIONS": None, "SQUASH_NOOP": False}
+
+_retention_settings = getattr(settings, "HISTORY_RETENTION", {})
+
+
+def get_history_models():
+    """
+    Модели с историей изменений, упорядоченные по метке. Промежуточные
+    модели связей из m2m_fields (тоже в registered_models) не входят
+    """
+    return sorted(
+        (
+            model
+            for model in registered_models.values()
+            if hasattr(model._meta, "simple_history_manager_attribute")
+        ),
+        key=lambda model: model._meta.label,
+    )
+
+
+def get_policy(model):
+    policy = dict(DEFAULT_POLICY)
+    policy.update(_retention_settings.get("DEFAULT", {}))
+    policy.update(_retention_settings.get("MODELS", {}).get(model._meta.label, {}))
+    return policy
+
+
+def is_active(policy):
+    return bool(policy["DAYS"] or policy["KEEP_VERSIONS"] or policy["SQUASH_NOOP"])
+
+
+def get_tracked_fields(model):
+    history_model = model.history.model
+    return [field.attname for field in history_model.tracked_fields]
+
+
+def get_diff_fields(model):
+    """Поля, которые хранятся в истории только при изменении"""
+    return list(getattr(model.history.model, "history_diff_fields", ()))
+
+
+def _resolve_rows(rows, diff_fields):
+    """Подставляет значения пропущенных полей из предыдущих версий"""
+    current = {}
+    resolved_rows = []
+    for row in rows:
+        omitted = {name for name in row.get("history_omitted", "").split(",") if name}
+        resolved = dict(row, omitted=omitted)
+        for name in diff_fields:
+            if name in omitted:
+                resolved[name] = current.get(name)
+            else:
+                current[name] = row[name]
+        resolved_rows.append(resolved)
+    return resolved_rows
+
+
+def _find_materializations(rows, prunable, diff_fields):
+    """
+    Версии, которые ссылаются на удаляемую версию за значением пропущенного
+    поля: значение нужно записать в них явно. Возвращает {history_id: поля}
+    """
+    updates = {}
+    source_pruned = {}
+    for row in rows:
+        history_id = row["history_id"]
+        if history_id in prunable:
+            for name in diff_fields:
+                if name not in row["omitted"]:
+                    source_pruned[name] = True
+            continue
+        for name in diff_fields:
+            if name not in row["omitted"]:
+                source_pruned[name] = False
+            elif source_pruned.get(name):
+                updates.setdefault(history_id, {})[name] = row[name]
+                source_pruned[name] = False
+        if history_id in updates:
+            updates[history_id]["history_omitted"] = ",".join(
+                sorted(row["omitted"] - set(updates[history_id]))
+            )
+    return updates
+
+
+def find_prunable(rows, policy, fields, cutoff=None):
+    """
+    Возвращает history_id версий одного объекта, которые можно удалить.
+    rows - версии объекта по возрастанию history_id (с подставленными
+    значениями пропущенных полей)
+    """
+    prunable = set()
+    kept = []
+    for row in rows:
+        if (
+            policy["SQUASH_NOOP"]
+            and kept
+            and row["history_type"] == "~"
+            and all(row[field] == kept[-1][field] for field in fields)
+        ):
+            # Сохранение без изменений отслеживаемых полей
+            prunable.add(row["history_id"])
+            continue
+        kept.append(row)
+
+    if policy["KEEP_VERSIONS"]:
+        prunable.update(row["history_id"] for row in kept[: -policy["KEEP_VERSIONS"]])
+    if cutoff is not None and kept:
+        latest = kept[-1]
+        if latest["history_type"] == "-" and latest["history_date"] < cutoff:
+            # Объект удалён до границы хранения: история больше не нужна
+            prunable.update(row["history_id"] for row in kept)
+        else:
+            prunable.update(
+                row["history_id"] for row in kept[:-1] if row["history_date"] < cutoff
+            )
+    return prunable
+
+
+def _plan_batch(versions, policy, fields, diff_fields, cutoff, last_id, upper_id):
+    """
+    Версии для удаления из диапазона пачки (last_id, upper_id] и значения
+    пропущенных полей, которые нужно записать в остающиеся версии
+    """
+    prunable = []
+    updates = {}
+    for rows in versions:
+        rows = _resolve_rows(rows, diff_fields)
+        object_prunable = {
+            history_id
+            for history_id in find_prunable(rows, policy, fields, cutoff)
+            if last_id < history_id <= upper_id
+        }
+        prunable += object_prunable
+        if diff_fields and object_prunable:
+            updates.update(_find_materializations(rows, object_prunable, diff_fields))
+    return prunable, updates
+
+
+def prune_model_history(model, batch_size=None, dry_run=False, restart=False):
+    """
+    Очищает историю модели по её политике хранения. Записи истории
+    просматриваются пачками по history_id, каждая пачка удаляется в
+    отдельной короткой транзакции, а позиция сохраняется, поэтому
+    прерванная очистка продолжается с того же места.
+    Генератор: на каждую пачку возвращает (последний history_id, удалено)
+    """
+    policy = get_policy(model)
+    if not is_active(policy):
+        return
+    batch_size = batch_size or _retention_settings.get("BATCH_SIZE", 1000)
+    history = model.history.model._default_manager
+    pk_name = model._meta.pk.attname
+    fields = get_tracked_fields(model)
+    diff_fields = get_diff_fields(model)
+    m2m_models = get_m2m_history_models(model)
+    # Сохранение, изменившее только связи, - тоже изменение
+    m2m_names = [field.name for field, _ in m2m_models] if policy["SQUASH_NOOP"] else []
+    extra = ["history_omitted"] if diff_fields else []
+    cutoff = timezone.now() - timedelta(days=policy["DAYS"]) if policy["DAYS"] else None
+
+    label = model._meta.label
+    if restart and not dry_run:
+        HistoryPruneCheckpoint.objects.filter(model_label=label).delete()
+    checkpoint = (
+        HistoryPruneCheckpoint(model_label=label)
+        if dry_run
+        else HistoryPruneCheckpoint.objects.get_or_create(model_label=label)[0]
+    )
+
+    last_id = checkpoint.last_history_id
+    while True:
+        batch = list(
+            history.filter(history_id__gt=last_id)
+            .order_by("history_id")
+            .values_list("history_id", pk_name)[:batch_size]
+        )
+        if not batch:
+            break
+        upper_id = batch[-1][0]
+
+        # Для решения нужны все версии объектов пачки, в том числе вне её
+        versions = {}
+        for row in (
+            history.filter(**{f"{pk_name}__in": {object_id for _, object_id in batch}})
+            .order_by(pk_name, "history_id")
+            .values(
+                pk_name, "history_id", "history_date", "history_type", *fields, *extra
+            )
+        ):
+            versions.setdefault(row[pk_name], []).append(row)
+        if m2m_names:
+            m2m_values = get_m2m_history_values(
+                model.history.model,
+                [row["history_id"] for rows in versions.values() for row in rows],
+                m2m_names,
+            )
+            for rows in versions.values():
+                for row in rows:
+                    row.update(m2m_values[row["history_id"]])
+        prunable, updates = _plan_batch(
+            versions.values(),
+            policy,
+            fields + m2m_names,
+            diff_fields,
+            cutoff,
+            last_id,
+            upper_id,
+        )
+
+        deleted = len(prunable)
+        if not dry_run:
+            with transaction.atomic():
+                for history_id, values in updates.items():
+                    history.filter(history_id=history_id).update(**values)
+                if prunable:
+                    # Снимки связей ссылаются на запись без внешнего ключа
+                    for _, m2m_model in m2m_models:
+                        m2m_model.objects.filter(history_id__in=prunable).delete()
+                    deleted, _ = history.filter(history_id__in=prunable).delete()
+                checkpoint.last_history_id = upper_id
+                checkpoint.deleted += deleted
+                checkpoint.save(
+                    update_fields=["last_history_id", "deleted", "updated_at"]
+                )
+        last_id = upper_id
+        yield upper_id, deleted
+
+    if not dry_run:
+        checkpoint.delete()
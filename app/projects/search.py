@@ -0,0 +1,232 @@
+from functools import reduce
+from operator import and_, or_
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Func, Q, Value
+from django.db.models.expressions import Expression, RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+from .models import SearchDocument
+
+SEARCH_CONFIG = "russian"  # Конфигурация PostgreSQL, как в миграции индекса
+FTS_TABLE = "projects_searchdocument_fts"
+TITLE_LENGTH = SearchDocument._meta.get_field("title").max_length
+
+
+def _join(*values):
+    return "\n".join(value for value in values if value)
+
+
+# Тексты объектов для индекса: {вид (имя модели): функция -> (заголовок, текст)}
+DOCUMENT_BUILDERS = {
+    "project": lambda obj: (
+        obj.name,
+        _join(obj.client, obj.curator, obj.purpose, obj.description),
+    ),
+    "task": lambda obj: (obj.name, obj.description or ""),
+    "risk": lambda obj: (obj.name, obj.description),
+    "result": lambda obj: (obj.text.split("\n", 1)[0], obj.text),
+}
+
+
+def get_kind(model):
+    return model._meta.model_name
+
+
+def build_document(obj):
+    kind = get_kind(obj._meta.model)
+    title, body = DOCUMENT_BUILDERS[kind](obj)
+    return SearchDocument(
+        kind=kind,
+        object_id=obj.pk,
+        project_id=obj.pk if kind == "project" else obj.project_id,
+        title=(title or "")[:TITLE_LENGTH],
+        body=body or "",
+    )
+
+
+def index_objects(objects, batch_size=500):
+    """Добавляет или обновляет документы объектов (один запрос на пакет)"""
+    documents = [build_document(obj) for obj in objects]
+    SearchDocument.objects.bulk_create(
+        documents,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["kind", "object_id"],
+        update_fields=["project", "title", "body", "updated_at"],
+    )
+
+
+def remove_objects(model, object_ids):
+    SearchDocument.objects.filter(
+        kind=get_kind(model), object_id__in=object_ids
+    ).delete()
+
+
+def rebuild_index(batch_size=500):
+    """Пересоздаёт документы всех объектов. Возвращает {модель: количество}"""
+    counts = {}
+    for kind in DOCUMENT_BUILDERS:
+        model = apps.get_model("projects", kind)
+        SearchDocument.objects.filter(kind=kind).delete()
+        counts[model] = 0
+        batch = []
+        for obj in model.objects.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) == batch_size:
+                index_objects(batch, batch_size)
+                counts[model] += len(batch)
+                batch = []
+        if batch:
+            index_objects(batch, batch_size)
+            counts[model] += len(batch)
+    return counts
+
+
+class DocumentColumn(Expression):
+    """Колонка таблицы документов, созданная миграцией вне модели"""
+
+    def __init__(self, column):
+        super().__init__()
+        self.column = column
+
+    def as_sql(self, compiler, connection):
+        alias = compiler.quote_name_unless_alias(compiler.query.base_table)
+        return f"{alias}.{connection.ops.quote_name(self.column)}", []
+
+
+_backends = {}
+
+
+def get_search_backend(using="default"):
+    """
+    Способ поиска для базы: "postgresql" (tsvector + GIN), "fts5" (SQLite)
+    или "basic" (icontains, если индекс не создан). Определяется один раз
+    """
+    if using not in _backends:
+        connection = connections[using]
+        table = SearchDocument._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                columns = connection.introspection.get_table_description(cursor, table)
+                indexed = any(column.name == "search_vector" for column in columns)
+                backend = "postgresql" if indexed else "basic"
+            elif connection.vendor == "sqlite":
+                tables = connection.introspection.table_names(cursor)
+                backend = "fts5" if FTS_TABLE in tables else "basic"
+            else:
+                backend = "basic"
+        _backends[using] = backend
+    return _backends[using]
+
+
+async def aget_search_backend(using="default"):
+    """Асинхронный вариант get_search_backend"""
+    if using not in _backends:
+        await sync_to_async(get_search_backend)(using)
+    return _backends[using]
+
+
+def _fts5_query(terms):
+    # Каждое слово - фраза с поиском по префиксу, спецсимволы FTS5 экранируются
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_documents(query, queryset=None):
+    """
+    Документы, подходящие под запрос, с релевантностью rank (по убыванию)
+    """
+    if queryset is None:
+        queryset = SearchDocument.objects.all()
+    terms = query.split()
+    if not terms:
+        return queryset.none()
+    backend = get_search_backend(queryset.db)
+    if backend == "postgresql":
+        vector = DocumentColumn("search_vector")
+        tsquery = Func(
+            Value(query),
+            template=f"websearch_to_tsquery('{SEARCH_CONFIG}', %(expressions)s)",
+        )
+        queryset = queryset.filter(
+            Func(
+                vector,
+                tsquery,
+                template="%(expressions)s",
+                arg_joiner=" @@ ",
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            rank=Func(vector, tsquery, function="ts_rank_cd", output_field=FloatField())
+        )
+    elif backend == "fts5":
+        match = _fts5_query(terms)
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        ).annotate(
+            # rank FTS5 - bm25 со знаком минус: меньше - лучше
+            rank=Func(
+                Value(match),
+                F("id"),
+                template=(
+                    f"(SELECT -rank FROM {FTS_TABLE} "
+                    f"WHERE {FTS_TABLE} MATCH %(expressions)s)"
+                ),
+                arg_joiner=" AND rowid = ",
+                output_field=FloatField(),
+            )
+        )
+    else:
+        queryset = queryset.filter(
+            reduce(
+                and_,
+                (Q(title__icontains=term) | Q(body__icontains=term) for term in terms),
+            )
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by("-rank", "-updated_at", "id")
+
+
+def search_object_ids(model, query):
+    """Подзапрос id объектов модели, найденных по индексу"""
+    documents = SearchDocument.objects.filter(kind=get_kind(model))
+    return search_documents(query, documents).values("object_id")
+
+
+class SearchIndexFilter(BaseFilterBackend):
+    """Фильтр ?search= по полнотекстовому индексу"""
+
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+        return queryset.filter(pk__in=search_object_ids(queryset.model, query))
+
+
+class SearchIndexAdminMixin:
+    """
+    Поиск в админке по полнотекстовому индексу. Поля связанных моделей из
+    search_fields (с "__") по-прежнему ищутся через icontains
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or get_search_backend(queryset.db) == "basic":
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q(pk__in=search_object_ids(queryset.model, search_term))
+        related = [field for field in self.search_fields if "__" in field]
+        if related:
+            condition |= reduce(
+                and_,
+                (
+                    reduce(
+                        or_, (Q(**{f"{field}__icontains": term}) for field in related)
+                    )
+                    for term in search_term.split()
+                ),
+            )
+        return queryset.filter(condition), False
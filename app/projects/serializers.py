@@ -1,8 +1,11 @@
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 from user.models import CustomUser
 
-from .models import Budget, Project, ProjectMembership, Result, Risk, Task
+from .models import (Budget, BudgetRollup, ExportJob, Project,
+                     ProjectMembership, Result, Risk, SearchDocument, Task)
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -11,7 +14,51 @@ class CustomUserSerializer(serializers.ModelSerializer):
         fields = ["id", "email", "first_name", "last_name", "is_manager"]
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+def parse_query_list(value):
+    """Разбирает параметр запроса вида "a,b,c" в список"""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+class DynamicFieldsMixin:
+    """
+    Выбор полей параметром ?fields=id,name и разворачивание связей
+    параметром ?expand=members (вложенные объекты вместо списка id).
+    При записи (POST, PATCH...) принимаются все поля, ?fields= ограничивает
+    только ответ, а связи не разворачиваются
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_fields = None
+        request = self.context.get("request")
+        if request is None:
+            return
+        requested = parse_query_list(request.query_params.get("fields"))
+        if request.method not in SAFE_METHODS:
+            self.output_fields = set(requested) or None
+            return
+        for name in parse_query_list(request.query_params.get("expand")):
+            if name in self.expandable_fields:
+                serializer_class, options = self.expandable_fields[name]
+                self.fields[name] = serializer_class(read_only=True, **options)
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.output_fields is None:
+            return data
+        return {
+            name: value for name, value in data.items() if name in self.output_fields
+        }
+
+
+class ProjectSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"members": (CustomUserSerializer, {"many": True})}
+
     class Meta:
         model = Project
         fields = [
@@ -27,31 +74,52 @@ class ProjectSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProjectMembershipSerializer(serializers.ModelSerializer):
+class ProjectListSerializer(ProjectSerializer):
+    task_count = serializers.IntegerField(read_only=True)
+    risk_count = serializers.IntegerField(read_only=True)
+    member_count = serializers.IntegerField(read_only=True)
+    total_budget = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+
+    class Meta(ProjectSerializer.Meta):
+        fields = ProjectSerializer.Meta.fields + [
+            "task_count",
+            "risk_count",
+            "member_count",
+            "total_budget",
+        ]
+
+
+class ProjectMembershipSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"user": (CustomUserSerializer, {})}
+
     class Meta:
         model = ProjectMembership
         fields = ["id", "user", "role", "date_added"]
 
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Budget
         fields = ["id", "year", "amount"]
 
 
-class RiskSerializer(serializers.ModelSerializer):
+class RiskSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Risk
         fields = ["id", "name", "description"]
 
 
-class ResultSerializer(serializers.ModelSerializer):
+class ResultSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Result
         fields = ["id", "text"]
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"assigned_users": (CustomUserSerializer, {"many": True})}
+
     class Meta:
         model = Task
         fields = [
@@ -63,3 +131,133 @@ class TaskSerializer(serializers.ModelSerializer):
             "status",
             "assigned_users",
         ]
+
+
+class ProjectDashboardSerializer(ProjectSerializer):
+    """Проект вместе с дочерними объектами и сводными показателями"""
+
+    SECTIONS = ("tasks", "budgets", "risks", "results", "memberships")
+
+    tasks = TaskSerializer(many=True, read_only=True)
+    budgets = BudgetSerializer(many=True, read_only=True)
+    risks = RiskSerializer(many=True, read_only=True)
+    results = ResultSerializer(many=True, read_only=True)
+    memberships = ProjectMembershipSerializer(
+        source="projectmembership_set", many=True, read_only=True
+    )
+    rollups = serializers.SerializerMethodField()
+
+    class Meta(ProjectSerializer.Meta):
+        # Участники выводятся в memberships вместе с ролями
+        fields = [
+            field for field in ProjectSerializer.Meta.fields if field != "members"
+        ] + ["tasks", "budgets", "risks", "results", "memberships", "rollups"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        include = self.context.get("include")
+        if include is not None:
+            for section in set(self.SECTIONS) - set(include):
+                self.fields.pop(section)
+
+    def get_rollups(self, project):
+        return self.context.get("rollups")
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    # Ссылка на скачивание через API: файлы не раздаются как статика
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            "id",
+            "resource",
+            "file_format",
+            "object_ids",
+            "status",
+            "progress",
+            "total",
+            "file",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "status",
+            "progress",
+            "total",
+            "file",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def get_file(self, job):
+        if job.status != "done" or not job.file:
+            return None
+        url = reverse("export-download", args=[job.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+
+class TaskBulkSerializer(TaskSerializer):
+    """
+    Элемент пакетной операции с задачами. Пользователи проверяются
+    одним запросом на весь пакет, а не отдельным запросом на каждый id
+    """
+
+    expandable_fields = {}
+
+    id = serializers.IntegerField(required=False)
+    assigned_users = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+    class Meta(TaskSerializer.Meta):
+        pass
+
+
+class MembershipItemSerializer(serializers.Serializer):
+    user = serializers.IntegerField()
+    role = serializers.ChoiceField(choices=ProjectMembership.ROLE_CHOICES)
+
+
+class ProjectMembershipBulkSerializer(serializers.Serializer):
+    add = MembershipItemSerializer(many=True, required=False, default=list)
+    remove = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    change_role = MembershipItemSerializer(many=True, required=False, default=list)
+
+    def validate(self, data):
+        if not (data["add"] or data["remove"] or data["change_role"]):
+            raise serializers.ValidationError("Нет изменений.")
+        return data
+
+
+class SearchDocumentSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source="kind")
+    id = serializers.IntegerField(source="object_id")
+    snippet = serializers.SerializerMethodField()
+    rank = serializers.FloatField()
+
+    class Meta:
+        model = SearchDocument
+        fields = ["type", "id", "project", "title", "snippet", "rank"]
+
+    def get_snippet(self, document):
+        return document.body[:200]
+
+
+class BudgetRollupSerializer(serializers.ModelSerializer):
+    delta = serializers.DecimalField(max_digits=16, decimal_places=2, allow_null=True)
+    delta_percent = serializers.DecimalField(
+        max_digits=12, decimal_places=2, allow_null=True
+    )
+
+    class Meta:
+        model = BudgetRollup
+        fields = ["key", "year", "total", "project_count", "delta", "delta_percent"]
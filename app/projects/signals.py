@@ -0,0 +1,336 @@
+from decimal import Decimal
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from .analytics import (ROLLUP_PROJECT_FIELDS, apply_rollup_changes,
+                        budget_rollup_changes, project_rollup_changes,
+                        schedule_budget_rollup)
+from .events import send_project_event
+from .history import delete_signals_suppressed, project_deleting
+from .models import (Budget, Project, ProjectMembership, ProjectStats, Result,
+                     Risk, Task)
+from .permissions import invalidate_project_role
+from .search import index_objects, remove_objects
+from .stats import (TASK_STATE, apply_stats_changes, refresh_budget_years,
+                    refresh_task_dates, task_status_changes, track_state)
+from .versions import bump_project_version, bump_project_versions
+
+User = get_user_model()
+
+# Поля пользователя в ответах API и выгрузках проектов
+USER_FIELDS = ("email", "first_name", "last_name", "is_manager")
+
+
+def skip_suppressed_delete(func):
+    """Обработчик не вызывается при удалении в suppress_delete_signals()"""
+
+    @wraps(func)
+    def wrapper(sender, signal=None, **kwargs):
+        if signal is post_delete and delete_signals_suppressed(sender):
+            return None
+        return func(sender, signal=signal, **kwargs)
+
+    return wrapper
+
+
+def skip_project_delete(func):
+    """
+    Обработчик не вызывается для строк, удаляемых каскадом вместе с проектом:
+    его показатели, документы поиска и версия удаляются вместе с ним
+    """
+
+    @wraps(func)
+    def wrapper(sender, signal=None, **kwargs):
+        if signal is post_delete and project_deleting(kwargs["instance"].project_id):
+            return None
+        return func(sender, signal=signal, **kwargs)
+
+    return wrapper
+
+
+@receiver(post_init, sender=ProjectMembership)
+def remember_membership_key(sender, instance, **kwargs):
+    # Запоминаем исходную пару (user, project), чтобы сбросить её при изменении.
+    # Читаем через __dict__, чтобы не загружать отложенные (only/defer) поля
+    instance._access_key = (
+        instance.__dict__.get("user_id"),
+        instance.__dict__.get("project_id"),
+    )
+
+
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+def invalidate_membership_access(sender, instance, **kwargs):
+    old_user_id, old_project_id = getattr(instance, "_access_key", (None, None))
+    if old_user_id and old_project_id:
+        invalidate_project_role(old_user_id, old_project_id)
+    invalidate_project_role(instance.user_id, instance.project_id)
+    instance._access_key = (instance.user_id, instance.project_id)
+
+
+def get_event_action(signal, created):
+    if signal is post_delete:
+        return "deleted"
+    return "created" if created else "updated"
+
+
+@receiver(post_init, sender=User)
+def remember_user_fields(sender, instance, **kwargs):
+    track_state(instance, *USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+@receiver(pre_delete, sender=User)
+def user_changed(sender, instance, signal, created=False, raw=False, **kwargs):
+    """
+    Данные пользователя входят в ответы и выгрузки его проектов: при их
+    изменении или удалении пользователя увеличиваются версии проектов, где он
+    участник или исполнитель задач (назначения удаляются без m2m_changed)
+    """
+    if created or raw:
+        return
+    fields = tuple(instance.__dict__.get(name) for name in USER_FIELDS)
+    if signal is post_save and fields == instance._stats_state:
+        return
+    project_ids = set(
+        ProjectMembership.objects.filter(user=instance).values_list(
+            "project_id", flat=True
+        )
+    )
+    project_ids.update(
+        Task.objects.filter(assigned_users=instance).values_list(
+            "project_id", flat=True
+        )
+    )
+    bump_project_versions(project_ids)
+    track_state(instance, *USER_FIELDS)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, signal, created=False, **kwargs):
+    bump_project_version(instance.pk)
+    if not created:
+        send_project_event(
+            instance.pk, sender, get_event_action(signal, created), [instance.pk]
+        )
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Risk)
+@receiver(post_delete, sender=Risk)
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+@skip_suppressed_delete
+@skip_project_delete
+def project_child_changed(sender, instance, signal, created=False, **kwargs):
+    bump_project_version(instance.project_id)
+    send_project_event(
+        instance.project_id, sender, get_event_action(signal, created), [instance.pk]
+    )
+
+
+@receiver(m2m_changed, sender=Task.assigned_users.through)
+def task_assignments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        bump_project_version(instance.project_id)
+        send_project_event(instance.project_id, Task, "updated", [instance.pk])
+    elif pk_set:
+        # Изменение со стороны пользователя: затронуты проекты его задач
+        tasks = {}
+        for task_id, project_id in Task.objects.filter(pk__in=pk_set).values_list(
+            "id", "project_id"
+        ):
+            tasks.setdefault(project_id, []).append(task_id)
+        for project_id, task_ids in tasks.items():
+            bump_project_version(project_id)
+            send_project_event(project_id, Task, "updated", task_ids)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Risk)
+@receiver(post_save, sender=Result)
+def update_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_objects([instance])
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Risk)
+@receiver(post_delete, sender=Result)
+@skip_suppressed_delete
+@skip_project_delete
+def remove_search_document(sender, instance, **kwargs):
+    # Документы проекта удаляются каскадно вместе с ним
+    remove_objects(sender, [instance.pk])
+
+
+@receiver(post_init, sender=Project)
+def remember_project_owners(sender, instance, **kwargs):
+    # Отложенные (only/defer) поля не запоминаются: без загрузки они
+    # не сохраняются и не изменяются
+    instance._rollup_owners = {
+        field: instance.__dict__[field]
+        for field in ROLLUP_PROJECT_FIELDS
+        if field in instance.__dict__
+    }
+
+
+@receiver(post_save, sender=Project)
+def project_rollup_changed(sender, instance, created, raw=False, **kwargs):
+    old_owners = instance._rollup_owners
+    owners = {
+        field: instance.__dict__[field]
+        for field in ROLLUP_PROJECT_FIELDS
+        if field in instance.__dict__
+    }
+    if not created and not raw:
+        if set(owners) - set(old_owners):
+            # Поле загружено после создания объекта: прежнее значение
+            # неизвестно, сводки лет проекта пересчитываются целиком
+            schedule_budget_rollup(
+                Budget.objects.filter(project_id=instance.pk).values_list(
+                    "year", flat=True
+                )
+            )
+        elif owners != old_owners:
+            # Бюджеты проекта переходят в сводку другого заказчика или куратора
+            apply_rollup_changes(
+                project_rollup_changes(instance.pk, old_owners, owners)
+            )
+    instance._rollup_owners = owners
+
+
+@receiver(post_save, sender=Project)
+def create_project_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProjectStats.objects.get_or_create(project=instance)
+
+
+@receiver(post_init, sender=Task)
+def remember_task_state(sender, instance, **kwargs):
+    track_state(instance, *TASK_STATE)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@skip_suppressed_delete
+@skip_project_delete
+def task_stats_changed(sender, instance, signal, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old_project, old_status, *old_dates = getattr(
+        instance, "_stats_state", (None,) * len(TASK_STATE)
+    )
+    dates = [instance.start_date, instance.end_date]
+    if signal is post_delete:
+        apply_stats_changes(
+            instance.project_id, **task_status_changes([instance.status], [])
+        )
+        if any(dates):
+            refresh_task_dates(instance.project_id)
+        return
+    if created or old_project != instance.project_id:
+        if not created:
+            apply_stats_changes(old_project, **task_status_changes([old_status], []))
+            refresh_task_dates(old_project)
+        apply_stats_changes(
+            instance.project_id, **task_status_changes([], [instance.status])
+        )
+        if any(dates) or not created:
+            refresh_task_dates(instance.project_id)
+    else:
+        apply_stats_changes(
+            instance.project_id, **task_status_changes([old_status], [instance.status])
+        )
+        if dates != old_dates:
+            refresh_task_dates(instance.project_id)
+    track_state(instance, *TASK_STATE)
+
+
+BUDGET_STATE = ("project_id", "year", "amount")
+
+
+@receiver(post_init, sender=Budget)
+def remember_budget_state(sender, instance, **kwargs):
+    track_state(instance, *BUDGET_STATE)
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def budget_changed(sender, instance, signal, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    state = (instance.project_id, instance.year, instance.amount)
+    old = None
+    if not created:
+        # Отложенные при загрузке поля не изменялись
+        old = tuple(
+            current if value is None else value
+            for value, current in zip(instance._stats_state, state)
+        )
+    # Сводки общие для проектов заказчика и куратора, поэтому изменяются и
+    # при удалении проекта. Изменяются только строки за старый и новый год
+    new = None if signal is post_delete else state
+    apply_rollup_changes(budget_rollup_changes(old, new))
+    if not (signal is post_delete and project_deleting(instance.project_id)):
+        budget_stats_changed(old, new)
+    track_state(instance, *BUDGET_STATE)
+
+
+def budget_stats_changed(old, new):
+    # Сумма могла быть присвоена строкой или float (админка, импорт)
+    if new is None:
+        project_id, _, amount = old
+        apply_stats_changes(project_id, budget_total=-Decimal(str(amount)))
+        refresh_budget_years(project_id)
+        return
+    project_id, year, amount = new
+    amount = Decimal(str(amount))
+    if old is None or old[0] != project_id:
+        if old is not None:
+            apply_stats_changes(old[0], budget_total=-Decimal(str(old[2])))
+            refresh_budget_years(old[0])
+        apply_stats_changes(project_id, budget_total=amount)
+        refresh_budget_years(project_id)
+    else:
+        apply_stats_changes(project_id, budget_total=amount - Decimal(str(old[2])))
+        if year != old[1]:
+            refresh_budget_years(project_id)
+
+
+@receiver(post_init, sender=Risk)
+@receiver(post_init, sender=ProjectMembership)
+def remember_project_id(sender, instance, **kwargs):
+    track_state(instance, "project_id")
+
+
+@receiver(post_save, sender=Risk)
+@receiver(post_delete, sender=Risk)
+@receiver(post_save, sender=ProjectMembership)
+@receiver(post_delete, sender=ProjectMembership)
+@skip_project_delete
+def child_stats_changed(sender, instance, signal, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    field = "risk_count" if sender is Risk else "member_count"
+    (old_project,) = getattr(instance, "_stats_state", (None,))
+    if signal is post_delete:
+        apply_stats_changes(instance.project_id, **{field: -1})
+    elif created or old_project != instance.project_id:
+        if not created:
+            apply_stats_changes(old_project, **{field: -1})
+        apply_stats_changes(instance.project_id, **{field: 1})
+    track_state(instance, "project_id")
@@ -0,0 +1,138 @@
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .changes import serialize_records
+from .history import get_settled_time
+from .models import (Budget, Project, ProjectMembership, ProjectSnapshot,
+                     Result, Risk, Task)
+from .serializers import (BudgetSerializer, ProjectMembershipSerializer,
+                          ProjectSerializer, ResultSerializer, RiskSerializer,
+                          TaskSerializer)
+
+# Разделы восстановленного проекта (названия как в сводке проекта)
+SNAPSHOT_SECTIONS = [
+    ("project", Project, ProjectSerializer),
+    ("memberships", ProjectMembership, ProjectMembershipSerializer),
+    ("tasks", Task, TaskSerializer),
+    ("budgets", Budget, BudgetSerializer),
+    ("risks", Risk, RiskSerializer),
+    ("results", Result, ResultSerializer),
+]
+
+
+def _project_lookup(model):
+    return "id" if model is Project else "project_id"
+
+
+def latest_records(model, project_id, at, since=None):
+    """
+    Последние на момент at версии объектов модели, которые когда-либо до at
+    относились к проекту (изменённых после since, если указан) - одним
+    запросом. Возвращаются и удалённые или перенесённые в другой проект
+    объекты: принадлежность проекту определяет project_id последней версии
+    """
+    lookup = _project_lookup(model)
+    period = {"history_date__lte": at}
+    # Объект мог перейти в другой проект после since: его версии в проекте
+    # ищутся за всё время до at, иначе он остался бы в контрольной точке
+    object_ids = model.history.filter(**{lookup: project_id}, **period).values("id")
+    if since is not None:
+        period["history_date__gt"] = since
+    queryset = model.history.filter(id__in=object_ids, **period)
+    if connections[queryset.db].features.can_distinct_on_fields:
+        return list(
+            queryset.order_by("id", "-history_date", "-history_id").distinct("id")
+        )
+    queryset = queryset.annotate(
+        version=Window(
+            RowNumber(),
+            partition_by=F("id"),
+            order_by=[F("history_date").desc(), F("history_id").desc()],
+        )
+    )
+    return list(queryset.filter(version=1).order_by("id"))
+
+
+def get_snapshot(project_id, at):
+    """Ближайшая контрольная точка не позже at"""
+    return (
+        ProjectSnapshot.objects.filter(project_id=project_id, taken_at__lte=at)
+        .order_by("-taken_at")
+        .first()
+    )
+
+
+def reconstruct_project(project_id, at):
+    """
+    Состояние проекта и его объектов на момент at по таблицам истории.
+    Состояние берётся из ближайшей контрольной точки, поверх неё
+    накладываются версии, записанные после неё: по одному запросу на
+    модель. Возвращает ({раздел: {id: данные}}, контрольная точка или None)
+    """
+    snapshot = get_snapshot(project_id, at)
+    state = snapshot.data if snapshot else {}
+    since = snapshot.taken_at if snapshot else None
+    sections = {}
+    for section, model, serializer_class in SNAPSHOT_SECTIONS:
+        objects = dict(state.get(section, {}))
+        lookup = _project_lookup(model)
+        current = []
+        for record in latest_records(model, project_id, at, since):
+            objects.pop(str(record.id), None)
+            if record.history_type != "-" and getattr(record, lookup) == project_id:
+                current.append(record)
+        if current:
+            data = serialize_records(serializer_class, current)
+            for record, item in zip(current, data):
+                objects[str(record.id)] = item
+        sections[section] = objects
+    return sections, snapshot
+
+
+def get_project_as_of(project_id, at):
+    """
+    Проект на момент at вместе с дочерними объектами или None, если
+    проекта тогда не было
+    """
+    sections, snapshot = reconstruct_project(project_id, at)
+    project = sections.pop("project").get(str(project_id))
+    if project is None:
+        return None
+    project = dict(project)
+    for section, objects in sections.items():
+        project[section] = [
+            objects[object_id] for object_id in sorted(objects, key=int)
+        ]
+    return {
+        "as_of": at,
+        "snapshot_at": snapshot.taken_at if snapshot else None,
+        "project": project,
+    }
+
+
+def create_snapshot(project_id, taken_at=None):
+    """
+    Сохраняет контрольную точку состояния проекта на момент taken_at, но не
+    позже get_settled_time(): записи истории незафиксированных транзакций
+    появятся с более ранним history_date и не попали бы ни в точку, ни в
+    версии после неё
+    """
+    settled = get_settled_time()
+    if taken_at is None or taken_at > settled:
+        taken_at = settled
+    sections, _ = reconstruct_project(project_id, taken_at)
+    return ProjectSnapshot.objects.create(
+        project_id=project_id, taken_at=taken_at, data=sections
+    )
+
+
+def count_changes_since(project_id, since=None):
+    """Число версий проекта и его объектов после since"""
+    total = 0
+    for _, model, _ in SNAPSHOT_SECTIONS:
+        queryset = model.history.filter(**{_project_lookup(model): project_id})
+        if since is not None:
+            queryset = queryset.filter(history_date__gt=since)
+        total += queryset.count()
+    return total
@@ -0,0 +1,16 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Пустые поля не отправляются: иначе фильтр получит пустое значение
+    $(document).on('submit', 'form.input-filter', function() {
+        for (const element of this.elements) {
+            element.disabled = !element.value;
+        }
+    });
+
+    // Выбор в autocomplete сразу применяет фильтр
+    $(document).on('change', 'form.input-filter select', function() {
+        this.form.requestSubmit();
+    });
+}
@@ -0,0 +1,148 @@
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+
+from .models import (Budget, Project, ProjectMembership, ProjectStats, Risk,
+                     Task)
+
+# Счётчик задач по статусу
+STATUS_FIELDS = {
+    "pending": "tasks_pending",
+    "in_progress": "tasks_in_progress",
+    "completed": "tasks_completed",
+}
+
+
+def compute_stats(project_ids):
+    """Показатели проектов, посчитанные заново группирующими запросами"""
+    stats = {
+        project_id: ProjectStats(project_id=project_id) for project_id in project_ids
+    }
+    tasks = (
+        Task.objects.filter(project_id__in=project_ids)
+        .values("project_id", "status")
+        .annotate(count=Count("id"), start=Min("start_date"), end=Max("end_date"))
+        .order_by()
+    )
+    for row in tasks:
+        item = stats[row["project_id"]]
+        item.task_count += row["count"]
+        field = STATUS_FIELDS.get(row["status"])
+        if field:
+            setattr(item, field, getattr(item, field) + row["count"])
+        if row["start"] and (
+            not item.tasks_start_date or row["start"] < item.tasks_start_date
+        ):
+            item.tasks_start_date = row["start"]
+        if row["end"] and (not item.tasks_end_date or row["end"] > item.tasks_end_date):
+            item.tasks_end_date = row["end"]
+    for model, field in ((ProjectMembership, "member_count"), (Risk, "risk_count")):
+        counts = (
+            model.objects.filter(project_id__in=project_ids)
+            .values("project_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for row in counts:
+            setattr(stats[row["project_id"]], field, row["count"])
+    budgets = (
+        Budget.objects.filter(project_id__in=project_ids)
+        .order_by("project_id", "year")
+        .values_list("project_id", "year", "amount")
+    )
+    for project_id, year, amount in budgets:
+        stats[project_id].budget_total += amount
+        stats[project_id].budget_years.append(year)
+    return list(stats.values())
+
+
+def rebuild_project_stats(project_ids=None, batch_size=500):
+    """Пересчитывает показатели проектов (по умолчанию всех) пачками"""
+    projects = Project.objects.order_by("id").values_list("id", flat=True)
+    if project_ids is not None:
+        projects = projects.filter(id__in=project_ids)
+    project_ids = list(projects)
+    fields = [field.name for field in ProjectStats._meta.concrete_fields]
+    for start in range(0, len(project_ids), batch_size):
+        ProjectStats.objects.bulk_create(
+            compute_stats(project_ids[start : start + batch_size]),
+            update_conflicts=True,
+            unique_fields=["project"],
+            update_fields=[name for name in fields if name != "project"],
+        )
+    return len(project_ids)
+
+
+def apply_stats_changes(project_id, **changes):
+    """
+    Атомарно изменяет счётчики проекта: apply_stats_changes(1, task_count=1).
+    Если строки показателей нет, она пересчитывается целиком
+    """
+    changes = {field: delta for field, delta in changes.items() if delta}
+    if not project_id or not changes:
+        return
+    updated = ProjectStats.objects.filter(project_id=project_id).update(
+        **{field: F(field) + delta for field, delta in changes.items()}
+    )
+    if not updated:
+        # После фиксации: проект мог удаляться в той же транзакции
+        transaction.on_commit(partial(rebuild_project_stats, [project_id]))
+
+
+def task_status_changes(old_statuses, new_statuses):
+    """Изменения счётчиков задач при смене статусов (списки статусов)"""
+    changes = Counter()
+    changes["task_count"] = len(new_statuses) - len(old_statuses)
+    for status in old_statuses:
+        changes[STATUS_FIELDS.get(status)] -= 1
+    for status in new_statuses:
+        changes[STATUS_FIELDS.get(status)] += 1
+    changes.pop(None, None)
+    return dict(changes)
+
+
+def refresh_task_dates(project_id):
+    """Даты начала и окончания задач проекта: один запрос по индексам"""
+    dates = Task.objects.filter(project_id=project_id).aggregate(
+        start=Min("start_date"), end=Max("end_date")
+    )
+    ProjectStats.objects.filter(project_id=project_id).update(
+        tasks_start_date=dates["start"], tasks_end_date=dates["end"]
+    )
+
+
+def refresh_budget_years(project_id):
+    years = list(
+        Budget.objects.filter(project_id=project_id)
+        .order_by("year")
+        .values_list("year", flat=True)
+    )
+    ProjectStats.objects.filter(project_id=project_id).update(budget_years=years)
+
+
+# Поля задачи, изменения которых влияют на показатели проекта
+TASK_STATE = ("project_id", "status", "start_date", "end_date")
+
+
+def track_state(instance, *attnames):
+    """Запоминает значения полей объекта для сравнения при сохранении"""
+    # Через __dict__, чтобы не загружать отложенные (only/defer) поля
+    instance._stats_state = tuple(instance.__dict__.get(name) for name in attnames)
+
+
+def get_stats(project):
+    """Показатели проекта или None, если строки ещё нет"""
+    try:
+        return project.stats
+    except ProjectStats.DoesNotExist:
+        return None
+
+
+def format_budget_summary(stats):
+    """Сумма бюджетов с перечнем лет: "150.00 (2020, 2021)" """
+    if not stats or not stats.budget_years:
+        return "Нет данных"
+    years = ", ".join(str(year) for year in stats.budget_years)
+    return f"{stats.budget_total} ({years})"
@@ -0,0 +1,1749 @@
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+
+import tablib
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import DatabaseError, connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app.asgi import application
+from user.models import CustomUser
+
+from . import retention
+from .analytics import refresh_budget_rollups
+from .bulk import bulk_create_tasks
+from .caching import get_response_cache
+from .history import get_m2m_history_models, resolve_omitted_fields
+from .jobs import HEARTBEAT_TIMEOUT, MAX_ATTEMPTS, claim_next_job, run_job
+from .models import (Budget, BudgetRollup, ExportJob, HistoryPruneCheckpoint,
+                     Project, ProjectMembership, ProjectStats, ProjectVersion,
+                     Result, Risk, SearchDocument, Task)
+from .pagination import EstimatedCountPaginator
+from .permissions import get_project_role, role_cache
+from .resources import TaskResource
+from .retention import prune_model_history
+from .search import get_search_backend
+from .snapshots import create_snapshot, get_project_as_of
+from .stats import compute_stats
+
+# Поля ProjectStats, которые сравниваются с пересчётом
+STATS_FIELDS = [
+    field.name
+    for field in ProjectStats._meta.concrete_fields
+    if field.name != "project"
+]
+
+
+class ProjectAPITestCase(TestCase):
+    """Проект с руководителем и клиент API от его имени"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.leader = CustomUser.objects.create_user("leader@example.com", "x")
+        cls.project = Project.objects.create(name="Проект")
+        cls.membership = ProjectMembership.objects.create(
+            user=cls.leader, project=cls.project, role="leader"
+        )
+
+    def setUp(self):
+        role_cache.clear()
+        get_response_cache().clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.leader)
+
+    def url(self, name, *args):
+        return reverse(name, args=[self.project.pk, *args])
+
+
+class RoleCacheTest(ProjectAPITestCase):
+    def test_role_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_project_role(self.leader.pk, self.project.pk), "leader"
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_project_role(self.leader.pk, self.project.pk), "leader"
+            )
+
+    def test_membership_changes_reset_role(self):
+        get_project_role(self.leader.pk, self.project.pk)
+        self.membership.role = "participant"
+        self.membership.save()
+        self.assertEqual(
+            get_project_role(self.leader.pk, self.project.pk), "participant"
+        )
+        response = self.api.post(
+            self.url("task-create"), {"name": "Задача"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        other = Project.objects.create(name="Другой проект")
+        get_project_role(self.leader.pk, other.pk)
+        self.membership.project = other
+        self.membership.save()
+        self.assertEqual(get_project_role(self.leader.pk, self.project.pk), "")
+        self.assertEqual(get_project_role(self.leader.pk, other.pk), "participant")
+
+        self.membership.delete()
+        self.assertEqual(get_project_role(self.leader.pk, other.pk), "")
+        response = self.api.get(reverse("task-list", args=[other.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class ProjectListTest(ProjectAPITestCase):
+    def create_projects(self, count):
+        for number in range(count):
+            project = Project.objects.create(name=f"Проект {number}")
+            ProjectMembership.objects.create(
+                user=self.leader, project=project, role="leader"
+            )
+            Task.objects.create(project=project, name="Задача")
+            Budget.objects.create(project=project, year=2020, amount=5)
+            Budget.objects.create(project=project, year=2021, amount=7)
+
+    def test_counts(self):
+        self.create_projects(1)
+        response = self.api.get(reverse("project-list"))
+        project = response.json()["results"][1]
+        self.assertEqual(project["task_count"], 1)
+        self.assertEqual(project["member_count"], 1)
+        self.assertEqual(project["total_budget"], "12.00")
+        self.assertEqual(project["members"], [self.leader.pk])
+
+    def test_queries_do_not_depend_on_page_size(self):
+        # Подсчёт, строки со счётчиками, участники, версия данных для кэша
+        self.create_projects(2)
+        with self.assertNumQueries(4):
+            self.api.get(reverse("project-list"), {"page_size": 100})
+        self.create_projects(30)
+        get_response_cache().clear()
+        with self.assertNumQueries(4):
+            response = self.api.get(reverse("project-list"), {"page_size": 100})
+        self.assertEqual(response.json()["count"], 33)
+
+
+class ResponseCacheTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.participants = [
+            CustomUser.objects.create_user(f"user{number}@example.com", "x")
+            for number in range(2)
+        ]
+        for user in cls.participants:
+            ProjectMembership.objects.create(
+                user=user, project=cls.project, role="participant"
+            )
+        Task.objects.create(project=cls.project, name="Задача")
+
+    def get_as(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(url)
+
+    def test_scoped_by_role(self):
+        url = self.url("task-list")
+        self.assertEqual(self.get_as(self.participants[0], url)["X-Cache"], "MISS")
+        # Участники с одной ролью получают общую запись кэша
+        self.assertEqual(self.get_as(self.participants[1], url)["X-Cache"], "HIT")
+        self.assertEqual(self.get_as(self.leader, url)["X-Cache"], "MISS")
+
+    def test_invalidated_by_change(self):
+        url = self.url("task-list")
+        self.api.get(url)
+        self.assertEqual(self.api.get(url)["X-Cache"], "HIT")
+        Task.objects.create(project=self.project, name="Новая")
+        response = self.api.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.json()), 2)
+
+    def test_project_list_version(self):
+        url = reverse("project-list")
+        self.api.get(url)
+        # Версия списка одним агрегатом по версиям видимых проектов
+        with self.assertNumQueries(1):
+            self.assertEqual(self.api.get(url)["X-Cache"], "HIT")
+        other = Project.objects.create(name="Другой")
+        # Чужой проект не сбрасывает кеш списка пользователя
+        self.assertEqual(self.api.get(url)["X-Cache"], "HIT")
+        for change in (
+            lambda: ProjectMembership.objects.create(
+                user=self.leader, project=other, role="participant"
+            ),
+            lambda: Budget.objects.create(project=self.project, year=2020, amount=1),
+            lambda: other.delete(),
+        ):
+            change()
+            self.assertEqual(self.api.get(url)["X-Cache"], "MISS")
+
+
+class KeysetPaginationTest(ProjectAPITestCase):
+    def test_walk_pages_without_count(self):
+        tasks = Task.objects.bulk_create(
+            [
+                Task(project=self.project, name=f"Задача {number}")
+                for number in range(25)
+            ]
+        )
+        url = self.url("task-list") + "?pagination=cursor&page_size=10"
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.api.get(url)
+            self.assertFalse(any("COUNT(" in query["sql"].upper() for query in queries))
+            data = response.json()
+            self.assertNotIn("count", data)
+            ids += [task["id"] for task in data["results"]]
+            url = data["next"]
+        self.assertEqual(ids, [task.pk for task in tasks])
+
+    def test_default_responses_unchanged(self):
+        Task.objects.create(project=self.project, name="Задача")
+        self.assertEqual(len(self.api.get(self.url("task-list")).json()), 1)
+        data = self.api.get(reverse("project-list")).json()
+        self.assertEqual(data["count"], 1)
+        data = self.api.get(reverse("project-list"), {"pagination": "cursor"}).json()
+        self.assertEqual(set(data), {"next", "previous", "results"})
+
+
+class ListFiltersTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.member = CustomUser.objects.create_user("member@example.com", "x")
+        today = timezone.localdate()
+        cls.past = Task.objects.create(
+            project=cls.project,
+            name="В",
+            start_date=today - timedelta(days=20),
+            end_date=today - timedelta(days=10),
+        )
+        cls.done = Task.objects.create(
+            project=cls.project,
+            name="А",
+            status="completed",
+            start_date=today - timedelta(days=20),
+            end_date=today - timedelta(days=10),
+        )
+        cls.current = Task.objects.create(
+            project=cls.project,
+            name="Б",
+            status="in_progress",
+            start_date=today - timedelta(days=1),
+        )
+        cls.open = Task.objects.create(project=cls.project, name="Г")
+        cls.current.assigned_users.add(cls.leader, cls.member)
+        cls.past.assigned_users.add(cls.member)
+        Task.objects.create(project=Project.objects.create(name="Другой"), name="Д")
+
+    def task_ids(self, **params):
+        response = self.api.get(self.url("task-list"), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [task["id"] for task in response.json()]
+
+    def test_status(self):
+        self.assertEqual(self.task_ids(status="completed"), [self.done.pk])
+        self.assertCountEqual(
+            self.task_ids(status="pending,in_progress"),
+            [self.past.pk, self.current.pk, self.open.pk],
+        )
+
+    def test_assignee(self):
+        self.assertEqual(self.task_ids(assignee="me"), [self.current.pk])
+        self.assertEqual(
+            self.task_ids(assignee=self.member.pk), [self.past.pk, self.current.pk]
+        )
+        self.assertEqual(self.task_ids(assignee="кто-то"), [])
+
+    def test_date_overlap(self):
+        today = timezone.localdate()
+        # Задачи без дат пересекаются с любым периодом
+        self.assertEqual(
+            self.task_ids(date_from=today - timedelta(days=5)),
+            [self.current.pk, self.open.pk],
+        )
+        self.assertEqual(
+            self.task_ids(date_to=today - timedelta(days=5)),
+            [self.past.pk, self.done.pk, self.open.pk],
+        )
+        self.assertEqual(
+            self.task_ids(
+                date_from=today - timedelta(days=15),
+                date_to=today - timedelta(days=12),
+            ),
+            [self.past.pk, self.done.pk, self.open.pk],
+        )
+
+    def test_overdue(self):
+        self.assertEqual(self.task_ids(overdue="true"), [self.past.pk])
+        self.assertEqual(
+            self.task_ids(overdue="false"),
+            [self.done.pk, self.current.pk, self.open.pk],
+        )
+
+    def test_ordering(self):
+        self.assertEqual(
+            self.task_ids(ordering="name"),
+            [self.done.pk, self.current.pk, self.past.pk, self.open.pk],
+        )
+        self.assertEqual(
+            self.task_ids(ordering="-id"),
+            [self.open.pk, self.current.pk, self.done.pk, self.past.pk],
+        )
+
+    def test_budget_and_risk(self):
+        budgets = [
+            Budget.objects.create(project=self.project, year=year, amount=amount)
+            for year, amount in [(2022, 100), (2023, 500), (2024, 300)]
+        ]
+        response = self.api.get(
+            self.url("budget-list"),
+            {"year_min": 2023, "amount_max": 400, "ordering": "-amount"},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([item["id"] for item in response.json()], [budgets[2].pk])
+        response = self.api.get(self.url("budget-list"), {"ordering": "-amount"})
+        self.assertEqual(
+            [item["id"] for item in response.json()],
+            [budgets[1].pk, budgets[2].pk, budgets[0].pk],
+        )
+
+        risk = Risk.objects.create(
+            project=self.project, name="Срыв сроков", description="Поставщик"
+        )
+        Risk.objects.create(project=self.project, name="Риск", description="Прочее")
+        response = self.api.get(self.url("risk-list"), {"search": "Поставщик"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([item["id"] for item in response.json()], [risk.pk])
+
+    def test_invalid_value(self):
+        for name, params in [
+            ("task-list", {"date_from": "вчера"}),
+            ("task-list", {"ordering": "description"}),
+            ("budget-list", {"year": "год"}),
+            ("budget-list", {"amount_min": "много"}),
+        ]:
+            with self.subTest(name=name, params=params):
+                response = self.api.get(self.url(name), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_assignee_me_cached_per_user(self):
+        other = CustomUser.objects.create_user("other@example.com", "x")
+        for user in (self.member, other):
+            ProjectMembership.objects.create(
+                user=user, project=self.project, role="participant"
+            )
+        self.open.assigned_users.add(other)
+        expected = {self.member: [self.past.pk, self.current.pk], other: [self.open.pk]}
+        url = self.url("task-list")
+        for path in (url, url.replace("/api/v1/", "/api/v1/async/")):
+            get_response_cache().clear()
+            for user, ids in expected.items():
+                with self.subTest(path=path, user=user.email):
+                    client = Client(
+                        HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}"
+                    )
+                    response = client.get(path, {"assignee": "me", "ordering": "id"})
+                    self.assertEqual(response.status_code, 200, response.content)
+                    self.assertEqual(response["X-Cache"], "MISS")
+                    self.assertEqual([task["id"] for task in response.json()], ids)
+
+
+class ExplainApiQueriesTest(ProjectAPITestCase):
+    def test_child_lists_use_indexes(self):
+        CustomUser.objects.create_user("manager@example.com", "x", is_manager=True)
+        output = StringIO()
+        with self.assertRaisesMessage(CommandError, "ProjectListView"):
+            # Менеджеру доступны все проекты: список читается целиком
+            call_command("explain_api_queries", "--fail-on-seq-scan", stdout=output)
+        for table in ("task", "budget", "risk", "result", "projectmembership"):
+            self.assertNotIn(f"таблицы projects_{table}", output.getvalue())
+
+
+class StreamingExportTest(TestCase):
+    def create_projects(self, count):
+        user = CustomUser.objects.create_user(f"user{count}@example.com", "x")
+        for number in range(count):
+            project = Project.objects.create(name=f"Проект {count}-{number}")
+            ProjectMembership.objects.create(user=user, project=project)
+            Task.objects.create(project=project, name="Задача")
+            Budget.objects.create(project=project, year=2020, amount=5)
+
+    def export(self, model, action):
+        response = getattr(site._registry[model], action)(None, model.objects.all())
+        return b"".join(response.streaming_content)
+
+    def test_csv_queries_do_not_depend_on_rows(self):
+        # Проекты со счётчиками, участники с пользователями, задачи
+        self.create_projects(2)
+        with self.assertNumQueries(3):
+            self.export(Project, "export_as_csv")
+        self.create_projects(20)
+        with self.assertNumQueries(3):
+            lines = self.export(Project, "export_as_csv").decode().splitlines()
+        self.assertEqual(len(lines), 23)
+        self.assertIn("user20@example.com", lines[-1])
+
+    def test_xlsx(self):
+        self.create_projects(3)
+        content = self.export(Task, "export_as_excel")
+        self.assertEqual(load_workbook(BytesIO(content)).active.max_row, 4)
+
+
+class TaskBulkTest(ProjectAPITestCase):
+    def bulk(self, method, data):
+        return getattr(self.api, method)(self.url("task-bulk"), data, format="json")
+
+    def count_queries(self, method, data):
+        # Вместе с обработчиками после фиксации (версия проекта, события)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.bulk(method, data)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries)
+
+    def assert_stats_match(self):
+        stats = ProjectStats.objects.get(project=self.project)
+        (fresh,) = compute_stats([self.project.pk])
+        for field in STATS_FIELDS:
+            self.assertEqual(getattr(stats, field), getattr(fresh, field), field)
+
+    def create_items(self, count):
+        return [
+            {
+                "name": f"Задача {number}",
+                "end_date": "2030-01-01",
+                "assigned_users": [self.leader.pk],
+            }
+            for number in range(count)
+        ]
+
+    def test_queries_do_not_depend_on_batch_size(self):
+        self.bulk("post", self.create_items(1))
+        few = self.count_queries("post", self.create_items(2))
+        self.assertEqual(self.count_queries("post", self.create_items(40)), few)
+        ids = list(Task.objects.values_list("id", flat=True))
+        items = [{"id": task_id, "status": "completed"} for task_id in ids]
+        few = self.count_queries("patch", items[:2])
+        self.assertEqual(self.count_queries("patch", items[2:]), few)
+        few = self.count_queries("delete", {"ids": ids[:2]})
+        self.assertEqual(self.count_queries("delete", {"ids": ids[2:]}), few)
+
+    def test_bulk_operations(self):
+        response = self.bulk("post", self.create_items(3))
+        self.assertEqual(response.status_code, 201)
+        ids = [task["id"] for task in response.json()]
+        self.assertEqual(Task.history.filter(history_type="+").count(), 3)
+        self.assertEqual(Task.assigned_users.through.objects.count(), 3)
+        self.assert_stats_match()
+
+        response = self.bulk(
+            "patch", [{"id": ids[0], "status": "completed", "assigned_users": []}]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.history.filter(history_type="~").count(), 1)
+        self.assertEqual(Task.assigned_users.through.objects.count(), 2)
+        self.assert_stats_match()
+
+        # Задачи без изменений не получают записей истории
+        response = self.bulk(
+            "patch",
+            [
+                {"id": ids[0], "status": "completed"},
+                {"id": ids[1], "status": "completed"},
+                {"id": ids[2], "status": "pending"},
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Task.history.filter(history_type="~").values_list("id", flat=True)),
+            [ids[1], ids[0]],
+        )
+        self.assert_stats_match()
+
+        response = self.bulk("delete", {"ids": ids[:2] + [0]})
+        self.assertEqual(response.json(), {"deleted": 2})
+        deleted = Task.history.filter(history_type="-")
+        self.assertEqual(sorted(deleted.values_list("id", flat=True)), ids[:2])
+        self.assertEqual(deleted.get(id=ids[0]).history_user, self.leader)
+        self.assertEqual(
+            list(SearchDocument.objects.filter(kind="task").values_list("object_id")),
+            [(ids[2],)],
+        )
+        self.assert_stats_match()
+
+    def test_invalid_items(self):
+        response = self.bulk(
+            "post",
+            [
+                {"name": "Задача"},
+                {"status": "bad"},
+                {"name": "З", "assigned_users": [0]},
+            ],
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["errors"]
+        self.assertEqual([error["index"] for error in errors], ["1", "2"])
+        self.assertFalse(Task.objects.exists())
+
+        other = Task.objects.create(
+            project=Project.objects.create(name="Другой"), name="З"
+        )
+        response = self.bulk("patch", [{"id": other.pk, "name": "Новое"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.bulk("delete", {"ids": [other.pk]}).json()["deleted"], 0)
+
+
+class ProjectDashboardTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(10):
+            task = Task.objects.create(
+                project=cls.project,
+                name=f"Задача {number}",
+                end_date=date(2020, 1, 1),
+                status="completed" if number % 2 else "pending",
+            )
+            task.assigned_users.add(cls.leader)
+        Budget.objects.create(project=cls.project, year=2020, amount=5)
+        Risk.objects.create(project=cls.project, name="Риск", description="Описание")
+        Result.objects.create(project=cls.project, text="Результат")
+
+    def test_dashboard(self):
+        # Права, версия, проект с показателями, просроченные задачи,
+        # задачи, назначения, бюджеты, риски, результаты, участники
+        with self.assertNumQueries(10):
+            data = self.api.get(self.url("project-dashboard")).json()
+        self.assertEqual(len(data["tasks"]), 10)
+        self.assertEqual(data["tasks"][0]["assigned_users"], [self.leader.pk])
+        self.assertEqual(
+            data["rollups"]["tasks_by_status"], {"pending": 5, "completed": 5}
+        )
+        self.assertEqual(data["rollups"]["overdue_task_count"], 5)
+        self.assertEqual(data["rollups"]["total_budget"], "5.00")
+        self.assertEqual(data["memberships"][0]["role"], "leader")
+
+    def test_include(self):
+        response = self.api.get(self.url("project-dashboard"), {"include": "budgets"})
+        self.assertNotIn("tasks", response.json())
+        self.assertEqual(len(response.json()["budgets"]), 1)
+        response = self.api.get(self.url("project-dashboard"), {"include": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = Task.objects.create(
+            project=cls.project, name="Задача", description="Описание"
+        )
+        cls.task.assigned_users.add(cls.leader)
+
+    def test_fields(self):
+        get_project_role(self.leader.pk, self.project.pk)
+        # Версия проекта и задачи без описания и без запроса назначений
+        with self.assertNumQueries(2) as queries:
+            response = self.api.get(self.url("task-list"), {"fields": "id,name"})
+        self.assertEqual(response.json(), [{"id": self.task.pk, "name": "Задача"}])
+        self.assertNotIn("description", queries.captured_queries[1]["sql"])
+
+    def test_expand(self):
+        response = self.api.get(self.url("task-list"), {"expand": "assigned_users"})
+        user = response.json()[0]["assigned_users"][0]
+        self.assertEqual(user["email"], self.leader.email)
+        response = self.api.get(self.url("project-members-list"), {"expand": "user"})
+        self.assertEqual(response.json()[0]["user"]["id"], self.leader.pk)
+
+    def test_write_accepts_all_fields(self):
+        response = self.api.patch(
+            self.url("task-detail", self.task.pk) + "?fields=id&expand=assigned_users",
+            {"name": "Новое", "assigned_users": []},
+            format="json",
+        )
+        self.assertEqual(response.json(), {"id": self.task.pk})
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.name, "Новое")
+        self.assertFalse(self.task.assigned_users.exists())
+
+
+class MembershipBulkTest(ProjectAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = CustomUser.objects.bulk_create(
+            [CustomUser(email=f"user{number}@example.com") for number in range(30)]
+        )
+
+    def bulk(self, data):
+        return self.api.post(self.url("project-members-bulk"), data, format="json")
+
+    def add_items(self, users):
+        return {"add": [{"user": user.pk, "role": "participant"} for user in users]}
+
+    def test_queries_do_not_depend_on_batch_size(self):
+        get_project_role(self.leader.pk, self.project.pk)
+        with CaptureQueriesContext(connection) as few:
+            self.bulk(self.add_items(self.users[:2]))
+        with CaptureQueriesContext(connection) as many:
+            response = self.bulk(self.add_items(self.users[2:]))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(ProjectMembership.history.count(), 31)
+        self.assertEqual(
+            ProjectStats.objects.get(project=self.project).member_count, 31
+        )
+
+    def test_changes_reset_roles(self):
+        participant, removed = self.users[:2]
+        self.bulk(self.add_items([participant, removed]))
+        self.assertEqual(get_project_role(removed.pk, self.project.pk), "participant")
+        response = self.bulk(
+            {
+                "change_role": [{"user": participant.pk, "role": "leader"}],
+                "remove": [removed.pk],
+            }
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(get_project_role(participant.pk, self.project.pk), "leader")
+        self.assertEqual(get_project_role(removed.pk, self.project.pk), "")
+        self.assertEqual(ProjectStats.objects.get(project=self.project).member_count, 2)
+
+    def test_invalid_batch_is_rejected(self):
+        response = self.bulk(
+            {
+                "add": [{"user": self.leader.pk, "role": "leader"}],
+                "remove": [self.users[0].pk],
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()["errors"]), 2)
+        self.assertEqual(ProjectMembership.objects.count(), 1)
+
+
+@override_settings(EXPORT_ROOT=tempfile.mkdtemp())
+class ExportJobTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user(
+            "manager@example.com", "x", is_manager=True
+        )
+        cls.other = CustomUser.objects.create_user(
+            "other@example.com", "x", is_manager=True
+        )
+        Task.objects.create(project=Project.objects.create(name="Проект"), name="З")
+
+    def submit(self, user):
+        api = APIClient()
+        api.force_authenticate(user)
+        return api.post(
+            reverse("export-create"),
+            {"resource": "task", "file_format": "csv"},
+            format="json",
+        )
+
+    def job_ids(self, user):
+        api = APIClient()
+        api.force_authenticate(user)
+        return [job["id"] for job in api.get(reverse("export-list")).json()["results"]]
+
+    def test_same_export_is_shared(self):
+        response = self.submit(self.manager)
+        self.assertEqual(response.status_code, 201)
+        job_id = response.json()["id"]
+        response = self.submit(self.other)
+        self.assertEqual((response.status_code, response.json()["id"]), (200, job_id))
+        self.assertEqual(self.job_ids(self.other), [job_id])
+
+        call_command("run_export_worker", "--once", stdout=StringIO())
+        job = ExportJob.objects.get()
+        self.assertEqual((job.status, job.progress), ("done", 1))
+        self.assertEqual(self.submit(self.manager).json()["id"], job_id)
+        # Изменение данных меняет версию выгрузки
+        Task.objects.get().assigned_users.add(self.manager)
+        response = self.submit(self.manager)
+        self.assertEqual(response.status_code, 201)
+        call_command("run_export_worker", "--once", stdout=StringIO())
+        # Email исполнителя входит в выгрузку задач
+        self.manager.email = "renamed@example.com"
+        self.manager.save()
+        self.assertEqual(self.submit(self.manager).status_code, 201)
+
+    def test_download(self):
+        job_id = self.submit(self.manager).json()["id"]
+        call_command("run_export_worker", "--once", stdout=StringIO())
+        job = ExportJob.objects.get(id=job_id)
+        # Файл не раздаётся как статика и не подбирается по номеру задания
+        self.assertFalse(job.file.path.startswith(settings.MEDIA_ROOT))
+        self.assertNotIn(f"task_{job_id}.", job.file.name)
+        api = APIClient()
+        api.force_authenticate(self.manager)
+        url = api.get(reverse("export-detail", args=[job_id])).json()["file"]
+        self.assertTrue(url.endswith(reverse("export-download", args=[job_id])))
+        response = api.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'filename="task_{job_id}.csv"', response["Content-Disposition"])
+        self.assertIn("З", b"".join(response.streaming_content).decode("utf-8-sig"))
+        response.close()
+        self.assertEqual(APIClient().get(url).status_code, 401)
+        # Менеджер, потерявший роль, скачать выгрузку не может
+        CustomUser.objects.filter(pk=self.manager.pk).update(is_manager=False)
+        self.manager.refresh_from_db()
+        api.force_authenticate(self.manager)
+        self.assertEqual(api.get(url).status_code, 403)
+
+    def test_stale_running_job_is_requeued(self):
+        job_id = self.submit(self.manager).json()["id"]
+        job = claim_next_job()
+        stale = timezone.now() - HEARTBEAT_TIMEOUT - timedelta(seconds=1)
+        ExportJob.objects.filter(id=job_id).update(heartbeat_at=stale)
+        self.assertEqual(self.submit(self.other).json()["id"], job_id)
+        self.assertEqual(ExportJob.objects.get(id=job_id).status, "pending")
+
+        # Задание забрал другой воркер: результат прежнего не сохраняется
+        claimed = claim_next_job()
+        self.assertEqual(claimed.attempts, 2)
+        run_job(job)
+        self.assertEqual(ExportJob.objects.get(id=job_id).status, "running")
+        run_job(claimed)
+        self.assertEqual(ExportJob.objects.get(id=job_id).status, "done")
+
+    def test_job_fails_after_max_attempts(self):
+        job_id = self.submit(self.manager).json()["id"]
+        claim_next_job()
+        ExportJob.objects.filter(id=job_id).update(
+            attempts=MAX_ATTEMPTS, heartbeat_at=timezone.now() - HEARTBEAT_TIMEOUT * 2
+        )
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(ExportJob.objects.get(id=job_id).status, "failed")
+        self.assertEqual(self.submit(self.manager).status_code, 201)
+
+
+class ConditionalRequestTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = Task.objects.create(project=cls.project, name="Задача")
+        cls.other = Task.objects.create(project=cls.project, name="Другая")
+
+    def get_etag(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.get(url)["ETag"]
+
+    def patch(self, url, etag, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.patch(url, data, format="json", HTTP_IF_MATCH=etag)
+
+    def test_not_modified(self):
+        url = self.url("task-detail", self.task.pk)
+        etag = self.get_etag(url)
+        get_project_role(self.leader.pk, self.project.pk)
+        # Версия проекта и последняя запись истории задачи (назначения
+        # тоже создают запись истории)
+        with self.assertNumQueries(2):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.task.assigned_users.add(self.leader)
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["assigned_users"], [self.leader.pk])
+
+    def test_missing_object(self):
+        url = self.url("task-detail", self.task.pk)
+        etag = self.get_etag(url)
+        missing = self.url("task-detail", self.other.pk + 100)
+        response = self.api.get(missing, HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 404)
+        self.task.delete()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+    def test_moved_object(self):
+        url = self.url("task-detail", self.other.pk)
+        etag = self.get_etag(url)
+        self.other.project = Project.objects.create(name="Другой")
+        self.other.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+    def test_if_match_scoped_to_object(self):
+        url = self.url("task-detail", self.task.pk)
+        etag = self.get_etag(url)
+        response = self.patch(
+            self.url("task-detail", self.other.pk),
+            self.get_etag(self.url("task-detail", self.other.pk)),
+            {"name": "Изменена"},
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.patch(url, etag, {"name": "Первое изменение"})
+        self.assertEqual(response.status_code, 200)
+        response = self.patch(url, etag, {"name": "Второе изменение"})
+        self.assertEqual(response.status_code, 412)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.name, "Первое изменение")
+
+    def test_membership_edited_in_place(self):
+        url = reverse("project-detail", args=[self.project.pk])
+        member = CustomUser.objects.create_user("member@example.com", "x")
+        membership = ProjectMembership.objects.create(
+            user=member, project=self.project, role="member"
+        )
+        etag = self.get_etag(url)
+        # Число и id строк участников прежние, меняется только пользователь
+        membership.user = CustomUser.objects.create_user("new@example.com", "x")
+        membership.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_project_if_match(self):
+        etag = self.get_etag(reverse("project-detail", args=[self.project.pk]))
+        self.patch(self.url("task-detail", self.task.pk), "*", {"name": "Новое"})
+        url = reverse("project-update", args=[self.project.pk])
+        self.assertEqual(self.patch(url, etag, {"name": "А"}).status_code, 200)
+        self.assertEqual(self.patch(url, etag, {"name": "Б"}).status_code, 412)
+
+
+@override_settings(HISTORY_SAFETY_LAG=0)
+class ProjectAsOfTest(ProjectAPITestCase):
+    def as_of(self, project, at):
+        response = self.api.get(
+            reverse("project-as-of", args=[project.pk]), {"at": at.isoformat()}
+        )
+        return response
+
+    def task_names(self, project, at):
+        data = get_project_as_of(project.pk, at)
+        return [task["name"] for task in data["project"]["tasks"]]
+
+    def test_reconstruction(self):
+        before = timezone.now()
+        task = Task.objects.create(project=self.project, name="Задача")
+        Budget.objects.create(project=self.project, year=2020, amount=5)
+        created = timezone.now()
+        task.name = "Новое имя"
+        task.save()
+        task.delete()
+        data = self.as_of(self.project, created).json()
+        self.assertEqual(data["project"]["tasks"][0]["name"], "Задача")
+        self.assertEqual(data["project"]["budgets"][0]["amount"], "5.00")
+        self.assertEqual(self.task_names(self.project, timezone.now()), [])
+        self.assertEqual(self.task_names(self.project, before), [])
+        response = self.as_of(self.project, before - timedelta(days=1))
+        self.assertEqual(response.status_code, 404)
+
+    def test_snapshot(self):
+        for number in range(3):
+            Task.objects.create(project=self.project, name=f"Задача {number}")
+        snapshot = create_snapshot(self.project.pk, timezone.now())
+        Task.objects.create(project=self.project, name="После точки")
+        Task.objects.filter(name="Задача 0").get().delete()
+        data = self.as_of(self.project, timezone.now()).json()
+        self.assertEqual(parse_datetime(data["snapshot_at"]), snapshot.taken_at)
+        self.assertEqual(
+            [task["name"] for task in data["project"]["tasks"]],
+            ["Задача 1", "Задача 2", "После точки"],
+        )
+        get_project_role(self.leader.pk, self.project.pk)
+        with CaptureQueriesContext(connection) as few:
+            self.as_of(self.project, timezone.now())
+        for number in range(10):
+            Task.objects.create(project=self.project, name=f"Ещё {number}")
+        with self.assertNumQueries(len(few)):
+            self.as_of(self.project, timezone.now())
+
+    @override_settings(HISTORY_SAFETY_LAG=60)
+    def test_snapshot_lags_behind_now(self):
+        Task.objects.create(project=self.project, name="Задача")
+        now = timezone.now()
+        snapshot = create_snapshot(self.project.pk, now)
+        # Свежая запись могла быть ещё не зафиксирована: она не входит в точку
+        # и накладывается поверх неё при восстановлении
+        self.assertLess(snapshot.taken_at, now - timedelta(seconds=59))
+        self.assertEqual(snapshot.data["tasks"], {})
+        self.assertEqual(self.task_names(self.project, now), ["Задача"])
+
+    def test_move_between_projects(self):
+        other = Project.objects.create(name="Другой")
+        task = Task.objects.create(project=self.project, name="Задача")
+        create_snapshot(self.project.pk, timezone.now())
+        create_snapshot(other.pk, timezone.now())
+        task.project = other
+        task.save()
+        moved = timezone.now()
+        self.assertEqual(self.task_names(self.project, moved), [])
+        self.assertEqual(self.task_names(other, moved), ["Задача"])
+        task.project = self.project
+        task.save()
+        self.assertEqual(self.task_names(self.project, timezone.now()), ["Задача"])
+        self.assertEqual(self.task_names(other, timezone.now()), [])
+
+
+@override_settings(HISTORY_SAFETY_LAG=0)
+class ProjectChangesTest(ProjectAPITestCase):
+    def get_changes(self, **params):
+        response = self.api.get(
+            reverse("project-changes", args=[self.project.pk]), params
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_incremental_sync(self):
+        data = self.get_changes()
+        self.assertEqual(
+            [(change["model"], change["action"]) for change in data["changes"]],
+            [("project", "created"), ("projectmembership", "created")],
+        )
+        self.assertFalse(data["has_more"])
+        task = Task.objects.create(project=self.project, name="Задача")
+        task.name = "Новое имя"
+        task.save()
+        task_id = task.pk
+        task.delete()
+        data = self.get_changes(since=data["cursor"])
+        self.assertEqual(
+            [(change["action"], change["id"]) for change in data["changes"]],
+            [("created", task_id), ("updated", task_id), ("deleted", task_id)],
+        )
+        self.assertEqual(data["changes"][1]["data"]["name"], "Новое имя")
+        self.assertIsNone(data["changes"][2]["data"])
+        self.assertEqual(self.get_changes(since=data["cursor"])["changes"], [])
+
+    def test_limit(self):
+        Task.objects.create(project=self.project, name="Задача")
+        data = self.get_changes(limit=2)
+        self.assertTrue(data["has_more"])
+        data = self.get_changes(since=data["cursor"], limit=2)
+        self.assertEqual([change["model"] for change in data["changes"]], ["task"])
+        self.assertFalse(data["has_more"])
+
+    def test_queries_do_not_depend_on_changes(self):
+        Task.objects.create(project=self.project, name="Задача")
+        get_project_role(self.leader.pk, self.project.pk)
+        with CaptureQueriesContext(connection) as few:
+            self.get_changes()
+        for number in range(20):
+            Task.objects.create(project=self.project, name=f"Задача {number}")
+        with self.assertNumQueries(len(few)):
+            self.get_changes()
+
+    def test_assignments(self):
+        member = CustomUser.objects.create_user("member@example.com", "x")
+        task = Task.objects.create(project=self.project, name="Задача")
+        cursor = self.get_changes()["cursor"]
+
+        def assignments():
+            nonlocal cursor
+            data = self.get_changes(since=cursor)
+            cursor = data["cursor"]
+            return [
+                (change["id"], change["data"]["assigned_users"])
+                for change in data["changes"]
+            ]
+
+        response = self.api.patch(
+            self.url("task-detail", task.pk),
+            {"assigned_users": [self.leader.pk, member.pk]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(assignments()[-1], (task.pk, [self.leader.pk, member.pk]))
+        # Изменение со стороны пользователя
+        member.tasks.clear()
+        self.assertEqual(assignments(), [(task.pk, [self.leader.pk])])
+        # Пакетное изменение только назначений
+        response = self.api.patch(
+            self.url("task-bulk"),
+            [{"id": task.pk, "assigned_users": [member.pk]}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(assignments(), [(task.pk, [member.pk])])
+        response = self.api.patch(
+            self.url("task-bulk"),
+            [{"id": task.pk, "assigned_users": [member.pk]}],
+            format="json",
+        )
+        self.assertEqual(assignments(), [])
+
+    @override_settings(HISTORY_SAFETY_LAG=60)
+    def test_out_of_order_commit(self):
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=timezone.now() - timedelta(minutes=5),
+        ):
+            cursor = self.get_changes()["cursor"]
+        late = Task.objects.create(project=self.project, name="Долгая транзакция")
+        early = Task.objects.create(project=self.project, name="Быстрая транзакция")
+        # Запись первой задачи ещё не зафиксирована: получила меньший
+        # history_id, но станет видимой после записи второй
+        record = late.history.get()
+        history_id = record.history_id
+        record.delete()
+        self.assertEqual(self.get_changes(since=cursor)["changes"], [])
+        record.history_id = history_id
+        record.save()
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            data = self.get_changes(since=cursor)
+        self.assertEqual(
+            [change["id"] for change in data["changes"] if change["model"] == "task"],
+            [late.pk, early.pk],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.api.get(
+            reverse("project-changes", args=[self.project.pk]), {"since": "bad"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class HistoryTrackingTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = Task.objects.create(project=cls.project, name="Задача")
+
+    def test_noop_save_skips_history(self):
+        task = Task.objects.get(pk=self.task.pk)
+        task.save()
+        self.assertEqual(task.history.count(), 1)
+        task.status = "completed"
+        task.save()
+        task.save()
+        self.assertEqual(task.history.count(), 2)
+        # Объект с отложенными полями: незагруженные поля не считаются изменёнными
+        Task.objects.only("id", "name").get(pk=task.pk).save()
+        self.assertEqual(task.history.count(), 2)
+
+    def test_noop_api_update(self):
+        url = self.url("task-detail", self.task.pk)
+        response = self.api.patch(url, {"name": "Задача"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.task.history.count(), 1)
+        self.api.patch(url, {"name": "Другое имя"}, format="json")
+        self.assertEqual(self.task.history.count(), 2)
+
+    def test_diff_fields(self):
+        risk = Risk.objects.create(
+            project=self.project, name="Риск", description="Длинное описание"
+        )
+        risk.name = "Новое имя"
+        risk.save()
+        risk.description = "Другое описание"
+        risk.save()
+        rows = risk.history.order_by("history_id").values_list(
+            "description", "history_omitted"
+        )
+        self.assertEqual(
+            list(rows),
+            [
+                ("Длинное описание", ""),
+                (None, "description"),
+                ("Другое описание", ""),
+            ],
+        )
+        records = list(risk.history.order_by("history_id"))
+        # Пропущенное значение берётся из предыдущей версии одним запросом
+        with self.assertNumQueries(1):
+            resolve_omitted_fields(records)
+        self.assertEqual(records[1].description, "Длинное описание")
+        self.assertEqual(
+            risk.history.order_by("history_id")[1].instance.description,
+            "Длинное описание",
+        )
+
+
+def retention_policy(**policy):
+    """Политика хранения истории для всех моделей на время теста"""
+    return mock.patch.dict(
+        retention._retention_settings, {"DEFAULT": policy, "BATCH_SIZE": 1000}
+    )
+
+
+class HistoryRetentionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.create(name="Проект")
+
+    def create_task(self, versions):
+        task = Task.objects.create(project=self.project, name="Версия 0")
+        for number in range(1, versions):
+            task.name = f"Версия {number}"
+            task.save()
+        return task
+
+    def prune(self, model=Task, **kwargs):
+        return sum(deleted for _, deleted in prune_model_history(model, **kwargs))
+
+    def test_keep_versions(self):
+        task = self.create_task(5)
+        with retention_policy(KEEP_VERSIONS=2):
+            self.assertEqual(self.prune(), 3)
+        self.assertEqual(
+            list(task.history.order_by("history_id").values_list("name", flat=True)),
+            ["Версия 3", "Версия 4"],
+        )
+        self.assertFalse(HistoryPruneCheckpoint.objects.exists())
+
+    def test_days(self):
+        task = self.create_task(3)
+        deleted = self.create_task(2)
+        deleted.delete()
+        Task.history.update(history_date=timezone.now() - timedelta(days=60))
+        with retention_policy(DAYS=30):
+            self.assertEqual(self.prune(), 5)
+        # У существующего объекта остаётся последняя версия
+        self.assertEqual(
+            list(task.history.values_list("name", flat=True)), ["Версия 2"]
+        )
+
+    def test_squash_noop(self):
+        task = self.create_task(2)
+        latest = task.history.latest()
+        Task.history.filter(history_id=latest.history_id).update(name="Версия 0")
+        with retention_policy(SQUASH_NOOP=True):
+            self.assertEqual(self.prune(), 1)
+        self.assertEqual(task.history.count(), 1)
+
+    def test_squash_keeps_assignment_changes(self):
+        user = CustomUser.objects.create_user("user@example.com", "x")
+        task = self.create_task(1)
+        task.assigned_users.add(user)
+        task.save()  # Без изменений: запись не создаётся
+        self.assertEqual(task.history.count(), 2)
+        with retention_policy(SQUASH_NOOP=True):
+            self.assertEqual(self.prune(), 0)
+        with retention_policy(KEEP_VERSIONS=1):
+            self.assertEqual(self.prune(), 1)
+        # Снимки связей удалённой записи удаляются вместе с ней
+        m2m_model = get_m2m_history_models(Task)[0][1]
+        self.assertEqual(
+            list(m2m_model.objects.values_list("history_id", flat=True)),
+            [task.history.get().history_id],
+        )
+
+    def test_materializes_omitted_fields(self):
+        risk = Risk.objects.create(
+            project=self.project, name="Риск", description="Описание"
+        )
+        risk.name = "Новое имя"
+        risk.save()
+        self.assertEqual(risk.history.latest().history_omitted, "description")
+        with retention_policy(KEEP_VERSIONS=1):
+            self.assertEqual(self.prune(Risk), 1)
+        record = risk.history.get()
+        self.assertEqual((record.description, record.history_omitted), ("Описание", ""))
+
+    def test_resumes_from_checkpoint(self):
+        tasks = [self.create_task(3) for _ in range(2)]
+        with retention_policy(KEEP_VERSIONS=1):
+            self.assertEqual(self.prune(dry_run=True), 4)
+            self.assertEqual(Task.history.count(), 6)
+            batches = prune_model_history(Task, batch_size=3)
+            next(batches)
+            checkpoint = HistoryPruneCheckpoint.objects.get(model_label="projects.Task")
+            self.assertEqual(checkpoint.deleted, 2)
+            # Новый запуск продолжает с сохранённой позиции
+            self.assertEqual(self.prune(batch_size=3), 2)
+        for task in tasks:
+            self.assertEqual(task.history.get().name, "Версия 2")
+
+    def test_command(self):
+        self.create_task(3)
+        out = StringIO()
+        with retention_policy(KEEP_VERSIONS=1):
+            call_command("prune_history", "projects.Task", stdout=out)
+        self.assertIn("projects.Task: удалено записей 2", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("prune_history", "projects.ExportJob", stdout=out)
+
+
+class ProjectStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user("user@example.com", "x")
+        cls.first = Project.objects.create(name="Первый")
+        cls.second = Project.objects.create(name="Второй")
+
+    def assertStatsRebuilt(self):
+        """Счётчики совпадают с пересчётом обоих проектов"""
+        project_ids = [self.first.pk, self.second.pk]
+        stats = ProjectStats.objects.in_bulk(project_ids, field_name="project_id")
+        for fresh in compute_stats(project_ids):
+            for field in STATS_FIELDS:
+                self.assertEqual(
+                    getattr(stats[fresh.project_id], field),
+                    getattr(fresh, field),
+                    field,
+                )
+
+    def test_counters_follow_changes(self):
+        task = Task.objects.create(
+            project=self.first, name="Задача", end_date=date(2030, 1, 1)
+        )
+        budget = Budget.objects.create(project=self.first, year=2024, amount="10.50")
+        risk = Risk.objects.create(project=self.first, name="Риск", description="")
+        membership = ProjectMembership.objects.create(
+            user=self.user, project=self.first, role="participant"
+        )
+        self.assertStatsRebuilt()
+
+        task.status = "completed"
+        task.save()
+        budget.amount = 12.25
+        budget.save()
+        budget.amount = "7.75"
+        budget.save()
+        self.assertStatsRebuilt()
+        self.assertEqual(
+            ProjectStats.objects.get(project=self.first).budget_total, Decimal("7.75")
+        )
+
+        for obj in (task, budget, risk, membership):
+            obj.project = self.second
+            obj.save()
+        self.assertStatsRebuilt()
+
+        for obj in (task, budget, risk, membership):
+            obj.delete()
+        self.assertStatsRebuilt()
+        self.assertEqual(ProjectStats.objects.get(project=self.second).budget_total, 0)
+
+    def test_counters_saved_with_object(self):
+        budget = Budget.objects.create(project=self.first, year=2024, amount=10)
+        budget.amount = 20
+        with mock.patch(
+            "projects.signals.apply_stats_changes", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                budget.save()
+        # Изменение бюджета отменено вместе с изменением счётчиков
+        budget.refresh_from_db()
+        self.assertEqual(budget.amount, 10)
+        self.assertStatsRebuilt()
+
+    def test_project_delete_skips_child_receivers(self):
+        Task.objects.create(project=self.first, name="Задача")
+        Budget.objects.create(project=self.first, year=2024, amount=10)
+        Risk.objects.create(project=self.first, name="Риск", description="")
+        ProjectMembership.objects.create(
+            user=self.user, project=self.first, role="participant"
+        )
+        with mock.patch("projects.signals.apply_stats_changes") as stats, mock.patch(
+            "projects.signals.send_project_event"
+        ) as events:
+            Project.objects.filter(pk=self.first.pk).delete()
+        # Строки проекта удаляются вместе с ним: событие только об удалении
+        # проекта, показатели и версия не пересоздаются
+        stats.assert_not_called()
+        events.assert_called_once()
+        self.assertFalse(ProjectVersion.objects.filter(project=self.first).exists())
+        self.assertFalse(ProjectStats.objects.filter(project=self.first).exists())
+
+
+class SearchTest(ProjectAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = Project.objects.create(name="Чужой проект")
+        cls.task = Task.objects.create(
+            project=cls.project, name="Согласовать бюджет", description="Смета"
+        )
+        Risk.objects.create(
+            project=cls.project, name="Риск", description="Срыв сметы бюджет"
+        )
+        cls.result = Result.objects.create(project=cls.project, text="Итоговый отчёт")
+        Task.objects.create(project=cls.other, name="Бюджет чужого проекта")
+
+    def search(self, **params):
+        response = self.api.get(reverse("search"), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(item["type"], item["id"]) for item in response.json()["results"]]
+
+    def test_search(self):
+        found = self.search(q="бюджет")
+        # Чужой проект не виден
+        self.assertEqual({kind for kind, _ in found}, {"task", "risk"})
+        if get_search_backend() != "basic":
+            # Совпадение в заголовке важнее совпадения в тексте
+            self.assertEqual(found[0], ("task", self.task.pk))
+        self.assertEqual(self.search(q="бюджет", type="risk")[0][0], "risk")
+        self.assertEqual(self.search(q="отчёт"), [("result", self.result.pk)])
+        response = self.api.get(reverse("search"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_incremental(self):
+        self.task.name = "Закупка оборудования"
+        self.task.save()
+        self.assertIn(("task", self.task.pk), self.search(q="оборудования"))
+        self.task.delete()
+        self.assertEqual(self.search(q="оборудования"), [])
+        self.project.description = "Модернизация"
+        self.project.save()
+        self.assertEqual(self.search(q="Модернизация"), [("project", self.project.pk)])
+
+    def test_rebuild(self):
+        SearchDocument.objects.all().delete()
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 6)
+        self.assertIn(("task", self.task.pk), self.search(q="бюджет"))
+
+    def test_migration_backfill(self):
+        loader = MigrationLoader(connection)
+        node = ("projects", "0009_searchdocument")
+        if node not in loader.graph.nodes:
+            self.skipTest("Миграции отключены")
+        SearchDocument.objects.all().delete()
+        migration = import_module("projects.migrations.0009_searchdocument")
+        migration.fill_search_index(loader.project_state(node).apps, None)
+        self.assertEqual(SearchDocument.objects.count(), 6)
+        self.assertIn(("task", self.task.pk), self.search(q="бюджет"))
+
+
+class BudgetRollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user(
+            "manager@example.com", "x", is_manager=True
+        )
+        cls.first = Project.objects.create(name="А", client="Заказчик", curator="К")
+        cls.second = Project.objects.create(name="Б", client="Другой", curator="К")
+        cls.budget = Budget.objects.create(project=cls.first, year=2020, amount=100)
+        Budget.objects.create(project=cls.first, year=2021, amount=150)
+        Budget.objects.create(project=cls.second, year=2021, amount=50)
+
+    def rollups(self):
+        return sorted(
+            BudgetRollup.objects.values_list(
+                "dimension", "key", "year", "total", "project_count"
+            )
+        )
+
+    def assertRollupsRebuilt(self):
+        """Сводки после изменений совпадают с полным пересчётом"""
+        rollups = self.rollups()
+        refresh_budget_rollups()
+        self.assertEqual(rollups, self.rollups())
+
+    def test_incremental_changes(self):
+        self.assertRollupsRebuilt()
+        self.assertEqual(
+            BudgetRollup.objects.get(dimension="year", year=2021).total, 200
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.budget.amount = 120
+            self.budget.save()
+        # Изменяются только строки проекта за год, без агрегирования
+        self.assertFalse(any("SUM(" in query["sql"].upper() for query in queries))
+        self.assertEqual(
+            BudgetRollup.objects.get(
+                dimension="client", key="Заказчик", year=2020
+            ).total,
+            120,
+        )
+        self.assertRollupsRebuilt()
+
+        self.budget.year = 2022
+        self.budget.project = self.second
+        self.budget.save()
+        self.assertFalse(BudgetRollup.objects.filter(year=2020).exists())
+        self.assertRollupsRebuilt()
+
+        self.second.client = ""
+        self.second.save()
+        self.assertEqual(
+            BudgetRollup.objects.get(dimension="client", key="", year=2021).total, 50
+        )
+        self.assertRollupsRebuilt()
+
+        Budget.objects.get(project=self.first, year=2021).delete()
+        self.first.delete()
+        self.assertRollupsRebuilt()
+
+    def test_deferred_project_fields(self):
+        project = Project.objects.only("name").get(pk=self.second.pk)
+        project.name = "Новое имя"
+        project.save()
+        self.assertRollupsRebuilt()
+        project.client = "Заказчик"
+        with self.captureOnCommitCallbacks(execute=True):
+            project.save()
+        self.assertEqual(
+            BudgetRollup.objects.get(
+                dimension="client", key="Заказчик", year=2021
+            ).total,
+            200,
+        )
+        self.assertRollupsRebuilt()
+
+    def test_analytics_view(self):
+        api = APIClient()
+        api.force_authenticate(self.manager)
+        url = reverse("analytics-budgets")
+        data = api.get(url, {"dimension": "year"}).json()
+        self.assertEqual(list(data), ["year"])
+        rows = {row["year"]: row for row in data["year"]}
+        self.assertIsNone(rows[2020]["delta"])
+        self.assertEqual(rows[2021]["total"], "200.00")
+        self.assertEqual(rows[2021]["delta"], "100.00")
+        self.assertEqual(rows[2021]["delta_percent"], "100.00")
+        data = api.get(url, {"dimension": "client", "year_min": 2021}).json()
+        self.assertEqual(
+            [(row["key"], row["year"], row["delta"]) for row in data["client"]],
+            [("Другой", 2021, None), ("Заказчик", 2021, "50.00")],
+        )
+        self.assertEqual(api.get(url, {"dimension": "нет"}).status_code, 400)
+        self.assertEqual(api.get(url, {"year_min": "год"}).status_code, 400)
+
+        api.force_authenticate(CustomUser.objects.create_user("user@example.com", "x"))
+        self.assertEqual(api.get(url).status_code, 403)
+
+
+class AsyncViewsTest(ProjectAPITestCase):
+    """Асинхронные представления: аутентификация по настоящему JWT"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tasks = [
+            Task.objects.create(project=cls.project, name=f"Задача {number}")
+            for number in range(3)
+        ]
+        cls.tasks[0].status = "completed"
+        cls.tasks[0].save()
+        cls.tasks[1].assigned_users.add(cls.leader)
+        for number in range(11):
+            project = Project.objects.create(name=f"Проект {number}")
+            ProjectMembership.objects.create(
+                user=cls.leader, project=project, role="participant"
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.client.defaults[
+            "HTTP_AUTHORIZATION"
+        ] = f"Bearer {AccessToken.for_user(self.leader)}"
+
+    def async_url(self, url):
+        return url.replace("/api/v1/", "/api/v1/async/")
+
+    def assertSameAsSync(self, url, params=None):
+        response = self.client.get(self.async_url(url), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data, expected = response.json(), self.api.get(url, params).json()
+        if isinstance(expected, dict):
+            # Ссылки пагинации ведут на свои маршруты
+            data, expected = data["results"], expected["results"]
+        self.assertEqual(data, expected)
+        return response
+
+    def test_authentication(self):
+        response = Client().get(self.async_url(self.url("task-list")))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    def test_filters(self):
+        url = self.url("task-list")
+        self.assertSameAsSync(url)
+        response = self.assertSameAsSync(url, {"status": "completed"})
+        self.assertEqual([task["id"] for task in response.json()], [self.tasks[0].pk])
+        response = self.assertSameAsSync(url, {"assignee": "me"})
+        self.assertEqual([task["id"] for task in response.json()], [self.tasks[1].pk])
+        self.assertSameAsSync(url, {"ordering": "-name", "fields": "id,name"})
+        response = self.client.get(self.async_url(url), {"date_from": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pagination(self):
+        url = reverse("project-list")
+        response = self.assertSameAsSync(url, {"page_size": 5, "page": 2})
+        self.assertEqual(response.json()["count"], 12)
+        self.assertIn("/api/v1/async/projects/", response.json()["next"])
+        response = self.client.get(self.async_url(url), {"page": 5})
+        self.assertEqual(response.status_code, 404)
+        response = self.assertSameAsSync(url, {"search": "Проект"})
+        self.assertEqual(response.json()["count"], 12)
+        response = self.assertSameAsSync(
+            self.url("task-list"), {"pagination": "cursor", "page_size": 2}
+        )
+        next_page = self.client.get(response.json()["next"]).json()
+        self.assertEqual(next_page["results"][0]["id"], self.tasks[2].pk)
+
+    def test_conditional(self):
+        url = self.url("task-detail", self.tasks[1].pk)
+        response = self.client.get(self.async_url(url))
+        self.assertEqual(response["ETag"], self.api.get(url)["ETag"])
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.async_url(url))["X-Cache"], "HIT")
+        # Пользователь по токену, версия и запись истории задачи
+        with self.assertNumQueries(3):
+            not_modified = self.client.get(
+                self.async_url(url), HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        missing = self.url("task-detail", self.tasks[2].pk + 100)
+        response = self.client.get(self.async_url(missing), HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 404)
+
+
+class ProjectConsumerTest(TransactionTestCase):
+    def setUp(self):
+        role_cache.clear()
+        self.leader = CustomUser.objects.create_user("leader@example.com", "x")
+        self.outsider = CustomUser.objects.create_user("other@example.com", "x")
+        self.project = Project.objects.create(name="Проект")
+        self.membership = ProjectMembership.objects.create(
+            user=self.leader, project=self.project, role="leader"
+        )
+
+    def communicator(self, user=None):
+        path = f"/ws/projects/{self.project.pk}/"
+        if user is not None:
+            path += f"?token={AccessToken.for_user(user)}"
+        return WebsocketCommunicator(
+            application, path, headers=[(b"origin", b"http://testserver")]
+        )
+
+    def test_access(self):
+        async def run():
+            for user in (None, self.outsider):
+                connected, code = await self.communicator(user).connect()
+                self.assertFalse(connected)
+                self.assertEqual(code, 4403)
+
+        async_to_sync(run)()
+
+    def test_events(self):
+        async def run():
+            communicator = self.communicator(self.leader)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            task = await sync_to_async(Task.objects.create)(
+                project=self.project, name="Задача"
+            )
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {
+                    "project_id": self.project.pk,
+                    "model": "task",
+                    "action": "created",
+                    "ids": [task.pk],
+                },
+            )
+            # Пакетное создание - одно событие со всеми объектами
+            tasks = await sync_to_async(bulk_create_tasks)(
+                self.project.pk, [{"name": "А"}, {"name": "Б"}]
+            )
+            event = await communicator.receive_json_from()
+            self.assertEqual(event["ids"], sorted(task.pk for task in tasks))
+            task_id = task.pk
+            await sync_to_async(task.delete)()
+            event = await communicator.receive_json_from()
+            self.assertEqual((event["action"], event["ids"]), ("deleted", [task_id]))
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+        async_to_sync(run)()
+
+    def test_closed_after_removal(self):
+        async def run():
+            communicator = self.communicator(self.leader)
+            await communicator.connect()
+            await sync_to_async(self.membership.delete)()
+            output = await communicator.receive_output()
+            self.assertEqual(output, {"type": "websocket.close", "code": 4403})
+
+        async_to_sync(run)()
+
+
+class AdminQueriesTest(TestCase):
+    """
+    Число запросов страниц админки не зависит от числа строк:
+    связанные объекты и показатели проектов загружаются вместе со списком
+    """
+
+    # Запросов на страницу: сессия, пользователь, подсчёт, строки, фильтры
+    changelists = {
+        "project": 4,
+        "projectmembership": 5,
+        "task": 4,
+        "budget": 6,
+        "risk": 5,
+        "result": 5,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser("admin@example.com", "x")
+        cls.project_number = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        """count проектов, у каждого участник, задача, бюджет, риск и результат"""
+        for _ in range(count):
+            type(self).project_number += 1
+            number = self.project_number
+            project = Project.objects.create(name=f"Проект {number}", client="Клиент")
+            user = CustomUser.objects.create_user(f"user{number}@example.com", "x")
+            ProjectMembership.objects.create(user=user, project=project)
+            task = Task.objects.create(
+                project=project,
+                name=f"Задача {number}",
+                start_date=date(2024, 1, 1),
+                end_date=date(2024, 2, 1),
+            )
+            task.assigned_users.add(user)
+            Budget.objects.create(project=project, year=2024, amount=100)
+            Risk.objects.create(project=project, name="Риск", description="Описание")
+            Result.objects.create(project=project, text="Результат")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries(self):
+        self.create_rows(2)
+        urls = {
+            name: reverse(f"admin:projects_{name}_changelist")
+            for name in self.changelists
+        }
+        few = {name: self.count_queries(url) for name, url in urls.items()}
+        self.create_rows(20)
+        for name, expected in self.changelists.items():
+            with self.subTest(changelist=name):
+                many = self.count_queries(urls[name])
+                self.assertEqual(many, few[name])
+                self.assertEqual(many, expected)
+
+    def test_project_change_view_queries(self):
+        # В __str__ бюджетов и результатов встроенных форм выводится проект
+        self.create_rows(1)
+        project = Project.objects.get()
+        url = reverse("admin:projects_project_change", args=[project.pk])
+        self.count_queries(url)
+        few = self.count_queries(url)
+        for year in range(2000, 2020):
+            Budget.objects.create(project=project, year=year, amount=100)
+            Result.objects.create(project=project, text=f"Результат {year}")
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_project_filter_loads_selected_project_only(self):
+        self.create_rows(3)
+        project, other = Project.objects.order_by("pk")[:2]
+        url = reverse("admin:projects_task_changelist")
+        response = self.client.get(url, {"project__id__exact": project.pk})
+        self.assertContains(response, f'<option value="{project.pk}" selected>')
+        self.assertNotContains(response, f"{other.name}</option>")
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        for number in range(5):
+            Project.objects.create(name=f"Проект {number}")
+        self.projects = Project.objects.order_by("pk")
+
+    def test_exact_count_below_threshold(self):
+        paginator = EstimatedCountPaginator(self.projects, 2)
+        self.assertIsNone(paginator.estimated_count)
+        self.assertEqual(paginator.count, 5)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+    def test_pages_after_estimate_are_available(self):
+        paginator = EstimatedCountPaginator(self.projects, 2)
+        paginator.estimated_count = 2  # Оценка меньше настоящего числа строк
+        self.assertEqual(paginator.num_pages, 1)
+        self.assertEqual(len(paginator.page(3).object_list), 1)
+        with self.assertRaises(EmptyPage):
+            paginator.page(0)
+
+
+class TaskImportTest(TestCase):
+    headers = ["id", "name", "project_name", "start_date", "status", "assigned_users"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user("user@example.com", "x")
+        cls.project = Project.objects.create(name="Проект")
+        cls.task = Task.objects.create(project=cls.project, name="Задача")
+
+    def import_rows(self, rows, dry_run=False):
+        dataset = tablib.Dataset(*rows, headers=self.headers)
+        return TaskResource(batch_size=2).import_data(
+            dataset, dry_run=dry_run, user=self.user
+        )
+
+    def test_import(self):
+        rows = [
+            ("", f"Новая {number}", "Проект", "01.02.2024", "completed", "")
+            for number in range(3)
+        ]
+        rows.append(
+            (self.task.pk, "Изменена", "Проект", "", "in_progress", "user@example.com")
+        )
+        result = self.import_rows(rows, dry_run=True)
+        self.assertFalse(result.has_errors() or result.has_validation_errors())
+        self.assertEqual(Task.objects.count(), 1)
+
+        result = self.import_rows(rows)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(Task.objects.count(), 4)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.name, "Изменена")
+        self.assertEqual(list(self.task.assigned_users.all()), [self.user])
+        self.assertEqual(Task.history.filter(history_user=self.user).count(), 4)
+        self.assertEqual(SearchDocument.objects.filter(kind="task").count(), 4)
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.tasks_completed, stats.tasks_in_progress), (3, 1))
+        self.assertEqual(str(stats.tasks_start_date), "2024-02-01")
+
+        # Повторный импорт тех же строк не создаёт записей истории, изменение
+        # только назначений создаёт одну
+        rows = [
+            (task.pk, task.name, "Проект", "01.02.2024", task.status, "")
+            for task in Task.objects.exclude(pk=self.task.pk)
+        ]
+        rows.append((self.task.pk, "Изменена", "Проект", "", "in_progress", ""))
+        last = Task.history.latest().history_id
+        result = self.import_rows(rows)
+        self.assertFalse(result.has_errors())
+        records = Task.history.filter(history_id__gt=last)
+        self.assertEqual(
+            list(records.values_list("id", "history_type")), [(self.task.pk, "~")]
+        )
+        self.assertEqual(list(self.task.assigned_users.all()), [])
+
+    def test_invalid_rows(self):
+        result = self.import_rows(
+            [
+                ("", "Задача", "Нет такого", "31.02.2024", "pending", "x@example.com"),
+                ("", "Задача", "", "", "pending", ""),
+            ],
+            dry_run=True,
+        )
+        errors = {row.number: row.error_dict for row in result.invalid_rows}
+        self.assertEqual(set(errors[1]), {"project", "start_date", "assigned_users"})
+        self.assertEqual(set(errors[2]), {"project"})
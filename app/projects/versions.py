@@ -0,0 +1,115 @@
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .models import Project, ProjectVersion
+
+
+def _bump(project_id):
+    now = timezone.now()
+    updated = ProjectVersion.objects.filter(project_id=project_id).update(
+        version=F("version") + 1, modified_at=now
+    )
+    # Проект мог быть удалён в той же транзакции
+    if not updated and Project.objects.filter(id=project_id).exists():
+        ProjectVersion.objects.get_or_create(
+            project_id=project_id, defaults={"version": 1, "modified_at": now}
+        )
+
+
+def bump_project_version(project_id):
+    """
+    Увеличивает версию проекта в текущей транзакции (F() под блокировкой
+    строки): версия фиксируется или откатывается вместе с изменением
+    """
+    if project_id:
+        _bump(project_id)
+
+
+def _bump_many(project_ids, batch_size):
+    now = timezone.now()
+    for start in range(0, len(project_ids), batch_size):
+        batch = project_ids[start : start + batch_size]
+        ProjectVersion.objects.filter(project_id__in=batch).update(
+            version=F("version") + 1, modified_at=now
+        )
+        missing = set(batch) - set(
+            ProjectVersion.objects.filter(project_id__in=batch).values_list(
+                "project_id", flat=True
+            )
+        )
+        if missing:
+            ProjectVersion.objects.bulk_create(
+                [
+                    ProjectVersion(project_id=project_id, version=1, modified_at=now)
+                    for project_id in Project.objects.filter(
+                        id__in=missing
+                    ).values_list("id", flat=True)
+                ],
+                ignore_conflicts=True,
+            )
+
+
+def bump_project_versions(project_ids, batch_size=1000):
+    """
+    Увеличивает версии множества проектов в текущей транзакции пакетными
+    запросами (для массовых изменений вместо bump_project_version)
+    """
+    project_ids = sorted({project_id for project_id in project_ids if project_id})
+    if project_ids:
+        _bump_many(project_ids, batch_size)
+
+
+def _project_version_query(project_id):
+    return ProjectVersion.objects.filter(project_id=project_id).values_list(
+        "version", "modified_at"
+    )
+
+
+def get_project_version(project_id):
+    """Возвращает (версия, время изменения) или None, если версии ещё нет"""
+    return _project_version_query(project_id).first()
+
+
+async def aget_project_version(project_id):
+    """Асинхронный вариант get_project_version"""
+    return await _project_version_query(project_id).afirst()
+
+
+def _projects_version_query(user):
+    return ProjectVersion.objects.filter(project__in=Project.objects.for_user(user))
+
+
+def _projects_version_aggregates():
+    return {"count": Count("pk"), "total": Sum("version"), "last": Max("modified_at")}
+
+
+def _format_projects_version(state):
+    if not state["count"]:
+        return "0"
+    return f"{state['count']}-{state['total']}-{state['last'].timestamp()}"
+
+
+def get_projects_version(user):
+    """
+    Версия списка проектов, доступных пользователю: выводится из версий
+    видимых проектов (число, сумма и последнее изменение), поэтому меняется
+    только при изменении, удалении или появлении/исчезновении его проектов.
+    Общей строки, которую обновляет каждый писатель, нет
+    """
+    return _format_projects_version(
+        _projects_version_query(user).aggregate(**_projects_version_aggregates())
+    )
+
+
+def get_all_projects_version():
+    """Версия данных всех проектов (для выгрузок)"""
+    return _format_projects_version(
+        ProjectVersion.objects.aggregate(**_projects_version_aggregates())
+    )
+
+
+async def aget_projects_version(user):
+    """Асинхронный вариант get_projects_version"""
+    return _format_projects_version(
+        await _projects_version_query(user).aaggregate(**_projects_version_aggregates())
+    )
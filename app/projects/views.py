@@ -1,33 +1,64 @@
-from rest_framework import generics, permissions
-from rest_framework.exceptions import PermissionDenied, ValidationError
-from rest_framework.filters import SearchFilter
-from rest_framework.pagination import PageNumberPagination
-
-from .models import Budget, Project, ProjectMembership, Result, Risk, Task
-from .serializers import (BudgetSerializer, ProjectMembershipSerializer,
-                          ProjectSerializer, ResultSerializer, RiskSerializer,
-                          TaskSerializer)
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import (NotFound, PermissionDenied,
+                                       ValidationError)
+from rest_framework.response import Response
+
+from .analytics import ROLLUP_DIMENSIONS, get_budget_rollups
+from .bulk import (bulk_change_memberships, bulk_create_tasks,
+                   bulk_delete_tasks, bulk_update_tasks,
+                   check_membership_changes, find_missing_users)
+from .caching import ResponseCacheMixin, get_cache_stats
+from .changes import get_project_changes
+from .conditional import ConditionalRequestMixin, ProjectVersionMixin
+from .fields import SparseFieldsetMixin
+from .filters import BudgetFilter, RiskFilter, TaskFilter
+from .jobs import submit_export
+from .models import (Budget, ExportJob, Project, ProjectMembership,
+                     ProjectStats, Result, Risk, SearchDocument, Task)
+from .pagination import CursorPaginationMixin, StandardResultsSetPagination
+from .permissions import get_project_role
+from .search import SearchIndexFilter, search_documents
+from .serializers import (BudgetRollupSerializer, BudgetSerializer,
+                          ExportJobSerializer, ProjectDashboardSerializer,
+                          ProjectListSerializer,
+                          ProjectMembershipBulkSerializer,
+                          ProjectMembershipSerializer, ProjectSerializer,
+                          ResultSerializer, RiskSerializer,
+                          SearchDocumentSerializer, TaskBulkSerializer,
+                          TaskSerializer, parse_query_list)
+from .snapshots import get_project_as_of
+from .stats import get_stats
+from .versions import get_projects_version
 
 
 class BaseProjectAPIView:
+    def get_project_role(self, project_id):
+        """Роль текущего пользователя в проекте, запоминается на время запроса"""
+        roles = self.__dict__.setdefault("_project_roles", {})
+        key = int(project_id)
+        if key not in roles:
+            roles[key] = get_project_role(self.request.user.pk, key)
+        return roles[key]
+
     def check_project_permissions(self, project_id):
         if not (
             self.request.user.is_manager
-            or ProjectMembership.objects.filter(
-                user=self.request.user, role="leader", project=project_id
-            ).exists()
-            or ProjectMembership.objects.filter(
-                user=self.request.user, role="participant", project=project_id
-            ).exists()
+            or self.get_project_role(project_id) in ("leader", "participant")
         ):
             raise PermissionDenied(
                 "У вас недостаточно прав для доступа к данному проекту."
             )
 
     def check_project_permissions_leader(self, project_id):
-        return ProjectMembership.objects.filter(
-            user=self.request.user, role="leader", project=project_id
-        ).exists()
+        return self.get_project_role(project_id) == "leader"
 
 
 # =====================
@@ -35,8 +66,15 @@ class BaseProjectAPIView:
 # =====================
 
 
-class BaseListView(generics.ListAPIView, BaseProjectAPIView):
+class BaseListView(
+    ConditionalRequestMixin,
+    CursorPaginationMixin,
+    SparseFieldsetMixin,
+    generics.ListAPIView,
+    BaseProjectAPIView,
+):
     permission_classes = [permissions.IsAuthenticated]
+    cache_responses = True
 
     def get_queryset(self):
         project_id = self.kwargs["project_id"]
@@ -61,8 +99,15 @@ class BaseCreateView(generics.CreateAPIView, BaseProjectAPIView):
             raise ValidationError(f"Ошибка при создании записи: {str(e)}")
 
 
-class BaseDetailView(generics.RetrieveUpdateDestroyAPIView, BaseProjectAPIView):
+class BaseDetailView(
+    ConditionalRequestMixin,
+    SparseFieldsetMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+    BaseProjectAPIView,
+):
     permission_classes = [permissions.IsAuthenticated]
+    cache_responses = True
+    object_url_kwarg = "pk"
 
     def get_queryset(self):
         project_id = self.kwargs["project_id"]
@@ -73,8 +118,10 @@ class BaseDetailView(generics.RetrieveUpdateDestroyAPIView, BaseProjectAPIView):
         except Exception as e:
             raise ValidationError(f"Ошибка при получении записи: {str(e)}")
 
+    @transaction.atomic
     def perform_update(self, serializer):
         project_id = self.kwargs["project_id"]
+        self.check_if_match(project_id)
         try:
             if self.check_project_permissions_leader(project_id):
                 serializer.save()
@@ -83,8 +130,10 @@ class BaseDetailView(generics.RetrieveUpdateDestroyAPIView, BaseProjectAPIView):
         except Exception as e:
             raise ValidationError(f"Ошибка при обновлении записи: {str(e)}")
 
+    @transaction.atomic
     def perform_destroy(self, instance):
         project_id = self.kwargs["project_id"]
+        self.check_if_match(project_id)
         try:
             if self.check_project_permissions_leader(project_id):
                 instance.delete()
@@ -97,28 +146,61 @@ class BaseDetailView(generics.RetrieveUpdateDestroyAPIView, BaseProjectAPIView):
 # =====================
 # PROJECT VIEWS
 # =====================
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10  # Количество элементов на странице
-    page_size_query_param = "page_size"
-    max_page_size = 100  # Максимальное количество элементов на странице
-
-
-class ProjectListView(generics.ListAPIView):
-    serializer_class = ProjectSerializer
+class ProjectListView(
+    ResponseCacheMixin,
+    CursorPaginationMixin,
+    SparseFieldsetMixin,
+    generics.ListAPIView,
+):
+    serializer_class = ProjectListSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [SearchFilter]
+    filter_backends = [SearchIndexFilter]  # ?search= по полнотекстовому индексу
     filterset_fields = ["name"]  # Поле для фильтрации
+    cache_responses = True
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        scope = "manager" if user.is_manager else f"user-{user.pk}"
+        return self.cached_get(
+            request,
+            ("projects", scope, get_projects_version(user)),
+            super().get,
+            *args,
+            **kwargs,
+        )
 
     def get_queryset(self):
         queryset = (
-            Project.objects.all()
-            if self.request.user.is_manager
-            else Project.objects.filter(projectmembership__user=self.request.user)
+            Project.objects.for_user(self.request.user).with_counts().order_by("id")
         )
         return queryset
 
 
+class SearchView(generics.ListAPIView):
+    """
+    Полнотекстовый поиск по проектам, задачам, рискам и результатам,
+    доступным пользователю: ?q=<запрос>&type=task,risk
+    """
+
+    serializer_class = SearchDocumentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "Укажите поисковый запрос."})
+        documents = SearchDocument.objects.filter(
+            project__in=Project.objects.for_user(self.request.user)
+        )
+        kinds = parse_query_list(self.request.query_params.get("type"))
+        if kinds:
+            documents = documents.filter(kind__in=kinds)
+        return search_documents(query, documents)
+
+
 class ProjectCreateView(generics.CreateAPIView):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -133,9 +215,18 @@ class ProjectCreateView(generics.CreateAPIView):
             raise PermissionDenied("У вас нет прав на создание проекта.")
 
 
-class ProjectDetailView(generics.RetrieveAPIView, BaseProjectAPIView):
+class ProjectDetailView(
+    ConditionalRequestMixin,
+    SparseFieldsetMixin,
+    generics.RetrieveAPIView,
+    BaseProjectAPIView,
+):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
+    project_url_kwarg = "pk"
+    object_url_kwarg = "pk"
+    etag_related = [(ProjectMembership, "project_id")]
+    cache_responses = True
 
     def get_queryset(self):
         project_id = self.kwargs["pk"]
@@ -145,34 +236,185 @@ class ProjectDetailView(generics.RetrieveAPIView, BaseProjectAPIView):
         return Project.objects.filter(id=project_id)
 
 
-class ProjectUpdateView(generics.UpdateAPIView, BaseProjectAPIView):
+class ProjectDashboardView(
+    ConditionalRequestMixin, generics.RetrieveAPIView, BaseProjectAPIView
+):
+    """
+    Проект, его задачи, бюджеты, риски, результаты и участники одним ответом.
+    Разделы можно ограничить параметром ?include=tasks,budgets
+    """
+
+    serializer_class = ProjectDashboardSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    project_url_kwarg = "pk"
+    prefetches = {
+        "tasks": Prefetch(
+            "tasks", queryset=Task.objects.prefetch_related("assigned_users")
+        ),
+        "budgets": Prefetch("budgets", queryset=Budget.objects.order_by("year")),
+        "risks": "risks",
+        "results": "results",
+        "memberships": "projectmembership_set",
+    }
+
+    def get_include(self):
+        include = self.request.query_params.get("include")
+        if include is None:
+            return list(self.prefetches)
+        include = [section for section in include.split(",") if section]
+        unknown = set(include) - set(self.prefetches)
+        if unknown:
+            raise ValidationError(f"Неизвестные разделы: {', '.join(sorted(unknown))}")
+        return include
+
+    def get_queryset(self):
+        project_id = self.kwargs["pk"]
+        self.check_project_permissions(project_id)
+        return (
+            Project.objects.filter(id=project_id)
+            .select_related("stats")
+            .prefetch_related(
+                *(self.prefetches[section] for section in self.get_include())
+            )
+        )
+
+    def get_rollups(self, project):
+        """Сводные показатели из ProjectStats и число просроченных задач"""
+        stats = get_stats(project) or ProjectStats(project=project)
+        overdue = (
+            Task.objects.filter(project=project, end_date__lt=timezone.localdate())
+            .exclude(status="completed")
+            .count()
+        )
+        return {
+            "task_count": stats.task_count,
+            "tasks_by_status": {
+                task_status: count
+                for task_status, count in stats.tasks_by_status.items()
+                if count
+            },
+            "overdue_task_count": overdue,
+            "risk_count": stats.risk_count,
+            "member_count": stats.member_count,
+            "total_budget": f"{Decimal(stats.budget_total):.2f}",
+            "tasks_start_date": stats.tasks_start_date,
+            "tasks_end_date": stats.tasks_end_date,
+        }
+
+    def retrieve(self, request, *args, **kwargs):
+        project = self.get_object()
+        serializer = self.get_serializer(
+            project,
+            context={
+                **self.get_serializer_context(),
+                "include": self.get_include(),
+                "rollups": self.get_rollups(project),
+            },
+        )
+        return Response(serializer.data)
+
+
+class ProjectChangesView(generics.GenericAPIView, BaseProjectAPIView):
+    """
+    Изменения проекта и его объектов для инкрементальной синхронизации:
+    ?since=<курсор из предыдущего ответа>&limit=100
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 100
+    max_limit = 1000
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            raise ValidationError({"limit": "Ожидается целое число."})
+        return min(max(limit, 1), self.max_limit)
+
+    def get(self, request, pk):
+        self.check_project_permissions(pk)
+        changes, cursor, has_more = get_project_changes(
+            pk, request.query_params.get("since"), self.get_limit()
+        )
+        return Response({"cursor": cursor, "has_more": has_more, "changes": changes})
+
+
+class ProjectAsOfView(generics.GenericAPIView, BaseProjectAPIView):
+    """
+    Проект со всеми дочерними объектами на указанный момент по истории
+    изменений: ?at=2024-05-01T12:00 (дата без времени - на конец дня)
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_at(self):
+        value = self.request.query_params.get("at", "")
+        try:
+            at = parse_datetime(value)
+            if at is None:
+                day = parse_date(value)
+                if day is not None:
+                    at = datetime.combine(day, time.max)
+        except ValueError:
+            at = None
+        if at is None:
+            raise ValidationError(
+                {"at": "Ожидается дата или дата и время в формате ISO 8601."}
+            )
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        return at
+
+    def get(self, request, pk):
+        self.check_project_permissions(pk)
+        data = get_project_as_of(pk, self.get_at())
+        if data is None:
+            raise NotFound("Проект на указанный момент не существовал.")
+        return Response(data)
+
+
+class ProjectUpdateView(
+    ProjectVersionMixin, generics.UpdateAPIView, BaseProjectAPIView
+):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
+    project_url_kwarg = "pk"
+    object_url_kwarg = "pk"
+    etag_related = [(ProjectMembership, "project_id")]
 
     def get_queryset(self):
         project_id = self.kwargs["pk"]
         self.check_project_permissions(project_id)
         return Project.objects.filter(id=project_id)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         project_id = self.kwargs["pk"]
+        self.check_if_match(project_id)
         if self.check_project_permissions_leader(project_id):
             serializer.save()
         else:
             raise PermissionDenied("У вас недостаточно прав для обновления проекта.")
 
 
-class ProjectDeleteView(generics.DestroyAPIView, BaseProjectAPIView):
+class ProjectDeleteView(
+    ProjectVersionMixin, generics.DestroyAPIView, BaseProjectAPIView
+):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
+    project_url_kwarg = "pk"
+    object_url_kwarg = "pk"
+    etag_related = [(ProjectMembership, "project_id")]
 
     def get_queryset(self):
         project_id = self.kwargs["pk"]
         self.check_project_permissions(project_id)
         return Project.objects.filter(id=project_id)
 
+    @transaction.atomic
     def perform_destroy(self, instance):
         project_id = instance.id
+        self.check_if_match(project_id)
         if self.check_project_permissions_leader(project_id):
             instance.delete()
         else:
@@ -185,6 +427,7 @@ class ProjectDeleteView(generics.DestroyAPIView, BaseProjectAPIView):
 class TaskListView(BaseListView):
     serializer_class = TaskSerializer
     queryset_class = Task.objects
+    filterset_class = TaskFilter
 
 
 class TaskCreateView(BaseCreateView):
@@ -196,12 +439,104 @@ class TaskDetailView(BaseDetailView):
     queryset_class = Task.objects
 
 
+class TaskBulkView(generics.GenericAPIView, BaseProjectAPIView):
+    """
+    Пакетные операции с задачами проекта:
+    POST - создание, PATCH - обновление (у каждого объекта есть id),
+    DELETE - удаление ({"ids": [...]})
+    """
+
+    serializer_class = TaskBulkSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_items = 5000  # Максимальный размер пакета
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Одна проверка прав на весь пакет
+        if not self.check_project_permissions_leader(self.kwargs["project_id"]):
+            raise PermissionDenied("У вас недостаточно прав для изменения задач.")
+
+    def get_items(self, items):
+        if not isinstance(items, list) or not items:
+            raise ValidationError("Ожидается непустой список объектов.")
+        if len(items) > self.max_items:
+            raise ValidationError(f"Слишком много объектов, максимум {self.max_items}.")
+        return items
+
+    def validate_items(self, items, partial=False):
+        """Валидирует пакет целиком и возвращает ошибки по индексам объектов"""
+        validated = []
+        errors = []
+        for index, item in enumerate(self.get_items(items)):
+            serializer = self.get_serializer(data=item, partial=partial)
+            if serializer.is_valid():
+                validated.append((index, serializer.validated_data))
+            else:
+                errors.append({"index": index, "errors": serializer.errors})
+
+        missing = find_missing_users(
+            user_id
+            for _, data in validated
+            for user_id in data.get("assigned_users", [])
+        )
+        for index, data in validated:
+            invalid = sorted(missing.intersection(data.get("assigned_users", [])))
+            if invalid:
+                errors.append(
+                    {
+                        "index": index,
+                        "errors": {
+                            "assigned_users": [f"Пользователи не найдены: {invalid}"]
+                        },
+                    }
+                )
+        if errors:
+            raise ValidationError({"errors": sorted(errors, key=lambda e: e["index"])})
+        return [data for _, data in validated]
+
+    def tasks_response(self, ids, status_code):
+        tasks = Task.objects.filter(id__in=ids).prefetch_related("assigned_users")
+        return Response(TaskSerializer(tasks, many=True).data, status=status_code)
+
+    def post(self, request, project_id):
+        items = self.validate_items(request.data)
+        for data in items:
+            data.pop("id", None)
+        tasks = bulk_create_tasks(project_id, items, request.user)
+        return self.tasks_response([task.id for task in tasks], status.HTTP_201_CREATED)
+
+    def patch(self, request, project_id):
+        items = self.validate_items(request.data, partial=True)
+        ids = [data.get("id") for data in items]
+        tasks = Task.objects.filter(project_id=project_id, id__in=ids).in_bulk()
+        errors = [
+            {"index": index, "errors": {"id": ["Задача не найдена в проекте."]}}
+            for index, task_id in enumerate(ids)
+            if task_id not in tasks
+        ]
+        if len(set(ids)) != len(ids):
+            errors.append({"index": None, "errors": {"id": ["Повторяющиеся id."]}})
+        if errors:
+            raise ValidationError({"errors": errors})
+        bulk_update_tasks(tasks, items, request.user)
+        return self.tasks_response(ids, status.HTTP_200_OK)
+
+    def delete(self, request, project_id):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        ids = self.get_items(ids)
+        if not all(isinstance(task_id, int) for task_id in ids):
+            raise ValidationError("Список ids должен содержать целые числа.")
+        deleted = bulk_delete_tasks(project_id, ids, request.user)
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+
+
 # =====================
 # BUDGET VIEWS
 # =====================
 class BudgetListView(BaseListView):
     serializer_class = BudgetSerializer
     queryset_class = Budget.objects
+    filterset_class = BudgetFilter
 
 
 class BudgetCreateView(BaseCreateView):
@@ -236,6 +571,7 @@ class ResultDetailView(BaseDetailView):
 class RiskListView(BaseListView):
     serializer_class = RiskSerializer
     queryset_class = Risk.objects
+    filterset_class = RiskFilter
 
 
 class RiskCreateView(BaseCreateView):
@@ -263,3 +599,152 @@ class ProjectMemberCreateView(BaseCreateView):
 class ProjectMemberDetailView(BaseDetailView):
     queryset_class = ProjectMembership.objects
     serializer_class = ProjectMembershipSerializer
+
+
+class ProjectMemberBulkView(generics.GenericAPIView, BaseProjectAPIView):
+    """
+    Пакетное изменение участников проекта:
+    {"add": [{"user": id, "role": ...}], "remove": [id], "change_role": [...]}
+    """
+
+    serializer_class = ProjectMembershipBulkSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, project_id):
+        if not self.check_project_permissions_leader(project_id):
+            raise PermissionDenied("У вас недостаточно прав для изменения участников.")
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = serializer.validated_data
+        memberships, errors = check_membership_changes(project_id, **changes)
+        if errors:
+            raise ValidationError({"errors": errors})
+        created, changed = bulk_change_memberships(
+            project_id, memberships, user=request.user, **changes
+        )
+        return Response(
+            {
+                "added": ProjectMembershipSerializer(created, many=True).data,
+                "changed": ProjectMembershipSerializer(changed, many=True).data,
+                "removed": changes["remove"],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+# =====================
+# EXPORT VIEWS
+# =====================
+class ExportJobListView(generics.ListAPIView):
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        # Задания, которые пользователь запрашивал, в том числе полученные
+        # повторным запросом той же выгрузки
+        return ExportJob.objects.filter(requesters=self.request.user).order_by("-id")
+
+
+class ExportJobCreateView(generics.CreateAPIView):
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        if not request.user.is_manager:
+            raise PermissionDenied("У вас нет прав на выгрузку данных.")
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Повторная выгрузка тех же данных возвращает существующее задание
+        job, created = submit_export(user=request.user, **serializer.validated_data)
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class ExportJobDetailView(generics.RetrieveAPIView):
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if self.request.user.is_manager:
+            return ExportJob.objects.all()
+        return ExportJob.objects.filter(requesters=self.request.user)
+
+
+class ExportJobDownloadView(ExportJobDetailView):
+    """Файл готовой выгрузки: только для менеджеров, как и постановка в очередь"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(status="done").exclude(file="")
+
+    def retrieve(self, request, *args, **kwargs):
+        if not request.user.is_manager:
+            raise PermissionDenied("У вас нет прав на выгрузку данных.")
+        job = self.get_object()
+        try:
+            file = job.file.open("rb")
+        except FileNotFoundError:
+            raise NotFound("Файл выгрузки удалён, запросите выгрузку повторно.")
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=f"{job.resource}_{job.id}.{job.file_format}",
+        )
+
+
+# =====================
+# ANALYTICS VIEWS
+# =====================
+class BudgetAnalyticsView(generics.GenericAPIView):
+    """
+    Суммы бюджетов по годам, заказчикам и кураторам с изменением к
+    предыдущему году из сводных таблиц:
+    ?dimension=client&year_min=2020&year_max=2024
+    """
+
+    serializer_class = BudgetRollupSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_year(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: "Ожидается целое число."})
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_manager:
+            raise PermissionDenied("У вас нет прав на просмотр аналитики бюджетов.")
+        dimensions = parse_query_list(request.query_params.get("dimension"))
+        unknown = set(dimensions) - set(ROLLUP_DIMENSIONS)
+        if unknown:
+            raise ValidationError(
+                {"dimension": f"Неизвестный разрез: {sorted(unknown)}"}
+            )
+        year_min, year_max = self.get_year("year_min"), self.get_year("year_max")
+        return Response(
+            {
+                dimension: self.get_serializer(
+                    get_budget_rollups(dimension, year_min, year_max), many=True
+                ).data
+                for dimension in dimensions or ROLLUP_DIMENSIONS
+            }
+        )
+
+
+# =====================
+# CACHE VIEWS
+# =====================
+class CacheStatsView(generics.GenericAPIView):
+    """Счётчики попаданий и промахов кэша ответов API"""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_manager:
+            raise PermissionDenied("У вас нет прав на просмотр статистики кэша.")
+        return Response(get_cache_stats())